@@ -0,0 +1,103 @@
+"""Вставка больших объёмов строк для команд заполнения базы.
+
+``insert`` пишет многострочные INSERT без создания объектов моделей и
+без ``pre_save`` полей: bulk_create тратит на подготовку значений
+больше, чем сама база, и подменяет даты полей с ``auto_now_add``
+текущим временем. Значения передаются уже в виде для базы (даты — через
+``adapt_datetime``), сигналы не отправляются, так что ленты, счётчики
+и индексы вызывающий код обновляет сам.
+"""
+import itertools
+
+from django.core.exceptions import EmptyResultSet
+from django.core.management.color import no_style
+from django.db import connection
+from django.db.models import Max
+
+BATCH_SIZE = 1000
+SQLITE_CACHE_KIB = 256 * 1024
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def prepare_connection():
+    """Большой кеш страниц SQLite на время заполнения базы.
+
+    Индексы лент и тегов пишутся вразнобой, и со стандартными 2 МБ кеша
+    почти каждая вставка перечитывает страницы B-дерева с диска.
+    """
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA cache_size = -{SQLITE_CACHE_KIB}')
+
+
+def adapt_datetime(value):
+    return connection.ops.adapt_datetimefield_value(value)
+
+
+def next_pk(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+def insert(model, fields, rows, batch_size=BATCH_SIZE,
+           ignore_conflicts=False):
+    """Вставляет кортежи значений полей ``fields`` пачками."""
+    operations = connection.ops
+    columns = ', '.join(
+        operations.quote_name(model._meta.get_field(name).column)
+        for name in fields
+    )
+    head = (f'{operations.insert_statement(ignore_conflicts)} '
+            f'{operations.quote_name(model._meta.db_table)} '
+            f'({columns}) VALUES ')
+    tail = operations.ignore_conflicts_suffix_sql(ignore_conflicts)
+    row = f'({", ".join(["%s"] * len(fields))})'
+    # SQLite до 3.32 принимает не больше 999 параметров в запросе
+    size = operations.bulk_batch_size(fields, [None] * batch_size)
+    with connection.cursor() as cursor:
+        for batch in batches(rows, size):
+            cursor.execute(
+                head + ', '.join([row] * len(batch)) + tail,
+                list(itertools.chain.from_iterable(batch)),
+            )
+
+
+def insert_from(model, fields, queryset, ignore_conflicts=False):
+    """INSERT ... SELECT: строки ``queryset.values_list`` не покидают базу.
+
+    Порядок полей ``values_list`` должен совпадать с ``fields``.
+    """
+    operations = connection.ops
+    columns = ', '.join(
+        operations.quote_name(model._meta.get_field(name).column)
+        for name in fields
+    )
+    try:
+        sql, params = queryset.order_by().query.sql_with_params()
+    except EmptyResultSet:
+        # Фильтр заведомо пуст, например pk__in=[]
+        return 0
+    tail = operations.ignore_conflicts_suffix_sql(ignore_conflicts)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{operations.insert_statement(ignore_conflicts)} '
+            f'{operations.quote_name(model._meta.db_table)} ({columns}) '
+            f'{sql}{tail}',
+            params,
+        )
+        return cursor.rowcount
+
+
+def reset_sequences(*models):
+    """После явных pk последовательности PostgreSQL нужно сдвинуть."""
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
@@ -0,0 +1,123 @@
+"""Денормализованные счётчики комментариев, постов и подписок.
+
+Счётчики меняются сигналами при создании и удалении Comment, Post и
+Follow. Строка UserStats создаётся лениво при первом чтении, а команда
+``recount_stats`` пересчитывает всё заново, если счётчики разошлись
+(например, после ``bulk_create``).
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .bulk import batches
+from .models import Comment, Follow, Post, User, UserStats
+
+
+def _delta(field, delta):
+    if delta < 0:
+        return Greatest(F(field) + delta, 0)
+    return F(field) + delta
+
+
+def change_comment_count(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comment_count=_delta('comment_count', delta),
+        # Комментарии входят в поисковый документ поста: по updated его
+        # переиндексируют другие процессы, см. posts.search.memory.sync
+        updated=timezone.now(),
+    )
+
+
+def change_user_stats(user_id, **deltas):
+    # Отсутствующую строку не создаём: её посчитает user_stats() при
+    # первом чтении. Так удаление пользователя каскадом не воскрешает её.
+    UserStats.objects.filter(user_id=user_id).update(
+        **{field: _delta(field, delta) for field, delta in deltas.items()}
+    )
+
+
+def _count(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by().values(field)
+        .annotate(count=Count('pk')).values('count')
+    ), 0)
+
+
+def _stats_values(users):
+    return users.annotate(
+        posts_count=_count(Post, 'author'),
+        followers_count=_count(Follow, 'author'),
+        following_count=_count(Follow, 'user'),
+    ).values_list('pk', 'posts_count', 'followers_count', 'following_count')
+
+
+def recount_user(user_id):
+    pk, posts, followers, following = _stats_values(
+        User.objects.filter(pk=user_id)
+    ).get()
+    stats, _ = UserStats.objects.update_or_create(user_id=pk, defaults={
+        'posts_count': posts,
+        'followers_count': followers,
+        'following_count': following,
+    })
+    return stats
+
+
+def user_stats(user):
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return recount_user(user.pk)
+
+
+@transaction.atomic
+def recount_all(batch_size=1000):
+    Post.objects.update(comment_count=_count(Comment, 'post'))
+    UserStats.objects.all().delete()
+    batch = []
+    for pk, posts, followers, following in _stats_values(
+            User.objects.order_by()).iterator():
+        batch.append(UserStats(user_id=pk, posts_count=posts,
+                               followers_count=followers,
+                               following_count=following))
+        if len(batch) >= batch_size:
+            UserStats.objects.bulk_create(batch)
+            batch = []
+    UserStats.objects.bulk_create(batch)
+
+
+def _by_delta(deltas):
+    """{pk: delta} в {delta: [pk, ...]}: одно UPDATE на каждое значение."""
+    grouped = defaultdict(list)
+    for pk, delta in deltas.items():
+        if delta:
+            grouped[delta].append(pk)
+    return grouped
+
+
+def change_comment_counts(deltas, batch_size=500):
+    """``change_comment_count`` для многих постов, ``deltas`` — {pk: delta}.
+
+    Для записи в обход сигналов: пересчёт всех постов ради пачки
+    комментариев обходится дороже самой пачки.
+    """
+    for delta, post_ids in _by_delta(deltas).items():
+        for batch in batches(post_ids, batch_size):
+            Post.objects.filter(pk__in=batch).update(
+                comment_count=_delta('comment_count', delta),
+                updated=timezone.now(),
+            )
+
+
+def change_users_stats(batch_size=500, **deltas):
+    """``change_user_stats`` для многих пользователей: поле={pk: delta}."""
+    for field, counts in deltas.items():
+        for delta, user_ids in _by_delta(counts).items():
+            for batch in batches(user_ids, batch_size):
+                UserStats.objects.filter(user_id__in=batch).update(
+                    **{field: _delta(field, delta)}
+                )
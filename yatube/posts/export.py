@@ -0,0 +1,149 @@
+"""Потоковая выгрузка данных в JSONL.
+
+Строки читаются ``iterator(chunk_size=...)``: на PostgreSQL это
+серверный курсор, на SQLite — пошаговое чтение одного запроса, поэтому
+память не растёт с объёмом данных. Связанные имена (автор, группа)
+берутся тем же запросом, без запроса на строку.
+
+Каждая строка — запись в формате ``import_data``, так что выгрузку
+можно загрузить в другую базу, а картинки скопировать из MEDIA_ROOT:
+``image`` — имя файла в хранилище, ``image_url`` — ссылка на него.
+"""
+import json
+import zlib
+
+from .models import Comment, Follow, Group, Post, User
+
+# Порядок, в котором import_data сможет загрузить строки обратно
+TYPES = ('user', 'group', 'post', 'comment', 'follow')
+CHUNK_SIZE = 2000
+# Строки отдаются кусками: write или чанк HTTP на каждую строку дороже
+# самой сериализации
+BUFFER_SIZE = 64 * 1024
+# Один кодировщик: json.dumps с параметрами создаёт его на каждый вызов
+_encoder = json.JSONEncoder(ensure_ascii=False)
+
+
+def _date(value):
+    return value.isoformat()
+
+
+def users(user=None, passwords=True):
+    queryset = User.objects.all() if user is None else User.objects.filter(
+        pk=user.pk
+    )
+    for row in queryset.order_by('pk').values_list(
+        'username', 'password', 'first_name', 'last_name', 'email',
+        'date_joined', named=True,
+    ).iterator(CHUNK_SIZE):
+        record = {
+            'type': 'user',
+            'username': row.username,
+            'first_name': row.first_name,
+            'last_name': row.last_name,
+            'email': row.email,
+            'date_joined': _date(row.date_joined),
+        }
+        if passwords:
+            record['password'] = row.password
+        yield record
+
+
+def groups(user=None):
+    queryset = Group.objects.all()
+    if user is not None:
+        # Группы, в которых писал пользователь
+        queryset = queryset.filter(pk__in=Post.objects.filter(
+            author=user, group__isnull=False
+        ).values('group_id'))
+    for row in queryset.order_by('pk').values_list(
+        'slug', 'title', 'description', named=True,
+    ).iterator(CHUNK_SIZE):
+        yield {'type': 'group', 'slug': row.slug, 'title': row.title,
+               'description': row.description}
+
+
+def posts(user=None):
+    queryset = Post.objects.all()
+    if user is not None:
+        queryset = queryset.filter(author=user)
+    storage = Post._meta.get_field('image').storage
+    for row in queryset.order_by('pk').values_list(
+        'pk', 'author__username', 'group__slug', 'text', 'pub_date',
+        'image', named=True,
+    ).iterator(CHUNK_SIZE):
+        record = {
+            'type': 'post',
+            'id': row.pk,
+            'author': row.author__username,
+            'group': row.group__slug,
+            'text': row.text,
+            'pub_date': _date(row.pub_date),
+        }
+        if row.image:
+            record['image'] = row.image
+            record['image_url'] = storage.url(row.image)
+        yield record
+
+
+def comments(user=None):
+    queryset = Comment.objects.all()
+    if user is not None:
+        queryset = queryset.filter(author=user)
+    for row in queryset.order_by('pk').values_list(
+        'post_id', 'author__username', 'text', 'created', named=True,
+    ).iterator(CHUNK_SIZE):
+        yield {'type': 'comment', 'post': row.post_id,
+               'author': row.author__username, 'text': row.text,
+               'created': _date(row.created)}
+
+
+def follows(user=None):
+    queryset = Follow.objects.all()
+    if user is not None:
+        queryset = queryset.filter(user=user)
+    for row in queryset.order_by('pk').values_list(
+        'user__username', 'author__username', named=True,
+    ).iterator(CHUNK_SIZE):
+        yield {'type': 'follow', 'user': row.user__username,
+               'author': row.author__username}
+
+
+def records(user=None, types=TYPES, passwords=True):
+    """Записи всех типов по порядку, ``user`` — только его данные."""
+    exporters = {
+        'user': lambda: users(user, passwords),
+        'group': lambda: groups(user),
+        'post': lambda: posts(user),
+        'comment': lambda: comments(user),
+        'follow': lambda: follows(user),
+    }
+    for kind in TYPES:
+        if kind in types:
+            yield from exporters[kind]()
+
+
+def lines(stream):
+    """JSONL кусками примерно по ``BUFFER_SIZE`` символов."""
+    buffer = []
+    size = 0
+    for record in stream:
+        line = _encoder.encode(record) + '\n'
+        buffer.append(line)
+        size += len(line)
+        if size >= BUFFER_SIZE:
+            yield ''.join(buffer)
+            buffer.clear()
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def gzipped(chunks):
+    """Сжимает поток строк в gzip, не собирая его целиком."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,134 @@
+"""Версионированный кеш страниц лент.
+
+Ключ страницы содержит номера поколений тех областей (scope), от
+которых она зависит: ``index``, ``group:<id>``, ``user:<id>``,
+``post:<id>``, ``follow:<user_id>``. Сигналы сохранения и удаления
+моделей увеличивают поколения затронутых областей, после чего старые
+ключи просто перестают читаться и вытесняются сами. Для страниц лент в
+кеше лежат только id постов и флаги соседних страниц, а не объект Page
+с queryset внутри.
+
+Кеш включается для каждого view отдельно в ``settings.FEED_CACHE_VIEWS``.
+
+Те же поколения дают дешёвый ETag для условных GET (см. ``etag``):
+страница не менялась, пока не изменились поколения её областей.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .paginators import CursorPage
+
+
+def _generation_key(scope):
+    return f'feed:generation:{scope}'
+
+
+def _initial():
+    # Начальное значение от времени: если счётчик вытеснят, новое
+    # поколение не совпадёт с уже закешированными страницами.
+    return int(time.time() * 1000)
+
+
+def generations(*scopes):
+    keys = [_generation_key(scope) for scope in scopes]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, _initial(), None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+def generation(scope='index'):
+    return generations(scope)[0]
+
+
+def bump(*scopes):
+    for scope in set(scopes):
+        key = _generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial(), None)
+
+
+def bump_many(scopes):
+    """Как bump для тысяч областей сразу, например после импорта.
+
+    Поколения, которых нет в кеше, не заводятся: страницы под ними уже
+    не прочитать, generations() начнёт новое от текущего времени.
+    """
+    keys = [_generation_key(scope) for scope in set(scopes)]
+    for key in cache.get_many(keys):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Вытеснено между get_many и incr
+            pass
+
+
+def post_scopes(post):
+    return ('index', f'group:{post.group_id}', f'user:{post.author_id}',
+            f'post:{post.pk}')
+
+
+def enabled(name):
+    return settings.FEED_CACHE_VIEWS.get(name, False)
+
+
+def _digest(parts):
+    return hashlib.md5(
+        ':'.join(str(part) for part in parts).encode()
+    ).hexdigest()
+
+
+def make_key(name, scopes, *parts):
+    versions = '.'.join(str(value) for value in generations(*scopes))
+    return f'feed:{name}:{versions}:{_digest(parts)}'
+
+
+def etag(name, scopes, *parts):
+    """ETag страницы view ``name`` по поколениям ``scopes``.
+
+    Ничего не читает из базы: одно обращение к кешу за поколениями.
+    В ``parts`` передаётся всё, от чего ещё зависит HTML: адрес со
+    строкой запроса, пользователь.
+    """
+    return f'"{_digest((name, *generations(*scopes), *parts))}"'
+
+
+def get_or_set(name, scopes, parts, compute):
+    """Значение из кеша view ``name`` или результат ``compute()``."""
+    if not enabled(name):
+        return compute()
+    key = make_key(name, scopes, *parts)
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, settings.FEED_CACHE_TIMEOUT)
+    return value
+
+
+def get_page(name, scopes, paginator, cursor=None, number=None, vary=()):
+    if not enabled(name):
+        return paginator.get_page(cursor, number)
+    key = make_key(name, scopes, cursor, number, *vary)
+    state = cache.get(key)
+    if state is None:
+        page = paginator.get_page(cursor, number)
+        cache.set(key, {
+            'ids': [post.pk for post in page],
+            'number': page.number,
+            'has_next': page.has_next(),
+            'has_previous': page.has_previous(),
+        }, settings.FEED_CACHE_TIMEOUT)
+        return page
+    posts = paginator.object_list.in_bulk(state['ids'])
+    return CursorPage(
+        [posts[pk] for pk in state['ids'] if pk in posts],
+        state['number'], paginator,
+        has_next=state['has_next'], has_previous=state['has_previous'],
+    )
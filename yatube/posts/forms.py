@@ -1,6 +1,8 @@
 from django import forms
 from django.forms.widgets import Textarea
+from PIL import Image
 
+from . import uploads
 from .models import Post, Comment
 
 
@@ -13,6 +15,25 @@ class PostForm(forms.ModelForm):
                   'group': 'Укажите группу',
                   'image': 'Загрузите изображение'}
 
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if not image:
+            self.instance.image_width = self.instance.image_height = None
+            self.instance.content_hash = ''
+            return image
+        if 'image' not in self.changed_data:
+            return image
+        try:
+            normalized = uploads.normalize(image)
+        except (OSError, Image.DecompressionBombError):
+            raise forms.ValidationError(
+                'Не удалось обработать изображение', code='invalid_image'
+            )
+        self.instance.image_width = normalized.width
+        self.instance.image_height = normalized.height
+        self.instance.content_hash = normalized.content_hash
+        return normalized.file
+
 
 class CommentForm(forms.ModelForm):
 
@@ -0,0 +1,147 @@
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.search.analysis import terms
+from posts.search.memory import InvertedIndex
+from posts.synthetic import ENDINGS, vocabulary, zipf
+
+
+def corpus(count, vocabulary_size, seed=0):
+    """Слова по убыванию частоты и тексты постов из них.
+
+    Частоты слов подчиняются закону Ципфа, как в живом языке.
+    """
+    rng = random.Random(seed)
+    words = vocabulary(vocabulary_size, rng)
+    rng.shuffle(words)
+    cumulative = zipf(len(words))
+    texts = (
+        ' '.join(word + rng.choice(ENDINGS)
+                 for word in rng.choices(words, cum_weights=cumulative,
+                                         k=rng.randint(15, 40)))
+        for _ in range(count)
+    )
+    return words, texts
+
+
+def median_ms(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск по индексу в памяти с LIKE по таблице SQLite '
+        'на синтетических постах'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts', type=int, default=100_000,
+            help='Число постов',
+        )
+        parser.add_argument(
+            '--vocabulary', type=int, default=20_000,
+            help='Число разных слов',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Сколько раз выполнять каждый запрос, берётся медиана',
+        )
+        parser.add_argument(
+            '--json', action='store_true',
+            help='Вывести результаты в JSON',
+        )
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        index = InvertedIndex()
+        table = sqlite3.connect(':memory:')
+        table.execute('CREATE TABLE post (id INTEGER PRIMARY KEY, text TEXT)')
+        words, texts = corpus(options['posts'], options['vocabulary'])
+        build_seconds = 0.0
+        rows = []
+        for pk, text in enumerate(texts, start=1):
+            started = time.perf_counter()
+            index.add(pk, text)
+            build_seconds += time.perf_counter() - started
+            rows.append((pk, text))
+        table.executemany('INSERT INTO post VALUES (?, ?)', rows)
+        del rows
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'search.idx')
+            started = time.perf_counter()
+            index.save(path)
+            save_seconds = time.perf_counter() - started
+            size = os.path.getsize(path)
+            started = time.perf_counter()
+            index = InvertedIndex.load(path)
+            load_ms = (time.perf_counter() - started) * 1000
+
+            # Частое, среднее и редкое слово, их сочетания и префикс
+            common, middle, rare = (terms(words[rank])[0]
+                                    for rank in (0, 100, len(words) // 2))
+            queries = {
+                'частое': ([common], common),
+                'редкое': ([rare], rare),
+                'И': ([common, middle], f'{common} {middle}'),
+                'ИЛИ': ([middle, rare], f'{middle} OR {rare}'),
+                'префикс': ([middle[:3]], f'{middle[:3]}*'),
+            }
+            results = {
+                'posts': options['posts'],
+                'build_s': round(build_seconds, 2),
+                'save_s': round(save_seconds, 2),
+                'load_ms': round(load_ms, 2),
+                'file_bytes': size,
+                'queries': [],
+            }
+            for name, (patterns, query) in queries.items():
+                if name == 'ИЛИ':
+                    where = ' OR '.join(['text LIKE ?'] * len(patterns))
+                else:
+                    where = ' AND '.join(['text LIKE ?'] * len(patterns))
+                sql = (f'SELECT id FROM post WHERE {where} '
+                       'ORDER BY id DESC LIMIT 10')
+                params = [f'%{pattern}%' for pattern in patterns]
+                results['queries'].append({
+                    'query': name,
+                    'index_ms': round(median_ms(
+                        lambda index=index: index.search(query, 10), repeat
+                    ), 3),
+                    'like_ms': round(median_ms(
+                        lambda: table.execute(sql, params).fetchall(),
+                        repeat,
+                    ), 3),
+                })
+            # mmap файла индекса закрывается до удаления каталога
+            del index
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2,
+                                         ensure_ascii=False))
+            return
+        self.stdout.write(
+            f'Постов: {results["posts"]}, индексация '
+            f'{results["build_s"]} с, сохранение {results["save_s"]} с, '
+            f'открытие {results["load_ms"]} мс, файл '
+            f'{results["file_bytes"] / 2 ** 20:.1f} МБ'
+        )
+        self.stdout.write(f'{"запрос":<10}{"индекс, мс":>12}'
+                          f'{"LIKE, мс":>12}')
+        for result in results['queries']:
+            self.stdout.write(f'{result["query"]:<10}'
+                              f'{result["index_ms"]:>12.3f}'
+                              f'{result["like_ms"]:>12.3f}')
@@ -0,0 +1,79 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from posts import variants
+
+
+def sample_image():
+    """Фотоподобная картинка: градиент с шумом сжимается как снимок."""
+    gradient = Image.linear_gradient('L').resize((2000, 1500))
+    noise = Image.effect_noise((2000, 1500), 40)
+    return Image.merge('RGB', (gradient, noise, gradient.rotate(90)))
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время кодирования и размер вариантов картинки для '
+        'каждого формата и ширины'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'image', nargs='?',
+            help='Путь к картинке, по умолчанию синтетическая 2000x1500',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=3,
+            help='Сколько раз кодировать каждый вариант, берётся медиана',
+        )
+        parser.add_argument(
+            '--json', action='store_true',
+            help='Вывести результаты в JSON',
+        )
+
+    def measure(self, image, ext, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            data = variants.encode(image, ext)
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings) * 1000, len(data)
+
+    def handle(self, *args, **options):
+        if options['image']:
+            try:
+                image = Image.open(options['image'])
+                image.load()
+            except OSError as error:
+                raise CommandError(f'Не удалось открыть картинку: {error}')
+        else:
+            image = sample_image()
+        results = []
+        for width in variants.widths_for(image):
+            resized = variants.crop(image, width)
+            for ext in variants.supported_formats():
+                encode_ms, size = self.measure(resized, ext,
+                                               options['repeat'])
+                results.append({'format': ext, 'width': width,
+                                'encode_ms': round(encode_ms, 2),
+                                'bytes': size})
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        # Размеры относительно самого широкого JPEG, как у карточки
+        baseline = max(
+            (result for result in results if result['format'] == 'jpg'),
+            key=lambda result: result['width'],
+        )
+        self.stdout.write(f'{"формат":<8}{"ширина":>8}{"мс":>10}'
+                          f'{"байт":>10}{"от jpg":>10}')
+        for result in results:
+            self.stdout.write(
+                f'{result["format"]:<8}{result["width"]:>8}'
+                f'{result["encode_ms"]:>10.2f}{result["bytes"]:>10}'
+                f'{result["bytes"] / baseline["bytes"]:>10.0%}'
+            )
@@ -0,0 +1,297 @@
+import io
+import json
+import logging
+import math
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from urllib.parse import unquote_to_bytes, urlencode, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, connections
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import urls
+from posts.models import (Comment, Follow, Group, Post, PostTag,
+                          TimelineEntry, User, UserStats)
+from yatube.metrics import Sample
+
+# Только страницы, которые ничего не меняют: GET на profile_follow или
+# add_comment изменил бы данные, по которым идут замеры
+READ_ONLY_URLS = (
+    'index', 'follow_index', 'search', 'group_posts', 'tag_posts',
+    'mentions', 'profile', 'post',
+)
+
+
+def percentile(values, share):
+    """Значение, не меньше которого ``share`` отсортированных значений."""
+    return values[max(math.ceil(share * len(values)) - 1, 0)]
+
+
+def commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+            text=True, cwd=settings.BASE_DIR, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает страницы из posts/urls.py, которые только читают '
+        'данные, через WSGI-приложение в этом процессе и сохраняет '
+        'задержки, пропускную способность и число SQL-запросов в JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Запросов на каждый URL')
+        parser.add_argument('--concurrency', type=int, default=8,
+                            help='Одновременных клиентов')
+        parser.add_argument('--warmup', type=int, default=5,
+                            help='Запросов на URL до замеров')
+        parser.add_argument(
+            '--url', action='append', dest='names', metavar='NAME',
+            choices=READ_ONLY_URLS,
+            help='Нагружать только URL с этим именем, можно повторять',
+        )
+        parser.add_argument(
+            '--anonymous', action='store_true',
+            help='Не входить на сайт: закрытые страницы ответят 302',
+        )
+        parser.add_argument('--output',
+                            help='Файл для результатов в JSON')
+        parser.add_argument(
+            '--compare', metavar='JSON',
+            help='Сравнить p95 и число запросов с прошлым результатом',
+        )
+        parser.add_argument(
+            '--max-regression', type=float, metavar='PERCENT',
+            help='С --compare: ошибка, если p95 какого-то URL вырос '
+                 'больше чем на PERCENT процентов',
+        )
+
+    def sample_arguments(self):
+        """Аргументы URL: самые нагруженные автор, группа, пост и тег.
+
+        Запрос поиска — самый частый тег, без тегов — первое слово
+        последнего поста автора.
+        """
+        stats = UserStats.objects.order_by('-posts_count').first()
+        if stats is None or not stats.posts_count:
+            raise CommandError(
+                'В базе нет постов, заполните её командой seed_dataset'
+            )
+        author = stats.user
+        group = Group.objects.annotate(
+            count=Count('posts')
+        ).order_by('-count').first()
+        tag = PostTag.objects.values('tag__name').annotate(
+            count=Count('id')
+        ).order_by('-count').first()
+        reader = UserStats.objects.exclude(user=author).order_by(
+            '-following_count'
+        ).first()
+        post = author.posts.order_by('-pub_date').first()
+        return {
+            'username': author.username,
+            'post_id': post.pk,
+            'slug': group and group.slug,
+            'name': tag and tag['tag__name'],
+            'q': (tag['tag__name'] if tag
+                  else next(iter(post.text.split()), None)),
+        }, reader and reader.user
+
+    def targets(self, arguments, names):
+        for pattern in urls.urlpatterns:
+            if pattern.name not in (names or READ_ONLY_URLS):
+                continue
+            kwargs = {key: arguments[key]
+                      for key in pattern.pattern.converters}
+            # Без q страница поиска — пустая форма, а не поиск
+            query = {'q': arguments['q']} if pattern.name == 'search' else {}
+            if None in kwargs.values() or None in query.values():
+                self.stderr.write(f'{pattern.name}: нет данных, пропущен')
+                continue
+            path = reverse(pattern.name, kwargs=kwargs)
+            if query:
+                path += '?' + urlencode(query)
+            yield pattern.name, path
+
+    def handle(self, *args, **options):
+        for name in ('requests', 'concurrency'):
+            if options[name] < 1:
+                raise CommandError(f'--{name} должно быть не меньше 1')
+        if settings.DEBUG:
+            self.stderr.write(self.style.WARNING(
+                'DEBUG включён: Django запоминает каждый SQL-запрос, '
+                'замеры будут хуже, чем в продакшене'
+            ))
+        arguments, reader = self.sample_arguments()
+        cookie = ''
+        if not options['anonymous'] and reader is not None:
+            client = Client()
+            client.force_login(reader)
+            name = settings.SESSION_COOKIE_NAME
+            cookie = f'{name}={client.cookies[name].value}'
+        self.application = get_wsgi_application()
+
+        results = {
+            'commit': commit(),
+            'time': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'dataset': {model.__name__: model.objects.count() for model in
+                        (User, Post, Follow, Comment, TimelineEntry)},
+            'user': None if not cookie else reader.username,
+            'concurrency': options['concurrency'],
+            'requests': options['requests'],
+            'urls': [],
+        }
+        # Ошибки видны по статусам, трейсбек на каждый запрос не нужен
+        logger = logging.getLogger('django.request')
+        level = logger.level
+        logger.setLevel(logging.CRITICAL)
+        try:
+            for name, path in self.targets(arguments, options['names']):
+                for _ in range(options['warmup']):
+                    self.request(path, cookie)
+                results['urls'].append(self.load(
+                    name, path, cookie, options['requests'],
+                    options['concurrency'],
+                ))
+                self.report(results['urls'][-1])
+        finally:
+            logger.setLevel(level)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, indent=2, ensure_ascii=False)
+        if options['compare']:
+            self.compare(results, options['compare'],
+                         options['max_regression'])
+
+    def request(self, path, cookie):
+        """Один GET через WSGI: (статус, секунды, число SQL-запросов)."""
+        path, _, query = path.partition('?')
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            # WSGI передаёт путь байтами, раскодированными как latin-1
+            'PATH_INFO': unquote_to_bytes(path).decode('iso-8859-1'),
+            'QUERY_STRING': query,
+            'SCRIPT_NAME': '',
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': 'localhost',
+            'HTTP_COOKIE': cookie,
+            # Адрес не из INTERNAL_IPS: панель отладки не рисуется
+            'REMOTE_ADDR': '192.0.2.1',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        statuses = []
+
+        def start_response(status, headers, exc_info=None):
+            statuses.append(int(status.split()[0]))
+
+        sample = Sample()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(sample.execute)
+                )
+            response = self.application(environ, start_response)
+            try:
+                for _ in response:
+                    pass
+            finally:
+                response.close()
+        return statuses[0], time.perf_counter() - started, sample.queries
+
+    def load(self, name, path, cookie, count, concurrency):
+        def worker(requests):
+            try:
+                return [self.request(path, cookie) for _ in range(requests)]
+            finally:
+                # У каждого потока своё соединение с базой
+                connections.close_all()
+
+        shares = [count // concurrency + (number < count % concurrency)
+                  for number in range(concurrency)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            samples = [sample for chunk in executor.map(worker, shares)
+                       for sample in chunk]
+        elapsed = time.perf_counter() - started
+        timings = sorted(seconds * 1000 for _, seconds, _ in samples)
+        queries = [count for _, _, count in samples]
+        return {
+            'name': name,
+            'path': urlsplit(path).path,
+            'statuses': dict(Counter(status for status, _, _ in samples)),
+            'p50_ms': round(percentile(timings, 0.50), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'p99_ms': round(percentile(timings, 0.99), 2),
+            'mean_ms': round(statistics.mean(timings), 2),
+            'rps': round(len(samples) / elapsed, 1),
+            'queries_mean': round(statistics.mean(queries), 1),
+            'queries_max': max(queries),
+        }
+
+    def report(self, result):
+        statuses = ' '.join(f'{status}×{count}' for status, count
+                            in sorted(result['statuses'].items()))
+        self.stdout.write(
+            f'{result["name"]:<18} p50 {result["p50_ms"]:>8.2f} мс  '
+            f'p95 {result["p95_ms"]:>8.2f} мс  '
+            f'p99 {result["p99_ms"]:>8.2f} мс  '
+            f'{result["rps"]:>7.1f} rps  '
+            f'SQL {result["queries_mean"]:>5.1f}  {statuses}'
+        )
+
+    def compare(self, results, path, max_regression):
+        with open(path, encoding='utf-8') as file:
+            baseline = {result['name']: result
+                        for result in json.load(file)['urls']}
+        regressions = []
+        self.stdout.write(f'\nСравнение с {path}:')
+        for result in results['urls']:
+            before = baseline.get(result['name'])
+            if before is None:
+                continue
+            # p95 округлён до сотых миллисекунды и может быть нулём
+            change = ((result['p95_ms'] / before['p95_ms'] - 1) * 100
+                      if before['p95_ms'] else None)
+            self.stdout.write(
+                f'{result["name"]:<18} p95 {before["p95_ms"]:>8.2f} → '
+                f'{result["p95_ms"]:>8.2f} мс '
+                + ('(—)' if change is None else f'({change:+.0f}%)')
+                + f'  SQL {before["queries_mean"]} → '
+                f'{result["queries_mean"]}'
+            )
+            if (max_regression is not None and change is not None
+                    and change > max_regression):
+                regressions.append(result['name'])
+        if regressions:
+            raise CommandError(
+                f'p95 вырос больше чем на {max_regression}%: '
+                + ', '.join(regressions)
+            )
@@ -0,0 +1,95 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from posts import tags, timeline
+from posts.models import Comment, Group, Post, Tag, User
+from posts.paginators import NEXT, CursorPaginator
+from posts.views import POSTS_PER_PAGE
+
+# Признаки плана без индекса: полный проход по таблице или сортировка
+# во временной структуре вместо чтения индекса в нужном порядке.
+FULL_SCAN_PATTERNS = {
+    'sqlite': (
+        re.compile(r'\bSCAN (?:TABLE )?(\w+)(?!.*\bUSING\b)'),
+        re.compile(r'USE TEMP B-TREE FOR ORDER BY'),
+    ),
+    'postgresql': (
+        re.compile(r'Seq Scan on (\w+)'),
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет EXPLAIN для запросов лент из posts/views.py и '
+        'сообщает, используют ли они индексы'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Завершиться с ошибкой, если какой-то запрос идёт мимо '
+                 'индекса',
+        )
+        parser.add_argument(
+            '--verbose-plans', action='store_true',
+            help='Печатать планы целиком',
+        )
+
+    def feed_querysets(self):
+        """Те же запросы, что строят views, на первых объектах из базы."""
+        user = User.objects.order_by('pk').first()
+        group = Group.objects.order_by('pk').first()
+        post = Post.objects.order_by('pk').first()
+        tag = Tag.objects.order_by('pk').first()
+        if user is None or post is None:
+            raise CommandError('Нужны хотя бы один пользователь и пост')
+        feeds = {
+            'index': Post.objects.feed(),
+            'profile': user.posts.feed(),
+            'follow_index': timeline.feed(user),
+            'mentions': tags.mention_feed(user),
+        }
+        if group is not None:
+            feeds['group_posts'] = group.posts.feed()
+        if tag is not None:
+            feeds['tag_posts'] = tags.tag_feed(tag)
+        for name, posts in feeds.items():
+            paginator = CursorPaginator(posts, POSTS_PER_PAGE)
+            yield name, paginator.object_list[:POSTS_PER_PAGE + 1]
+            yield f'{name} (cursor)', paginator.cursor_queryset(
+                NEXT, post.pub_date, post.pk
+            )
+        yield 'post_view comments', Comment.objects.select_related(
+            'author'
+        ).filter(post_id=post.pk)
+
+    def handle(self, *args, **options):
+        patterns = FULL_SCAN_PATTERNS.get(connection.vendor)
+        if patterns is None:
+            raise CommandError(
+                f'EXPLAIN для {connection.vendor} не поддерживается'
+            )
+        failed = []
+        for name, queryset in self.feed_querysets():
+            plan = queryset.explain()
+            problems = [
+                match.group(0)
+                for pattern in patterns
+                for match in pattern.finditer(plan)
+            ]
+            if problems:
+                failed.append(name)
+                self.stdout.write(self.style.WARNING(
+                    f'{name}: без индекса — {"; ".join(problems)}'
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{name}: индекс'))
+            if options['verbose_plans'] or problems:
+                self.stdout.write(plan)
+        if failed and options['check']:
+            raise CommandError(
+                f'Запросы идут мимо индексов: {", ".join(failed)}'
+            )
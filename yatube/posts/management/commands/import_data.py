@@ -0,0 +1,483 @@
+import csv
+import json
+import os
+import sys
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_slug
+from django.db import router, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import (bulk, counters, feed_cache, search, tags, thumbnails,
+                   timeline, uploads)
+from posts.models import Comment, Follow, Group, Post, User
+from posts.signals import follow_scopes
+
+# Порядок записи пачек: строки ссылаются на записанные раньше
+TYPES = ('user', 'group', 'post', 'comment', 'follow')
+# Сколько пропущенных строк показать поимённо
+SHOWN_SKIPS = 20
+
+
+# Пост без модели: на сотнях тысяч строк Post() заметно дороже
+ImportedPost = namedtuple('ImportedPost', (
+    'pk', 'text', 'pub_date', 'author_id', 'group_id', 'image',
+    'image_width', 'image_height', 'content_hash',
+))
+
+
+class Skip(Exception):
+    """Строка не загружается, текст исключения — причина."""
+
+
+def checked(value, name, types):
+    # В JSON поле может оказаться числом, списком или объектом; bool —
+    # подкласс int, но числом в данных не считается
+    if isinstance(value, bool) or not isinstance(value, types):
+        raise Skip(f'{name}: неверный тип {type(value).__name__}')
+    return value
+
+
+def required(record, name, types=str):
+    value = record.get(name)
+    if value in (None, ''):
+        raise Skip(f'нет поля {name}')
+    return checked(value, name, types)
+
+
+def optional(record, name, default=None, types=str):
+    value = record.get(name)
+    if value in (None, ''):
+        return default
+    return checked(value, name, types)
+
+
+def moment(record, name):
+    value = optional(record, name)
+    if value is None:
+        return timezone.now()
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise Skip(f'{name}: не дата {value!r}')
+    if settings.USE_TZ and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def number(value, name):
+    try:
+        return None if value is None else int(value)
+    except (TypeError, ValueError):
+        raise Skip(f'{name}: не число {value!r}')
+
+
+def lookup(model, field, values):
+    """Значения ``field`` в pk одним запросом на пачку."""
+    if not values:
+        return {}
+    return dict(model.objects.filter(**{f'{field}__in': set(values)})
+                .values_list(field, 'pk'))
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает пользователей, группы, посты с картинками, комментарии '
+        'и подписки из JSONL или CSV пачками, не держа файл в памяти'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'files', nargs='+', metavar='FILE',
+            help='Файлы .jsonl или .csv, "-" — JSONL из stdin',
+        )
+        parser.add_argument(
+            '--type', choices=TYPES,
+            help='Тип строк CSV, по умолчанию по имени файла: users.csv',
+        )
+        parser.add_argument(
+            '--images',
+            help='Каталог, от которого считаются пути картинок, '
+                 'по умолчанию каталог файла',
+        )
+        parser.add_argument(
+            '--password',
+            help='Пароль пользователей, у которых в данных нет хеша',
+        )
+        # Каждая транзакция на SQLite — это fsync, пачки крупнее, чем
+        # у seed_dataset, где транзакция одна
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Строк каждого типа в одной транзакции')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Потоков для копирования картинок')
+        parser.add_argument(
+            '--skip-search', action='store_true',
+            help='Не индексировать посты, потом нужен '
+                 'rebuild_search_index',
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.batch_size = options['batch_size']
+        # Хешировать пароль на каждой строке — это секунды на тысячу
+        self.password = (make_password(options['password'])
+                         if options['password'] else None)
+        self.buffers = {kind: [] for kind in TYPES}
+        self.created = Counter()
+        self.skipped = 0
+        self.next_post_pk = None
+        self.images = 0
+
+        bulk.prepare_connection()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['workers']) as self.executor:
+            for path in options['files']:
+                self.load(path)
+            self.flush()
+        if self.created['post']:
+            # Pk постов заданы явно
+            bulk.reset_sequences(Post)
+        if self.images:
+            thumbnails.enqueue_missing()
+        if self.created['post'] and not options['skip_search']:
+            search.backend(router.db_for_write(Post)).save()
+
+        elapsed = time.perf_counter() - started
+        total = sum(self.created.values())
+        self.stdout.write(self.style.SUCCESS(
+            ', '.join(f'{kind}: {self.created[kind]}' for kind in TYPES)
+            + f'. {total} строк за {elapsed:.1f} с '
+            f'({total / max(elapsed, 1e-9):.0f} в секунду), '
+            f'пропущено {self.skipped}'
+        ))
+
+    def skip(self, location, reason):
+        self.skipped += 1
+        if self.skipped <= SHOWN_SKIPS:
+            self.stderr.write(f'{location}: {reason}')
+        elif self.skipped == SHOWN_SKIPS + 1:
+            self.stderr.write('Остальные пропуски не показываются')
+
+    def load(self, path):
+        images = self.options['images'] or os.path.dirname(
+            os.path.abspath(path)
+        )
+        for location, kind, record in self.records(path):
+            if not isinstance(kind, str) or kind not in self.buffers:
+                self.skip(location, f'неизвестный тип {kind!r}')
+                continue
+            try:
+                row = getattr(self, f'parse_{kind}')(record)
+            except Skip as error:
+                self.skip(location, error)
+                continue
+            if kind == 'post' and row['image']:
+                row['image'] = os.path.join(images, row['image'])
+            buffer = self.buffers[kind]
+            buffer.append((location, row))
+            if len(buffer) >= self.batch_size:
+                self.flush()
+
+    def records(self, path):
+        """Строки файла: (место в файле, тип, словарь полей)."""
+        if path == '-':
+            yield from self.json_lines(sys.stdin, 'stdin')
+            return
+        with open(path, encoding='utf-8', newline='') as file:
+            if os.path.splitext(path)[1].lower() != '.csv':
+                yield from self.json_lines(file, path)
+                return
+            kind = self.options['type'] or self.csv_type(path)
+            reader = csv.DictReader(file)
+            for row in reader:
+                yield f'{path}:{reader.line_num}', kind, row
+
+    def json_lines(self, file, name):
+        for line, text in enumerate(file, 1):
+            if not text.strip():
+                continue
+            try:
+                record = json.loads(text)
+            except ValueError:
+                self.skip(f'{name}:{line}', 'не JSON')
+                continue
+            if not isinstance(record, dict):
+                self.skip(f'{name}:{line}', 'не объект JSON')
+                continue
+            yield (f'{name}:{line}', record.get('type', self.options['type']),
+                   record)
+
+    def csv_type(self, path):
+        stem = os.path.splitext(os.path.basename(path))[0].lower()
+        kind = stem[:-1] if stem.endswith('s') else stem
+        if kind not in TYPES:
+            raise CommandError(
+                f'{path}: тип строк не понятен из имени, укажите --type'
+            )
+        return kind
+
+    def parse_user(self, record):
+        username = required(record, 'username')
+        try:
+            User.username_validator(username)
+        except ValidationError:
+            raise Skip(f'недопустимое имя {username!r}')
+        password = optional(record, 'password')
+        # «!» в начале — непригодный пароль, как у make_password(None)
+        if password is not None and not password.startswith('!'):
+            try:
+                identify_hasher(password)
+            except ValueError:
+                raise Skip('password должен быть хешем, '
+                           'открытый пароль задаёт --password')
+        return {
+            'username': username,
+            'password': password or self.password or make_password(None),
+            'first_name': optional(record, 'first_name', ''),
+            'last_name': optional(record, 'last_name', ''),
+            'email': optional(record, 'email', ''),
+            'date_joined': moment(record, 'date_joined'),
+        }
+
+    def parse_group(self, record):
+        slug = required(record, 'slug')
+        try:
+            validate_slug(slug)
+        except ValidationError:
+            raise Skip(f'недопустимый slug {slug!r}')
+        return {
+            'slug': slug,
+            'title': optional(record, 'title', slug),
+            'description': optional(record, 'description', ''),
+        }
+
+    def parse_post(self, record):
+        return {
+            'id': number(optional(record, 'id', types=(int, str)), 'id'),
+            'author': required(record, 'author'),
+            'text': required(record, 'text'),
+            'pub_date': moment(record, 'pub_date'),
+            'group': optional(record, 'group'),
+            'image': optional(record, 'image'),
+        }
+
+    def parse_comment(self, record):
+        return {
+            'post': number(required(record, 'post', (int, str)), 'post'),
+            'author': required(record, 'author'),
+            'text': required(record, 'text'),
+            'created': moment(record, 'created'),
+        }
+
+    def parse_follow(self, record):
+        user = required(record, 'user')
+        author = required(record, 'author')
+        if user == author:
+            raise Skip('подписка на себя')
+        return {'user': user, 'author': author}
+
+    def flush(self):
+        """Записывает накопленные строки всех типов."""
+        # Картинки копируются до транзакции, чтобы не держать запись
+        self.copy_images()
+        self.scopes = set()
+        self.indexed = set()
+        # Изменения счётчиков, как их внесли бы сигналы на каждую строку
+        self.comment_counts = Counter()
+        self.stats = {field: Counter() for field in (
+            'posts_count', 'followers_count', 'following_count',
+        )}
+        with transaction.atomic():
+            for kind in TYPES:
+                rows = self.buffers[kind]
+                if rows:
+                    getattr(self, f'flush_{kind}s')(rows)
+                    rows.clear()
+            counters.change_comment_counts(self.comment_counts)
+            counters.change_users_stats(**self.stats)
+            if self.indexed and not self.options['skip_search']:
+                search.index_posts(self.indexed)
+        feed_cache.bump_many(self.scopes)
+
+    def copy_image(self, path):
+        """Нормализует и сохраняет картинку, как форма поста."""
+        field = Post._meta.get_field('image')
+        try:
+            with open(path, 'rb') as source:
+                normalized = uploads.normalize(
+                    File(source, os.path.basename(path))
+                )
+                name = field.storage.save(
+                    field.generate_filename(None, normalized.file.name),
+                    normalized.file,
+                )
+        except (OSError, ValueError) as error:
+            raise Skip(f'картинка {path}: {error}')
+        return name, normalized
+
+    def copy_images(self):
+        rows = [item for item in self.buffers['post'] if item[1]['image']]
+        if not rows:
+            return
+        # Чтение, Pillow и запись отпускают GIL, потоки работают параллельно
+        futures = [self.executor.submit(self.copy_image, row['image'])
+                   for _, row in rows]
+        failed = set()
+        for (location, row), future in zip(rows, futures):
+            try:
+                row['image'], normalized = future.result()
+            except Skip as error:
+                self.skip(location, error)
+                failed.add(location)
+                continue
+            row['image_width'] = normalized.width
+            row['image_height'] = normalized.height
+            row['content_hash'] = normalized.content_hash
+        if failed:
+            self.buffers['post'] = [item for item in self.buffers['post']
+                                    if item[0] not in failed]
+
+    def flush_users(self, rows):
+        existing = set(User.objects.filter(
+            username__in=[row['username'] for _, row in rows]
+        ).values_list('username', flat=True))
+        users = {}
+        for location, row in rows:
+            if row['username'] in existing or row['username'] in users:
+                self.skip(location, f'пользователь {row["username"]} '
+                                    'уже есть')
+                continue
+            users[row['username']] = User(**row)
+        User.objects.bulk_create(users.values())
+        self.created['user'] += len(users)
+
+    def flush_groups(self, rows):
+        existing = set(Group.objects.filter(
+            slug__in=[row['slug'] for _, row in rows]
+        ).values_list('slug', flat=True))
+        groups = {}
+        for location, row in rows:
+            if row['slug'] in existing or row['slug'] in groups:
+                self.skip(location, f'группа {row["slug"]} уже есть')
+                continue
+            groups[row['slug']] = Group(**row)
+        Group.objects.bulk_create(groups.values())
+        self.created['group'] += len(groups)
+
+    def flush_posts(self, rows):
+        users = lookup(User, 'username', [row['author'] for _, row in rows])
+        groups = lookup(Group, 'slug',
+                        [row['group'] for _, row in rows if row['group']])
+        explicit = [row['id'] for _, row in rows if row['id'] is not None]
+        taken = set(Post.objects.filter(pk__in=explicit).values_list(
+            'pk', flat=True
+        )) if explicit else set()
+        if self.next_post_pk is None:
+            self.next_post_pk = bulk.next_pk(Post)
+        posts = []
+        for location, row in rows:
+            if row['author'] not in users:
+                self.skip(location, f'нет пользователя {row["author"]}')
+                continue
+            if row['group'] and row['group'] not in groups:
+                self.skip(location, f'нет группы {row["group"]}')
+                continue
+            pk = row['id']
+            if pk is None:
+                pk = self.next_post_pk
+            elif pk in taken:
+                self.skip(location, f'пост {pk} уже есть')
+                continue
+            taken.add(pk)
+            self.next_post_pk = max(self.next_post_pk, pk + 1)
+            posts.append(ImportedPost(
+                pk=pk, text=row['text'], pub_date=row['pub_date'],
+                author_id=users[row['author']],
+                group_id=groups.get(row['group']),
+                image=row['image'] or '',
+                image_width=row.get('image_width'),
+                image_height=row.get('image_height'),
+                content_hash=row.get('content_hash', ''),
+            ))
+        bulk.insert(Post, (
+            'id', 'text', 'pub_date', 'updated', 'author', 'group', 'image',
+            'image_width', 'image_height', 'content_hash', 'thumbnail',
+            'comment_count',
+        ), (
+            (post.pk, post.text, pub_date, pub_date, post.author_id,
+             post.group_id, post.image, post.image_width,
+             post.image_height, post.content_hash, '', 0)
+            for post in posts
+            for pub_date in [bulk.adapt_datetime(post.pub_date)]
+        ), self.batch_size)
+        tags.add_posts(posts)
+        timeline.fan_out_posts(Post.objects.filter(
+            pk__in=[post.pk for post in posts]
+        ))
+        for post in posts:
+            # Страниц самого нового поста в кеше ещё нет
+            self.scopes.update(feed_cache.post_scopes(post)[:-1])
+            self.indexed.add(post.pk)
+            self.stats['posts_count'][post.author_id] += 1
+            self.images += bool(post.image)
+        self.created['post'] += len(posts)
+
+    def flush_comments(self, rows):
+        users = lookup(User, 'username', [row['author'] for _, row in rows])
+        posts = {
+            post.pk: post for post in Post.objects.filter(
+                pk__in={row['post'] for _, row in rows}
+            ).values_list('pk', 'author_id', 'group_id', named=True)
+        }
+        comments = []
+        for location, row in rows:
+            if row['post'] not in posts:
+                self.skip(location, f'нет поста {row["post"]}')
+                continue
+            if row['author'] not in users:
+                self.skip(location, f'нет пользователя {row["author"]}')
+                continue
+            comments.append((row['post'], users[row['author']], row['text'],
+                             bulk.adapt_datetime(row['created'])))
+        bulk.insert(Comment, ('post', 'author', 'text', 'created'), comments,
+                    self.batch_size)
+        for post_id, *_ in comments:
+            self.scopes.update(feed_cache.post_scopes(posts[post_id]))
+            self.indexed.add(post_id)
+            self.comment_counts[post_id] += 1
+        self.created['comment'] += len(comments)
+
+    def flush_follows(self, rows):
+        users = lookup(User, 'username', [
+            name for _, row in rows for name in (row['user'], row['author'])
+        ])
+        follows = []
+        for location, row in rows:
+            if row['user'] not in users or row['author'] not in users:
+                self.skip(location, 'нет пользователя '
+                                    f'{row["user"]} или {row["author"]}')
+                continue
+            follows.append(Follow(user_id=users[row['user']],
+                                  author_id=users[row['author']]))
+        # SQLite не возвращает pk из bulk_create, новые подписки — всё,
+        # что после последней старой. Уже существующие пропускает база.
+        start = bulk.next_pk(Follow)
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+        created = Follow.objects.filter(pk__gte=start)
+        count = created.count()
+        self.skipped += len(follows) - count
+        timeline.backfill_follows(created)
+        for user_id, author_id in created.values_list('user_id',
+                                                      'author_id'):
+            self.stats['following_count'][user_id] += 1
+            self.stats['followers_count'][author_id] += 1
+        for follow in follows:
+            self.scopes.update(follow_scopes(follow))
+        self.created['follow'] += count
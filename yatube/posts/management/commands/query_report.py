@@ -0,0 +1,73 @@
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from yatube import querylog
+
+
+class Command(BaseCommand):
+    help = (
+        'Сводка по view из лога проверенных запросов: число и время SQL, '
+        'N+1 и медленные запросы с местом вызова'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours', type=float, default=24,
+            help='За сколько последних часов брать записи, 0 — за все',
+        )
+        parser.add_argument(
+            '--path', default=settings.QUERY_LOG_PATH,
+            help='Файл лога, по умолчанию settings.QUERY_LOG_PATH',
+        )
+        parser.add_argument(
+            '--top', type=int, default=10,
+            help='Сколько находок показать',
+        )
+        parser.add_argument(
+            '--json', action='store_true',
+            help='Вывести сводку в JSON',
+        )
+
+    def handle(self, *args, **options):
+        if not options['path']:
+            raise CommandError('Лог запросов не настроен: QUERY_LOG_PATH')
+        records = querylog.read(options['path'])
+        if options['hours']:
+            since = timezone.now() - timedelta(hours=options['hours'])
+            records = (record for record in records
+                       if parse_datetime(record['time']) >= since)
+        report = querylog.summarize(records, options['top'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2,
+                                         ensure_ascii=False))
+            return
+        if not report['views']:
+            self.stdout.write('Записей нет')
+            return
+        self.stdout.write(
+            f'{"view":<30}{"запросов":>10}{"SQL, ср.":>10}'
+            f'{"SQL, макс.":>12}{"БД, мс":>10}{"p95, мс":>10}'
+            f'{"N+1":>6}{"медл.":>7}'
+        )
+        for view in report['views']:
+            self.stdout.write(
+                f'{view["view"]:<30}{view["requests"]:>10}'
+                f'{view["queries_mean"]:>10}{view["queries_max"]:>12}'
+                f'{view["db_ms_mean"]:>10}{view["db_ms_p95"]:>10}'
+                f'{view["n_plus_one"]:>6}{view["slow"]:>7}'
+            )
+        for finding in report['findings']:
+            worst = (f'до {finding["worst"]} раз' if finding['kind'] == 'n+1'
+                     else f'до {finding["worst"]} мс')
+            self.stdout.write(
+                f'\n{finding["kind"]} в {finding["view"]}: '
+                f'{finding["requests"]} запросов, {worst}\n'
+                f'  {finding["site"]} {finding["template"] or ""}\n'
+                f'  {finding["sql"][:200]}'
+            )
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает поисковый индекс постов. Нужен после массовых '
+        'изменений в обход сигналов, например QuerySet.update()'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=search.BATCH_SIZE,
+            help='Сколько постов индексировать за один запрос',
+        )
+
+    def handle(self, *args, **options):
+        # Одна транзакция: поиск не увидит наполовину пустой индекс
+        with transaction.atomic():
+            total = search.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(f'Проиндексировано постов: {total}')
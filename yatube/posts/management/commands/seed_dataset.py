@@ -0,0 +1,238 @@
+import itertools
+import random
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from posts import bulk, counters, search, tags, timeline
+from posts.bulk import adapt_datetime, batches, next_pk
+from posts.models import (Celebrity, Comment, Follow, Group, Post, PostTag,
+                          Tag, TagCount, TimelineEntry, User)
+from posts.synthetic import ENDINGS, vocabulary, zipf
+
+PASSWORD = 'password'
+VOCABULARY_SIZE = 2000
+TAGS_COUNT = 200
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, постами, '
+        'подписками и комментариями для нагрузочных тестов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10_000,
+                            help='Число пользователей')
+        parser.add_argument('--posts', type=int, default=100_000,
+                            help='Число постов')
+        parser.add_argument('--follows', type=int, default=200_000,
+                            help='Число подписок')
+        parser.add_argument('--comments', type=int, default=100_000,
+                            help='Число комментариев')
+        parser.add_argument('--groups', type=int, default=50,
+                            help='Число групп')
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней распределить посты')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Строк в одном INSERT')
+        parser.add_argument('--prefix', default='seed',
+                            help='Префикс имён пользователей и групп')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Начальное значение генератора')
+        parser.add_argument(
+            '--skip-search', action='store_true',
+            help='Не пересобирать поисковый индекс',
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 2 or options['posts'] < 1:
+            raise CommandError('Нужны хотя бы два пользователя и один пост')
+        self.prefix = options['prefix']
+        if User.objects.filter(username=f'{self.prefix}0').exists():
+            raise CommandError(
+                f'Данные с префиксом {self.prefix} уже есть, '
+                'укажите другой --prefix'
+            )
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        words = vocabulary(VOCABULARY_SIZE, self.rng)
+        self.tag_names = [f'{word}{number}'
+                          for number, word in enumerate(words[:TAGS_COUNT])]
+        # Словоформы заранее: текст поста — один вызов choices()
+        self.forms = [word + ending for word in words for ending in ENDINGS]
+        self.form_weights = list(itertools.accumulate(
+            1 / rank for rank in range(1, len(words) + 1)
+            for _ in ENDINGS
+        ))
+
+        bulk.prepare_connection()
+        started = time.perf_counter()
+        # Одна транзакция: на SQLite это ещё и один fsync вместо тысяч
+        with transaction.atomic():
+            users = self.step('Пользователи', self.create_users,
+                              options['users'])
+            groups = self.step('Группы', self.create_groups,
+                               options['groups'])
+            self.step('Подписки', self.create_follows, users,
+                      options['follows'])
+            posts = self.step('Посты', self.create_posts, users, groups,
+                              options['posts'], options['days'])
+            self.step('Комментарии', self.create_comments, users, posts,
+                      options['comments'])
+            self.step('Ленты подписок', self.fan_out, users)
+            self.step('Счётчики', counters.recount_all)
+            # Pk заданы явно
+            bulk.reset_sequences(User, Group, Post)
+        if not options['skip_search']:
+            self.step('Поисковый индекс', search.rebuild)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - started:.1f} с. '
+            f'Пароль всех пользователей: {PASSWORD}'
+        ))
+
+    def step(self, title, function, *args):
+        started = time.perf_counter()
+        result = function(*args)
+        self.stdout.write(f'{title}: {time.perf_counter() - started:.1f} с')
+        return result
+
+    def insert(self, model, fields, rows, ignore_conflicts=False):
+        bulk.insert(model, fields, rows, self.batch_size, ignore_conflicts)
+
+    def text(self, length):
+        return ' '.join(self.rng.choices(self.forms,
+                                         cum_weights=self.form_weights,
+                                         k=length))
+
+    def create_users(self, count):
+        """Пользователи; номер пользователя — его ранг популярности."""
+        start = next_pk(User)
+        password = make_password(PASSWORD)
+        joined = adapt_datetime(timezone.now())
+        self.insert(User, (
+            'id', 'password', 'is_superuser', 'username', 'first_name',
+            'last_name', 'email', 'is_staff', 'is_active', 'date_joined',
+        ), (
+            (start + number, password, False, f'{self.prefix}{number}',
+             f'Имя{number}', f'Фамилия{number}', '', False, True, joined)
+            for number in range(count)
+        ))
+        return range(start, start + count)
+
+    def create_groups(self, count):
+        start = next_pk(Group)
+        Group.objects.bulk_create(
+            Group(pk=start + number, title=f'Группа {number}',
+                  slug=f'{self.prefix}-{number}', description=self.text(10))
+            for number in range(count)
+        )
+        return range(start, start + count)
+
+    def create_follows(self, users, count):
+        """Подписки: на популярных авторов подписываются чаще."""
+        weights = zipf(len(users))
+
+        def pairs():
+            for batch in batches(range(count), self.batch_size):
+                authors = self.rng.choices(users, cum_weights=weights,
+                                           k=len(batch))
+                for author in authors:
+                    user = self.rng.choice(users)
+                    if user != author:
+                        yield user, author
+
+        self.insert(Follow, ('user', 'author'), pairs(),
+                    ignore_conflicts=True)
+
+    def create_posts(self, users, groups, count, days):
+        """Посты по возрастанию даты, активные авторы пишут чаще.
+
+        Активность не связана с популярностью: иначе почти все посты
+        писали бы знаменитости, чьи посты не раскладываются по лентам.
+        """
+        start = next_pk(Post)
+        authors = list(users)
+        self.rng.shuffle(authors)
+        author_weights = zipf(len(authors))
+        tag_weights = zipf(len(self.tag_names))
+        Tag.objects.bulk_create([Tag(name=name) for name in self.tag_names],
+                                ignore_conflicts=True)
+        tag_ids = dict(Tag.objects.filter(
+            name__in=self.tag_names
+        ).values_list('name', 'pk'))
+        now = timezone.now()
+        first = now - timedelta(days=days)
+        step = (now - first) / count
+        window = tags.window_start()
+        hourly = Counter()
+        post_tags = []
+
+        def posts():
+            for number, author in enumerate(self.rng.choices(
+                authors, cum_weights=author_weights, k=count
+            )):
+                pk = start + number
+                pub_date = first + step * number
+                adapted = adapt_datetime(pub_date)
+                names = set(self.rng.choices(
+                    self.tag_names, cum_weights=tag_weights,
+                    k=self.rng.choice((0, 0, 1, 2)),
+                ))
+                text = self.text(self.rng.randint(10, 60))
+                for name in names:
+                    text += f' #{name}'
+                    post_tags.append((pk, tag_ids[name], adapted))
+                    if pub_date >= window:
+                        hour = pub_date.replace(minute=0, second=0,
+                                                microsecond=0)
+                        hourly[tag_ids[name], hour] += 1
+                group = (self.rng.choice(groups)
+                         if groups and self.rng.random() < 0.5 else None)
+                yield (pk, text, adapted, adapted, author, group, '', '', 0)
+
+        for batch in batches(posts(), self.batch_size):
+            self.insert(Post, (
+                'id', 'text', 'pub_date', 'updated', 'author', 'group',
+                'content_hash', 'thumbnail', 'comment_count',
+            ), batch)
+            self.insert(PostTag, ('post', 'tag', 'pub_date'), post_tags)
+            post_tags.clear()
+        TagCount.objects.bulk_create(
+            TagCount(tag_id=tag_id, hour=hour, count=total)
+            for (tag_id, hour), total in hourly.items()
+        )
+        return range(start, start + count)
+
+    def create_comments(self, users, posts, count):
+        created = adapt_datetime(timezone.now())
+        self.insert(Comment, ('post', 'author', 'text', 'created'), (
+            (self.rng.choice(posts), self.rng.choice(users),
+             self.text(self.rng.randint(3, 20)), created)
+            for _ in range(count)
+        ))
+
+    def fan_out(self, users):
+        """Ленты подписок одним INSERT ... SELECT, без знаменитостей."""
+        timeline.promote(Follow.objects.filter(
+            author__gte=users[0], author__lte=users[-1]
+        ))
+        quote = connection.ops.quote_name
+        sql = (
+            f'INSERT INTO {quote(TimelineEntry._meta.db_table)} '
+            '(user_id, post_id, author_id, pub_date) '
+            'SELECT f.user_id, p.id, p.author_id, p.pub_date '
+            f'FROM {quote(Follow._meta.db_table)} f '
+            f'JOIN {quote(Post._meta.db_table)} p '
+            'ON p.author_id = f.author_id '
+            'WHERE f.author_id BETWEEN %s AND %s '
+            'AND f.author_id NOT IN ('
+            f'SELECT author_id FROM {quote(Celebrity._meta.db_table)})'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [users[0], users[-1]])
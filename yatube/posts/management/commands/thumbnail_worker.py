@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+
+
+class Command(BaseCommand):
+    help = (
+        'Делает миниатюры картинок постов из очереди. Воркеров можно '
+        'запускать несколько'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить задачи из очереди и завершиться',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=2,
+            help='Пауза в секундах, когда очередь пуста',
+        )
+        parser.add_argument(
+            '--enqueue-missing', action='store_true',
+            help='Поставить в очередь картинки без миниатюр, например '
+                 'загруженные до появления очереди',
+        )
+
+    def handle(self, *args, **options):
+        if options['enqueue_missing']:
+            count = thumbnails.enqueue_missing()
+            self.stdout.write(f'Поставлено в очередь: {count}')
+        while True:
+            done = thumbnails.work()
+            if done:
+                self.stdout.write(f'Миниатюр сделано: {done}')
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,48 @@
+"""Удаление файлов картинок, на которые больше никто не ссылается.
+
+Один файл в ``ContentAddressedStorage`` может принадлежать нескольким
+постам, поэтому при удалении поста или замене картинки файл удаляется
+только тогда, когда на его имя не ссылается ни одна строка: число
+ссылок — это число постов (и вариантов) с этим именем в базе.
+Проверка идёт после коммита, чтобы не удалить файл, на который
+ссылается ещё не закоммиченная транзакция, которая передумала.
+"""
+import logging
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from sorl import thumbnail
+
+from . import variants
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+
+def references(name):
+    return Post.objects.filter(image=name).count()
+
+
+def _delete_file(storage, name):
+    try:
+        storage.delete(name)
+    except (OSError, SuspiciousFileOperation):
+        logger.warning('Не удалось удалить %s', name, exc_info=True)
+
+
+def _release(image, variant_names):
+    if image and not references(image.name):
+        # Миниатюры sorl и их записи в хранилище ключей вместе с файлом
+        try:
+            thumbnail.delete(image, delete_file=False)
+        except (OSError, SuspiciousFileOperation):
+            logger.warning('Не удалось удалить миниатюры %s', image.name,
+                           exc_info=True)
+        _delete_file(image.storage, image.name)
+    variants.delete_unused(variant_names)
+
+
+def release(image, variant_names=()):
+    """Удаляет ``image`` и файлы вариантов, если они больше не нужны."""
+    variant_names = list(variant_names)
+    transaction.on_commit(lambda: _release(image, variant_names))
@@ -0,0 +1,90 @@
+from django.db import OperationalError, migrations
+
+# Термы FTS5 должны совпадать с термами запросов, поэтому миграция
+# берёт разбор из posts.search.analysis, а не замороженную копию. При
+# смене анализатора индекс всё равно пересобирается командой
+# rebuild_search_index.
+from posts.search import analysis
+
+SQLITE = (
+    "CREATE VIRTUAL TABLE posts_search USING fts5("
+    "text, comments, tokenize='unicode61 remove_diacritics 0')",
+)
+POSTGRESQL = (
+    'CREATE TABLE posts_search ('
+    'post_id integer PRIMARY KEY, document tsvector NOT NULL)',
+    'CREATE INDEX posts_search_document ON posts_search '
+    'USING GIN (document)',
+)
+# Документы строит сама PostgreSQL, без выборки постов в Python
+POSTGRESQL_FILL = (
+    'INSERT INTO posts_search (post_id, document) '
+    "SELECT post.id, setweight(to_tsvector('russian', post.text), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(string_agg("
+    "comment.text, E'\\n' ORDER BY comment.id), '')), 'B') "
+    'FROM {post} post LEFT JOIN {comment} comment '
+    'ON comment.post_id = post.id GROUP BY post.id'
+)
+BATCH_SIZE = 500
+
+
+def terms(text):
+    return ' '.join(analysis.terms(text))
+
+
+def fill_sqlite(apps, connection):
+    Comment = apps.get_model('posts', 'Comment')
+    Post = apps.get_model('posts', 'Post')
+    posts = Post.objects.order_by('pk').values_list('pk', 'text')
+    last = 0
+    while True:
+        batch = list(posts.filter(pk__gt=last)[:BATCH_SIZE])
+        if not batch:
+            return
+        last = batch[-1][0]
+        comments = {pk: [] for pk, _ in batch}
+        for post_id, text in Comment.objects.filter(
+            post_id__in=comments
+        ).order_by('pk').values_list('post_id', 'text'):
+            comments[post_id].append(text)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                'INSERT INTO posts_search (rowid, text, comments) '
+                'VALUES (%s, %s, %s)',
+                [(pk, terms(text), terms('\n'.join(comments[pk])))
+                 for pk, text in batch],
+            )
+
+
+def create_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        try:
+            for sql in SQLITE:
+                schema_editor.execute(sql)
+        except OperationalError:
+            # SQLite без FTS5: поиск будет работать по индексу в памяти
+            return
+        fill_sqlite(apps, connection)
+    elif connection.vendor == 'postgresql':
+        for sql in POSTGRESQL:
+            schema_editor.execute(sql)
+        schema_editor.execute(POSTGRESQL_FILL.format(
+            post=apps.get_model('posts', 'Post')._meta.db_table,
+            comment=apps.get_model('posts', 'Comment')._meta.db_table,
+        ))
+
+
+def drop_index(apps, schema_editor):
+    schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,94 @@
+import re
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+# Разбор текста заморожен на момент миграции: posts.tags может
+# измениться, а миграция должна давать тот же результат
+TAG = re.compile(r'(?<![\w#])#([^\W_]\w*)')
+MENTION = re.compile(r'(?<![\w@])@(\w[\w.@+-]*)')
+MAX_TAG_LENGTH = 50
+BATCH_SIZE = 500
+
+
+def parse_tags(text):
+    return list(dict.fromkeys(
+        name.lower().replace('ё', 'е')[:MAX_TAG_LENGTH]
+        for name in TAG.findall(text)
+    ))
+
+
+def parse_mentions(text):
+    return list(dict.fromkeys(
+        name.rstrip('.-+@') for name in MENTION.findall(text)
+    ))
+
+
+def hour_of(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def fill_tags(apps, schema_editor):
+    Mention = apps.get_model('posts', 'Mention')
+    Post = apps.get_model('posts', 'Post')
+    PostTag = apps.get_model('posts', 'PostTag')
+    Tag = apps.get_model('posts', 'Tag')
+    TagCount = apps.get_model('posts', 'TagCount')
+    User = apps.get_model('auth', 'User')
+
+    start = hour_of(timezone.now()) - timedelta(
+        hours=settings.TRENDING_TAGS_HOURS - 1
+    )
+    tag_ids = {}
+    counts = Counter()
+    post_tags = []
+    mentioned = []
+
+    def flush():
+        PostTag.objects.bulk_create(post_tags)
+        post_tags.clear()
+        users = dict(User.objects.filter(
+            username__in={name for _, _, name, _ in mentioned}
+        ).values_list('username', 'pk'))
+        Mention.objects.bulk_create(
+            Mention(post_id=pk, user_id=users[name], pub_date=pub_date)
+            for pk, author_id, name, pub_date in mentioned
+            if users.get(name, author_id) != author_id
+        )
+        mentioned.clear()
+
+    for pk, author_id, text, pub_date in Post.objects.order_by().values_list(
+        'pk', 'author_id', 'text', 'pub_date'
+    ).iterator(BATCH_SIZE):
+        for name in parse_tags(text):
+            if name not in tag_ids:
+                tag_ids[name] = Tag.objects.create(name=name).pk
+            post_tags.append(PostTag(post_id=pk, tag_id=tag_ids[name],
+                                     pub_date=pub_date))
+            if pub_date >= start:
+                counts[tag_ids[name], hour_of(pub_date)] += 1
+        for name in parse_mentions(text):
+            mentioned.append((pk, author_id, name, pub_date))
+        if len(post_tags) >= BATCH_SIZE or len(mentioned) >= BATCH_SIZE:
+            flush()
+    flush()
+    # Строк не больше, чем тегов × часов окна
+    TagCount.objects.bulk_create(
+        [TagCount(tag_id=tag_id, hour=hour, count=count)
+         for (tag_id, hour), count in counts.items()],
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_tags_mentions'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_tags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 2.2.6 on 2026-10-18 06:46
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_fill_tags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedPost',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post_id', models.PositiveIntegerField()),
+                ('deleted', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 2.2.6 on 2026-10-18 06:48
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_celebrities(apps, schema_editor):
+    # До этой миграции знаменитость определялась числом подписчиков
+    Celebrity = apps.get_model('posts', 'Celebrity')
+    Follow = apps.get_model('posts', 'Follow')
+    Celebrity.objects.bulk_create(
+        [Celebrity(author_id=author_id) for author_id in
+         Follow.objects.order_by().values('author').annotate(
+             followers=Count('id')
+         ).filter(
+             followers__gt=settings.TIMELINE_FANOUT_LIMIT
+         ).values_list('author', flat=True)],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0014_deleted_post'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Celebrity',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='celebrity', serialize=False, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(fill_celebrities, migrations.RunPython.noop),
+    ]
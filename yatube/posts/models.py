@@ -1,5 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils import timezone
+
+from .storage import ContentAddressedStorage
 
 User = get_user_model()
 
@@ -18,22 +21,75 @@ class Group(models.Model):
         super().save(*args, **kwargs)
 
 
+class PostQuerySet(models.QuerySet):
+
+    def feed(self):
+        """Посты для лент: автор и группа загружаются тем же запросом.
+
+        Количество комментариев хранится в самом посте (comment_count),
+        так что карточка поста не делает дополнительных запросов.
+        """
+        return self.select_related('author', 'group')
+
+    # Поля, по которым CursorPaginator сортирует и режет ленту
+    cursor_key = ('pub_date', 'pk')
+
+    def keyed_by(self, pub_date, pk):
+        """Пагинация по полям присоединённой таблицы с теми же значениями."""
+        clone = self._chain()
+        clone.cursor_key = (pub_date, pk)
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone.cursor_key = self.cursor_key
+        return clone
+
+
 class Post(models.Model):
     text = models.TextField(help_text='Напишите что нибудь интересное')
     pub_date = models.DateTimeField('Дата публикации',
                                     auto_now_add=True)
+    updated = models.DateTimeField('Дата изменения', auto_now=True,
+                                   db_index=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE,
                                related_name='posts')
     group = models.ForeignKey(Group, on_delete=models.SET_NULL,
                               related_name='posts', blank=True, null=True,
                               help_text='Выбирете группу публикации')
-    image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    # Одинаковые картинки хранятся одним файлом, см. posts.storage
+    image = models.ImageField(upload_to='posts/', blank=True, null=True,
+                              storage=ContentAddressedStorage())
+    # Заполняются при загрузке, см. posts.uploads
+    image_width = models.PositiveIntegerField(blank=True, null=True,
+                                              editable=False)
+    image_height = models.PositiveIntegerField(blank=True, null=True,
+                                               editable=False)
+    # sha256 сохранённого файла
+    content_hash = models.CharField(max_length=64, blank=True,
+                                    editable=False, db_index=True)
+    # Готовая миниатюра для карточки, её делает фоновый воркер,
+    # см. posts.thumbnails
+    thumbnail = models.ImageField(blank=True, editable=False)
+    # Поддерживается сигналами, см. posts.counters
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self):
         return f'{self.text[:15]}'
 
     class Meta:
         ordering = ['-pub_date']
+        # Под курсорную пагинацию лент: (..., pub_date, id) по убыванию
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date_id'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date_id'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date_id'),
+        ]
 
 
 class Comment(models.Model):
@@ -46,6 +102,10 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['created']
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created'),
+        ]
 
     def __str__(self):
         return f'{self.text[:10]}'
@@ -66,3 +126,191 @@ class Follow(models.Model):
                 fields=['user', 'author'], name='uniq_follow'
             ),
         ]
+        # Индекс (user, author) даёт уникальное ограничение выше
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user'),
+        ]
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, чтобы не считать их на каждой странице."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                primary_key=True, related_name='stats')
+    posts_count = models.PositiveIntegerField(default=0)
+    # Сколько пользователей подписано на него
+    followers_count = models.PositiveIntegerField(default=0)
+    # На скольких авторов подписан он сам
+    following_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.user}'
+
+
+class Celebrity(models.Model):
+    """Автор, чьи посты не раскладываются по лентам подписчиков.
+
+    Статус хранится, а не считается по числу подписчиков: он снимается
+    при меньшем числе, чем ставится, см. posts.timeline.
+    """
+    author = models.OneToOneField(User, on_delete=models.CASCADE,
+                                  primary_key=True,
+                                  related_name='celebrity')
+
+    def __str__(self):
+        return f'{self.author}'
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя.
+
+    Заполняется при публикации поста (fan-out on write), поэтому лента
+    подписок читается одним индексным диапазоном по (user, pub_date).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='timeline')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='timeline_entries')
+    # Копии полей поста, чтобы чистить и сортировать ленту без JOIN
+    author = models.ForeignKey(User, on_delete=models.CASCADE,
+                               related_name='+')
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='uniq_timeline_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_pub_date_post'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author'),
+        ]
+
+
+class ThumbnailJob(models.Model):
+    """Задача на миниатюру загруженной картинки для фонового воркера."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='thumbnail_jobs')
+    # Картинка на момент постановки: если её заменят, задача устареет
+    source = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUSES,
+                              default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['created']
+        indexes = [
+            models.Index(fields=['status', 'created'],
+                         name='thumbnail_job_status'),
+        ]
+
+    def __str__(self):
+        return f'{self.source} ({self.status})'
+
+
+class ImageVariant(models.Model):
+    """Картинка поста в одной ширине и формате, см. posts.variants."""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='image_variants')
+    # Имя файла в хранилище медиа
+    name = models.CharField(max_length=255)
+    format = models.CharField(max_length=4)
+    width = models.PositiveSmallIntegerField()
+    # Размер файла в байтах
+    size = models.PositiveIntegerField()
+
+    def __str__(self):
+        return self.name
+
+
+class Tag(models.Model):
+    """Хештег из текста постов, в нормализованном виде, см. posts.tags."""
+    name = models.CharField('Тег', max_length=50, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
+class PostTag(models.Model):
+    """Тег поста. Копия pub_date — чтобы лента тега шла по индексу."""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='post_tags')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE,
+                            related_name='post_tags')
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'tag'],
+                                    name='uniq_post_tag'),
+        ]
+        indexes = [
+            models.Index(fields=['tag', '-pub_date', '-post'],
+                         name='post_tag_pub_date_post'),
+        ]
+
+
+class Mention(models.Model):
+    """Упоминание пользователя через @username в тексте поста."""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='mentions')
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='mentions')
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'user'],
+                                    name='uniq_mention'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='mention_user_pub_date_post'),
+        ]
+
+
+class TagCount(models.Model):
+    """Сколько постов с тегом опубликовано за час.
+
+    Популярные теги — сумма по часам скользящего окна, поэтому их
+    подсчёт читает не больше «часы окна × теги» строк, а не посты.
+    """
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE,
+                            related_name='counts')
+    hour = models.DateTimeField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tag', 'hour'],
+                                    name='uniq_tag_count'),
+        ]
+        indexes = [
+            models.Index(fields=['hour'], name='tag_count_hour'),
+        ]
+
+
+class DeletedPost(models.Model):
+    """id удалённого поста для индексов поиска в памяти других процессов.
+
+    Их ``sync()`` находит удаления по ``deleted``, см. posts.search.memory.
+    """
+    post_id = models.PositiveIntegerField()
+    deleted = models.DateTimeField(default=timezone.now, db_index=True)
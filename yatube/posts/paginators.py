@@ -0,0 +1,151 @@
+import json
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+NEXT = 'n'
+PREVIOUS = 'p'
+# Дальше OFFSET всё равно бессмысленно медленный, а число * per_page
+# должно помещаться в 64-битный OFFSET базы
+MAX_PAGE_NUMBER = 10_000
+# AutoField в PostgreSQL — 32-битное целое
+MAX_PK = 2 ** 31 - 1
+
+
+def encode_cursor(direction, post):
+    """Непрозрачный токен позиции: направление и ключ (pub_date, id)."""
+    payload = json.dumps(
+        [direction, post.pub_date.isoformat(), post.pk],
+        separators=(',', ':'),
+    )
+    return urlsafe_base64_encode(force_bytes(payload))
+
+
+def decode_cursor(token):
+    """Разбирает токен, для испорченного токена возвращает None."""
+    try:
+        direction, pub_date, pk = json.loads(urlsafe_base64_decode(token))
+        pub_date = parse_datetime(pub_date)
+        if pub_date is None or timezone.is_naive(pub_date):
+            return None
+        # Запрос сравнивает дату в UTC: у краёв диапазона datetime сдвиг
+        # пояса выводит её за пределы
+        pub_date = pub_date.astimezone(timezone.utc)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if direction not in (NEXT, PREVIOUS):
+        return None
+    if isinstance(pk, bool) or not isinstance(pk, int):
+        return None
+    if not 0 < pk <= MAX_PK:
+        return None
+    return direction, pub_date, pk
+
+
+class CursorPage(Page):
+    """Страница ленты, которая знает соседей без подсчёта всех записей."""
+
+    def __init__(self, object_list, number, paginator,
+                 has_next=False, has_previous=False):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return '<Cursor page of %s posts>' % len(self.object_list)
+
+    def has_next(self):
+        return self._has_next and bool(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous and bool(self.object_list)
+
+    @property
+    def next_cursor(self):
+        if not self.has_next():
+            return None
+        return encode_cursor(NEXT, self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous():
+            return None
+        return encode_cursor(PREVIOUS, self.object_list[0])
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по (pub_date, id) вместо COUNT(*) и OFFSET.
+
+    Каждая страница — один индексный запрос вида
+    ``WHERE (pub_date, id) < (...) ORDER BY pub_date DESC, id DESC LIMIT n+1``,
+    поэтому время загрузки не зависит от глубины прокрутки.
+
+    Queryset может указать другие поля с теми же значениями в атрибуте
+    ``cursor_key`` (см. ``PostQuerySet.keyed_by``), чтобы сортировка шла
+    по индексу присоединённой таблицы.
+    """
+
+    default_key = ('pub_date', 'pk')
+
+    def __init__(self, object_list, per_page):
+        self.key = getattr(object_list, 'cursor_key', self.default_key)
+        pub_date, pk = self.key
+        super().__init__(
+            object_list.order_by(f'-{pub_date}', f'-{pk}'), per_page
+        )
+
+    def get_page(self, cursor=None, number=None):
+        """Страница по токену ``cursor``.
+
+        Старые ссылки вида ``?page=N`` продолжают работать через OFFSET,
+        а дальше по ленте пользователь переходит уже по токенам.
+        """
+        if cursor:
+            position = decode_cursor(cursor)
+            if position is not None:
+                return self._page_from_cursor(*position)
+        if number:
+            try:
+                number = int(number)
+            except ValueError:
+                number = 1
+            if number <= MAX_PAGE_NUMBER:
+                return self._page_from_number(number)
+        return self._page_from_number(1)
+
+    def _page_from_number(self, number):
+        number = max(number, 1)
+        bottom = (number - 1) * self.per_page
+        items = list(self.object_list[bottom:bottom + self.per_page + 1])
+        return CursorPage(
+            items[:self.per_page], number, self,
+            has_next=len(items) > self.per_page,
+            has_previous=number > 1,
+        )
+
+    def cursor_queryset(self, direction, pub_date, pk):
+        """Запрос страницы после (NEXT) или до (PREVIOUS) позиции."""
+        date_field, pk_field = self.key
+        lookup = 'lt' if direction == NEXT else 'gt'
+        posts = self.object_list.filter(
+            Q(**{f'{date_field}__{lookup}': pub_date})
+            | Q(**{date_field: pub_date, f'{pk_field}__{lookup}': pk})
+        )
+        if direction == PREVIOUS:
+            posts = posts.reverse()
+        return posts[:self.per_page + 1]
+
+    def _page_from_cursor(self, direction, pub_date, pk):
+        items = list(self.cursor_queryset(direction, pub_date, pk))
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if direction == NEXT:
+            return CursorPage(items, None, self,
+                              has_next=has_more, has_previous=True)
+        items.reverse()
+        return CursorPage(items, None, self,
+                          has_next=True, has_previous=has_more)
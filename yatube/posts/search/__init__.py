@@ -0,0 +1,148 @@
+"""Полнотекстовый поиск по постам и комментариям.
+
+Индекс хранится в базе: на SQLite — таблица FTS5, на PostgreSQL —
+``tsvector`` с GIN-индексом (см. миграцию 0010_search). Если таблицы
+нет (SQLite собран без FTS5, другая СУБД), работает индекс в памяти
+процесса (см. posts.search.memory). ``settings.SEARCH_BACKEND``
+выбирает хранилище явно: ``database``, ``memory`` или ``like``.
+Сигналы сохранения и удаления постов и комментариев обновляют
+документ поста в той же транзакции, ``rebuild_search_index``
+пересобирает индекс целиком.
+
+Результаты упорядочены по релевантности, следующая страница
+запрашивается по курсору (score, id) последнего результата.
+"""
+import json
+import math
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.db import connections, router
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from ..models import Comment, Post
+from ..paginators import MAX_PK
+from .backends import TABLE, LikeBackend, PostgresBackend, SQLiteBackend
+from .memory import MemoryBackend
+
+BATCH_SIZE = 500
+VENDORS = {'sqlite': SQLiteBackend, 'postgresql': PostgresBackend}
+
+Results = namedtuple('Results', 'posts next_cursor')
+
+_backends = {}
+
+
+def backend(using):
+    """Хранилище индекса для базы ``using``."""
+    kind = settings.SEARCH_BACKEND
+    if kind == 'memory':
+        return MemoryBackend(connections[using])
+    if kind == 'like':
+        return LikeBackend(connections[using])
+    if using not in _backends:
+        connection = connections[using]
+        tables = connection.introspection.table_names()
+        _backends[using] = (VENDORS.get(connection.vendor, MemoryBackend)
+                            if TABLE in tables else MemoryBackend)
+    return _backends[using](connections[using])
+
+
+def encode_cursor(score, pk):
+    payload = json.dumps([score, pk], separators=(',', ':'))
+    return urlsafe_base64_encode(force_bytes(payload))
+
+
+def decode_cursor(token):
+    """Позиция (score, id) из токена, для испорченного — None."""
+    if not token:
+        return None
+    try:
+        score, pk = json.loads(urlsafe_base64_decode(token))
+        score, pk = float(score), int(pk)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if not math.isfinite(score) or not 0 < pk <= MAX_PK:
+        return None
+    return score, pk
+
+
+def documents(pks, using):
+    """Документы индекса (id, текст поста, тексты комментариев)."""
+    texts = dict(Post.objects.using(using).filter(
+        pk__in=pks
+    ).values_list('pk', 'text'))
+    comments = defaultdict(list)
+    for post_id, text in Comment.objects.using(using).filter(
+        post_id__in=pks
+    ).order_by('pk').values_list('post_id', 'text'):
+        comments[post_id].append(text)
+    return [(pk, texts[pk], '\n'.join(comments[pk]))
+            for pk in pks if pk in texts]
+
+
+def index_posts(pks, using=None):
+    using = using or router.db_for_write(Post)
+    pks = list(pks)
+    found = documents(pks, using)
+    backend(using).index(found)
+    missing = set(pks) - {pk for pk, _, _ in found}
+    if missing:
+        remove_posts(missing, using)
+
+
+def touch(pks, using=None):
+    """Сдвигает ``Post.updated``, когда документ поста изменился без
+    сохранения поста: по нему индекс в памяти других процессов находит
+    изменения."""
+    using = using or router.db_for_write(Post)
+    Post.objects.using(using).filter(pk__in=pks).update(
+        updated=timezone.now()
+    )
+
+
+def remove_posts(pks, using=None):
+    using = using or router.db_for_write(Post)
+    backend(using).remove(list(pks))
+
+
+def rebuild(using=None, batch_size=BATCH_SIZE):
+    """Пересобирает индекс, возвращает число проиндексированных постов."""
+    using = using or router.db_for_write(Post)
+    store = backend(using)
+    store.clear()
+    total = 0
+    last_pk = 0
+    while True:
+        pks = list(Post.objects.using(using).filter(
+            pk__gt=last_pk
+        ).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            store.save()
+            return total
+        index_posts(pks, using)
+        total += len(pks)
+        last_pk = pks[-1]
+
+
+def find(query, limit, cursor=None):
+    """Страница постов по запросу ``query`` после позиции ``cursor``."""
+    using = router.db_for_read(Post)
+    rows = backend(using).search(query, limit + 1, decode_cursor(cursor))
+    rows, has_next = rows[:limit], len(rows) > limit
+    posts = Post.objects.feed().using(using).in_bulk(
+        [pk for _, pk in rows]
+    )
+    return Results(
+        # Строки индекса, чей пост удалён мимо сигналов, пропускаем
+        [posts[pk] for _, pk in rows if pk in posts],
+        encode_cursor(*rows[-1]) if has_next else None,
+    )
+
+
+def matching_ids(query, limit):
+    """id самых релевантных постов, для поиска в админке."""
+    using = router.db_for_read(Post)
+    return [pk for _, pk in backend(using).search(query, limit)]
@@ -0,0 +1,152 @@
+"""Разбор текста на термы для поискового индекса.
+
+Слова приводятся к нижнему регистру, «ё» — к «е», русские слова
+стеммируются алгоритмом Snowball (тот же, что у словаря ``russian``
+в PostgreSQL), поэтому «книги», «книгу» и «книгой» дают один терм
+«книг». Остальные слова и числа остаются как есть.
+"""
+import re
+from functools import lru_cache
+
+WORD = re.compile(r'[^\W_]+')
+# Длиннее этого — не слово, а мусор вроде base64 в тексте
+MAX_WORD_LENGTH = 64
+
+VOWELS = 'аеиоуыэюя'
+
+
+def _longest_first(*groups):
+    """Окончания групп и их длины от длинных к коротким.
+
+    Группа — (окончания, нужна ли перед окончанием «а» или «я»). По
+    словарю окончание ищется за несколько обращений вместо перебора.
+    """
+    endings = {suffix: after_a for suffixes, after_a in groups
+               for suffix in suffixes}
+    return endings, sorted({len(suffix) for suffix in endings},
+                           reverse=True)
+
+
+PERFECTIVE_GERUND = _longest_first(
+    (('в', 'вши', 'вшись'), True),
+    (('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'), False),
+)
+ADJECTIVE = _longest_first(
+    (('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+      'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+      'ая', 'яя', 'ою', 'ею'), False),
+)
+PARTICIPLE = _longest_first(
+    (('ем', 'нн', 'вш', 'ющ', 'щ'), True),
+    (('ивш', 'ывш', 'ующ'), False),
+)
+REFLEXIVE = _longest_first((('ся', 'сь'), False))
+VERB = _longest_first(
+    (('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет',
+      'ют', 'ны', 'ть', 'ешь', 'нно'), True),
+    (('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+      'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+      'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'), False),
+)
+NOUN = _longest_first(
+    (('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+      'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+      'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+      'ья', 'я'), False),
+)
+SUPERLATIVE = _longest_first((('ейше', 'ейш'), False))
+DERIVATIONAL = ('ость', 'ост')
+
+
+def _remove(rv, endings):
+    """``rv`` без самого длинного подходящего окончания или None."""
+    endings, lengths = endings
+    for length in lengths:
+        after_a = endings.get(rv[-length:]) if length <= len(rv) else None
+        if after_a is None:
+            continue
+        rest = rv[:-length]
+        if after_a and not rest.endswith(('а', 'я')):
+            continue
+        return rest
+    return None
+
+
+def _region(word, start):
+    """Начало области после первой согласной, идущей за гласной."""
+    for index in range(start + 1, len(word)):
+        if word[index] not in VOWELS and word[index - 1] in VOWELS:
+            return index + 1
+    return len(word)
+
+
+def _step1(rv):
+    """Шаг 1: деепричастие, иначе возвратность и окончание прилагательного,
+    причастия, глагола или существительного."""
+    rest = _remove(rv, PERFECTIVE_GERUND)
+    if rest is not None:
+        return rest
+    reflexive = _remove(rv, REFLEXIVE)
+    if reflexive is not None:
+        rv = reflexive
+    rest = _remove(rv, ADJECTIVE)
+    if rest is not None:
+        participle = _remove(rest, PARTICIPLE)
+        return rest if participle is None else participle
+    for endings in (VERB, NOUN):
+        rest = _remove(rv, endings)
+        if rest is not None:
+            return rest
+    return rv
+
+
+def _step3(rv, r2):
+    """Шаг 3: словообразовательный суффикс, если он целиком в R2."""
+    for suffix in DERIVATIONAL:
+        if rv.endswith(suffix) and len(rv) - len(suffix) >= r2:
+            return rv[:-len(suffix)]
+    return rv
+
+
+def _step4(rv):
+    """Шаг 4: «нн» в конце, превосходная степень или мягкий знак."""
+    if rv.endswith('нн'):
+        return rv[:-1]
+    rest = _remove(rv, SUPERLATIVE)
+    if rest is not None:
+        return rest[:-1] if rest.endswith('нн') else rest
+    return rv[:-1] if rv.endswith('ь') else rv
+
+
+# Словарь живого языка невелик, а стемминг — самая дорогая часть
+# индексации
+@lru_cache(maxsize=2 ** 18)
+def stem(word):
+    """Основа русского слова по алгоритму Snowball."""
+    word = word.lower().replace('ё', 'е')
+    rv_start = next(
+        (index + 1 for index, char in enumerate(word) if char in VOWELS),
+        None,
+    )
+    if rv_start is None:
+        return word
+    r2 = _region(word, _region(word, 0))
+    prefix, rv = word[:rv_start], word[rv_start:]
+
+    rv = _step1(rv)
+    # Шаг 2
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    rv = _step3(rv, max(r2 - rv_start, 0))
+    return prefix + _step4(rv)
+
+
+def tokenize(text):
+    return [word for word in WORD.findall(text.lower().replace('ё', 'е'))
+            if len(word) <= MAX_WORD_LENGTH]
+
+
+def terms(text):
+    """Термы текста в порядке следования, с повторами."""
+    # В словах без русских гласных стеммер ничего не отрезает
+    return [stem(word) for word in tokenize(text)]
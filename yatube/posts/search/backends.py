@@ -0,0 +1,159 @@
+"""Хранилища поискового индекса.
+
+Документ индекса — пост: его текст и тексты всех комментариев, текст
+поста весит больше. ``search`` возвращает пары (score, id поста),
+отсортированные по возрастанию score (лучшие первыми), и продолжает
+выдачу после позиции ``after`` — keyset-пагинация по (score, id).
+"""
+from django.db.models import Q
+
+from ..models import Post
+from .analysis import terms
+
+TABLE = 'posts_search'
+
+
+def _after_clause(after):
+    if after is None:
+        return '', []
+    score, pk = after
+    return 'WHERE score > %s OR (score = %s AND id > %s)', [score, score, pk]
+
+
+class SQLiteBackend:
+    """Таблица FTS5 с rowid = id поста.
+
+    Встроенные токенизаторы FTS5 не знают русского, поэтому в таблицу
+    пишутся и в MATCH передаются уже стеммированные термы.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def index(self, documents):
+        with self.connection.cursor() as cursor:
+            self._delete(cursor, [pk for pk, _, _ in documents])
+            cursor.executemany(
+                f'INSERT INTO {TABLE} (rowid, text, comments) '
+                'VALUES (%s, %s, %s)',
+                [(pk, ' '.join(terms(text)), ' '.join(terms(comments)))
+                 for pk, text, comments in documents],
+            )
+
+    def remove(self, pks):
+        with self.connection.cursor() as cursor:
+            self._delete(cursor, pks)
+
+    def _delete(self, cursor, pks):
+        cursor.executemany(f'DELETE FROM {TABLE} WHERE rowid = %s',
+                           [(pk,) for pk in pks])
+
+    def clear(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE}')
+
+    def save(self):
+        """Индекс в базе сохраняется вместе с транзакцией."""
+
+    def search(self, query, limit, after=None):
+        words = terms(query)
+        if not words:
+            return []
+        match = ' '.join(f'"{word}"' for word in words)
+        where, params = _after_clause(after)
+        # bm25 меньше — лучше; текст поста вчетверо важнее комментариев
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT score, id FROM ('
+                f'SELECT bm25({TABLE}, 4.0, 1.0) AS score, rowid AS id '
+                f'FROM {TABLE} WHERE {TABLE} MATCH %s) {where} '
+                'ORDER BY score, id LIMIT %s',
+                [match, *params, limit],
+            )
+            return cursor.fetchall()
+
+
+class PostgresBackend:
+    """``tsvector`` со словарём ``russian`` и GIN-индексом."""
+
+    CONFIG = 'russian'
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def index(self, documents):
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {TABLE} (post_id, document) VALUES '
+                f"(%s, setweight(to_tsvector('{self.CONFIG}', %s), 'A') || "
+                f"setweight(to_tsvector('{self.CONFIG}', %s), 'B')) "
+                'ON CONFLICT (post_id) DO UPDATE '
+                'SET document = EXCLUDED.document',
+                documents,
+            )
+
+    def remove(self, pks):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE} WHERE post_id = ANY(%s)',
+                           [list(pks)])
+
+    def clear(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {TABLE}')
+
+    def save(self):
+        pass
+
+    def search(self, query, limit, after=None):
+        if not terms(query):
+            return []
+        where, params = _after_clause(after)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT score, id FROM ('
+                # float8, чтобы score из курсора сравнивался точно
+                f'SELECT -ts_rank_cd(document, query)::float8 AS score, '
+                f'post_id AS id FROM {TABLE}, '
+                f"plainto_tsquery('{self.CONFIG}', %s) query "
+                f'WHERE document @@ query) ranked {where} '
+                'ORDER BY score, id LIMIT %s',
+                [query, *params, limit],
+            )
+            return cursor.fetchall()
+
+
+class LikeBackend:
+    """Без индекса: LIKE по основам слов, новые посты первыми.
+
+    Читает всю таблицу, а в SQLite LIKE не сравнивает без учёта
+    регистра кириллицу. Оставлен для сравнения в бенчмарке.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def index(self, documents):
+        pass
+
+    def remove(self, pks):
+        pass
+
+    def clear(self):
+        pass
+
+    def save(self):
+        pass
+
+    def search(self, query, limit, after=None):
+        words = terms(query)
+        if not words:
+            return []
+        condition = Q()
+        for word in words:
+            condition &= (Q(text__icontains=word)
+                          | Q(comment__text__icontains=word))
+        posts = Post.objects.using(self.connection.alias).filter(condition)
+        if after is not None:
+            posts = posts.filter(pk__lt=after[1])
+        ids = posts.order_by('-pk').values_list('pk', flat=True).distinct()
+        return [(-pk, pk) for pk in ids[:limit]]
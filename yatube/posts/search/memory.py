@@ -0,0 +1,518 @@
+"""Поисковый индекс в памяти процесса.
+
+Нужен там, где в базе нет своего индекса (SQLite без FTS5), и в
+тестах. Индекс обратный: для каждого терма — отсортированный по
+возрастанию список id постов в ``array('I')``, 4 байта на вхождение
+вместо объекта int на каждое.
+
+Индекс состоит из двух частей:
+
+* основа — файл, который открывается через mmap: термы отсортированы,
+  списки лежат подряд, поэтому старт воркера не перестраивает индекс и
+  не читает файл в память, страницы подгружает ОС по мере обращения;
+* дельта — изменения после загрузки: новые списки в памяти процесса и
+  множество id, чьи вхождения в основе больше не действуют (пост
+  удалён или переиндексирован в дельту).
+
+``save`` сливает дельту с основой в новый файл. Запрос — термы через
+пробел (И), ``OR`` между группами (ИЛИ), ``*`` в конце слова — поиск
+по префиксу. Результаты идут от новых постов к старым: каждый узел
+запроса умеет найти наибольший подходящий id не больше заданного, так
+что страница из N результатов стоит O(N · термы · log n) независимо
+от числа совпадений.
+"""
+import bisect
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import transaction
+
+from ..models import DeletedPost, Post
+from .analysis import WORD, terms
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'YTSI'
+VERSION = 1
+# magic, версия, порядок байт, число термов, наибольший id, число
+# вхождений, момент, до которого в индексе учтены все правки
+HEADER = struct.Struct('<4sBB2xIIQd')
+BYTE_ORDER = {'little': 0, 'big': 1}[sys.byteorder]
+MIN_PREFIX_LENGTH = 2
+# Префикс из одной-двух букв раскрывается в слишком много термов
+MAX_PREFIX_TERMS = 256
+# Правки, закоммиченные другим процессом с более ранним updated, чем
+# уже учтённые, подхватываются за счёт перекрытия окна синхронизации
+SYNC_OVERLAP = 60
+BATCH_SIZE = 1000
+# Столько хранятся id удалённых постов. Индекс из файла старше этого
+# строится заново: какие посты удалили, уже не узнать
+TOMBSTONE_TTL = 7 * 24 * 3600
+
+
+def _pad(size):
+    return -size % 8
+
+
+class Segment:
+    """Основа индекса поверх буфера (mmap или bytes) без копирования."""
+
+    def __init__(self, buffer=None):
+        if buffer is None:
+            buffer = Segment.encode([], 0, 0.0)
+        view = memoryview(buffer)
+        magic, version, byte_order, count, max_pk, total, watermark = (
+            HEADER.unpack_from(view)
+        )
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('Неизвестный формат файла индекса')
+        if byte_order != BYTE_ORDER:
+            raise ValueError('Индекс записан с другим порядком байт')
+        self.buffer = buffer
+        self.count = count
+        self.max_pk = max_pk
+        self.watermark = watermark
+        offset = HEADER.size
+        self.term_offsets, offset = self._section(view, offset, count + 1,
+                                                  'Q')
+        self.postings_offsets, offset = self._section(view, offset,
+                                                      count + 1, 'Q')
+        self.postings, offset = self._section(view, offset, total, 'I')
+        self.terms = view[offset:]
+
+    @staticmethod
+    def _section(view, offset, length, typecode):
+        size = length * array(typecode).itemsize
+        section = view[offset:offset + size].cast(typecode)
+        return section, offset + size + _pad(size)
+
+    @staticmethod
+    def encode(items, max_pk, watermark):
+        """Байты основы из пар (терм в UTF-8, массив id) по порядку."""
+        term_offsets = array('Q', [0])
+        postings_offsets = array('Q', [0])
+        blob = bytearray()
+        postings = array('I')
+        for term, pks in items:
+            blob += term
+            postings.extend(pks)
+            term_offsets.append(len(blob))
+            postings_offsets.append(len(postings))
+        parts = [HEADER.pack(MAGIC, VERSION, BYTE_ORDER, len(items), max_pk,
+                             len(postings), watermark)]
+        for section in (term_offsets, postings_offsets, postings):
+            data = section.tobytes()
+            parts.append(data + bytes(_pad(len(data))))
+        parts.append(bytes(blob))
+        return b''.join(parts)
+
+    def term(self, index):
+        offsets = self.term_offsets
+        return bytes(self.terms[offsets[index]:offsets[index + 1]])
+
+    def lookup(self, term):
+        """Номер терма (UTF-8) или None."""
+        index = self.lower_bound(term)
+        if index < self.count and self.term(index) == term:
+            return index
+        return None
+
+    def lower_bound(self, term):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.term(middle) < term:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def with_prefix(self, prefix):
+        index = self.lower_bound(prefix)
+        while index < self.count:
+            term = self.term(index)
+            if not term.startswith(prefix):
+                break
+            yield term, index
+            index += 1
+
+    def postings_at(self, index):
+        offsets = self.postings_offsets
+        return self.postings[offsets[index]:offsets[index + 1]]
+
+
+class Postings:
+    """Список вхождений терма: часть из основы и часть из дельты."""
+
+    def __init__(self, parts, deleted):
+        # Удалённые id прячутся только в основе, в дельте их уже нет
+        self.parts = [(part, deleted if index == 0 else None)
+                      for index, part in enumerate(parts) if len(part)]
+        self.size = sum(len(part) for part, _ in self.parts)
+        self.last = None
+
+    def floor(self, pk):
+        """Наибольший id не больше ``pk`` или None."""
+        # Запрос спускается по id вниз: прошлый ответ, если он не больше
+        # ``pk``, остаётся верным и без поиска
+        if self.last is not None:
+            asked, found = self.last
+            if asked >= pk and (found is None or found <= pk):
+                return found
+        best = self._floor(pk)
+        self.last = (pk, best)
+        return best
+
+    def _floor(self, pk):
+        best = None
+        for part, deleted in self.parts:
+            index = bisect.bisect_right(part, pk) - 1
+            while deleted and index >= 0 and part[index] in deleted:
+                index -= 1
+            if index >= 0 and (best is None or part[index] > best):
+                best = part[index]
+        return best
+
+
+class Any:
+    """ИЛИ: наибольший id среди потомков."""
+
+    def __init__(self, children):
+        self.children = children
+        self.size = sum(child.size for child in children)
+
+    def floor(self, pk):
+        found = [value for value in (child.floor(pk)
+                                     for child in self.children)
+                 if value is not None]
+        return max(found) if found else None
+
+
+class All:
+    """И: спускается, пока все потомки не сойдутся на одном id."""
+
+    def __init__(self, children):
+        # Первым проверяется самый короткий список, он отсекает больше
+        self.children = sorted(children, key=lambda child: child.size)
+        self.size = self.children[0].size if children else 0
+
+    def floor(self, pk):
+        if not self.children:
+            return None
+        while pk is not None:
+            for child in self.children:
+                value = child.floor(pk)
+                if value is None:
+                    return None
+                if value != pk:
+                    pk = value
+                    break
+            else:
+                return pk
+        return None
+
+
+class InvertedIndex:
+
+    def __init__(self, segment=None):
+        self.base = segment or Segment()
+        self.deleted = set()
+        self.delta = {}
+        self.forward = {}
+        self.watermark = self.base.watermark
+        self._delta_terms = None
+        self.lock = threading.RLock()
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(Segment(buffer))
+
+    def add(self, pk, text):
+        words = set(terms(text))
+        with self.lock:
+            self._remove(pk)
+            for word in words:
+                postings = self.delta.get(word)
+                if postings is None:
+                    postings = self.delta[word] = array('I')
+                    self._delta_terms = None
+                if not postings or postings[-1] < pk:
+                    postings.append(pk)
+                else:
+                    postings.insert(bisect.bisect_left(postings, pk), pk)
+            self.forward[pk] = tuple(words)
+
+    def remove(self, pk):
+        with self.lock:
+            self._remove(pk)
+
+    def _remove(self, pk):
+        for word in self.forward.pop(pk, ()):
+            postings = self.delta[word]
+            del postings[bisect.bisect_left(postings, pk)]
+        if pk <= self.base.max_pk:
+            self.deleted.add(pk)
+
+    def _postings(self, word, index=None):
+        if index is None:
+            index = self.base.lookup(word.encode())
+        base = self.base.postings_at(index) if index is not None else ()
+        return Postings([base, self.delta.get(word, ())], self.deleted)
+
+    def _prefix(self, prefix):
+        if self._delta_terms is None:
+            self._delta_terms = sorted(self.delta)
+        words = {}
+        for term, index in self.base.with_prefix(prefix.encode()):
+            words[term.decode()] = index
+            if len(words) >= MAX_PREFIX_TERMS:
+                break
+        start = bisect.bisect_left(self._delta_terms, prefix)
+        for word in self._delta_terms[start:]:
+            if not word.startswith(prefix) or len(words) >= MAX_PREFIX_TERMS:
+                break
+            words.setdefault(word, None)
+        return Any([self._postings(word, index)
+                    for word, index in words.items()])
+
+    def parse(self, query):
+        groups = [[]]
+        for token in query.split():
+            if token in ('OR', 'ИЛИ', '|'):
+                groups.append([])
+            elif token.endswith('*'):
+                prefix = ''.join(WORD.findall(
+                    token.lower().replace('ё', 'е')
+                ))
+                if len(prefix) >= MIN_PREFIX_LENGTH:
+                    groups[-1].append(self._prefix(prefix))
+            else:
+                groups[-1].extend(self._postings(word)
+                                  for word in terms(token))
+        return Any([All(group) for group in groups if group])
+
+    def search(self, query, limit, before=None):
+        """id постов по убыванию, меньше ``before``, не больше ``limit``."""
+        with self.lock:
+            node = self.parse(query)
+            pk = (before - 1) if before is not None else 2 ** 32 - 1
+            found = []
+            while len(found) < limit and pk >= 0:
+                pk = node.floor(pk)
+                if pk is None:
+                    break
+                found.append(pk)
+                pk -= 1
+            return found
+
+    def items(self):
+        """Пары (терм в UTF-8, id по возрастанию) после слияния."""
+        delta = sorted((word.encode(), postings)
+                       for word, postings in self.delta.items())
+        base = self.base
+        index, position = 0, 0
+        while index < base.count or position < len(delta):
+            term = base.term(index) if index < base.count else None
+            if position < len(delta) and (term is None
+                                          or delta[position][0] <= term):
+                word, extra = delta[position]
+                position += 1
+                if word != term:
+                    if extra:
+                        yield word, extra
+                    continue
+            else:
+                word, extra = term, ()
+            pks = base.postings_at(index)
+            index += 1
+            if self.deleted:
+                pks = array('I', [pk for pk in pks
+                                  if pk not in self.deleted])
+            if extra:
+                pks = array('I', sorted([*pks, *extra]))
+            if len(pks):
+                yield word, pks
+
+    def save(self, path, watermark=None):
+        """Записывает индекс в файл и дальше читает основу из него."""
+        with self.lock:
+            if watermark is not None:
+                self.watermark = watermark
+            max_pk = max([self.base.max_pk,
+                          *(postings[-1] for postings in self.delta.values()
+                            if postings)])
+            data = Segment.encode(list(self.items()), max_pk,
+                                  self.watermark)
+            directory = os.path.dirname(os.path.abspath(path))
+            fd, temporary = tempfile.mkstemp(dir=directory)
+            try:
+                with os.fdopen(fd, 'wb') as file:
+                    file.write(data)
+                os.replace(temporary, path)
+            except BaseException:
+                if os.path.exists(temporary):
+                    os.remove(temporary)
+                raise
+            loaded = InvertedIndex.load(path)
+            self.base = loaded.base
+            self.deleted = set()
+            self.delta = {}
+            self.forward = {}
+            self._delta_terms = None
+
+
+def _timestamp(value):
+    return datetime.fromtimestamp(value, tz=timezone.utc)
+
+
+def build(using=None):
+    """Индекс всех постов из базы."""
+    from . import documents
+
+    index = InvertedIndex()
+    index.watermark = time.time()
+    posts = Post.objects.using(using).order_by('pk')
+    last_pk = 0
+    while True:
+        pks = list(posts.filter(pk__gt=last_pk).values_list(
+            'pk', flat=True
+        )[:BATCH_SIZE])
+        if not pks:
+            return index
+        for pk, text, comments in documents(pks, using):
+            index.add(pk, f'{text}\n{comments}')
+        last_pk = pks[-1]
+
+
+def sync(index, using=None):
+    """Добирает посты, изменённые после ``index.watermark``."""
+    from . import documents
+
+    started = time.time()
+    since = _timestamp(index.watermark - SYNC_OVERLAP)
+    # Сначала удаления: пост, загруженный потом с тем же id, вернётся
+    # в индекс ниже
+    for pk in DeletedPost.objects.using(using).filter(
+        deleted__gt=since
+    ).values_list('post_id', flat=True).iterator():
+        index.remove(pk)
+    pks = list(Post.objects.using(using).filter(
+        updated__gt=since
+    ).values_list('pk', flat=True))
+    for start in range(0, len(pks), BATCH_SIZE):
+        for pk, text, comments in documents(pks[start:start + BATCH_SIZE],
+                                            using):
+            index.add(pk, f'{text}\n{comments}')
+    index.watermark = started
+
+
+_engine = None
+_synced = 0.0
+_engine_lock = threading.Lock()
+
+
+def engine(using=None):
+    """Индекс процесса: из файла ``SEARCH_INDEX_PATH`` или из базы."""
+    global _engine, _synced
+    with _engine_lock:
+        if _engine is None:
+            _engine = _open(using)
+            _synced = time.monotonic()
+        elif time.monotonic() - _synced >= settings.SEARCH_SYNC_INTERVAL:
+            # Посты, которые сохранили другие процессы
+            sync(_engine, using)
+            _synced = time.monotonic()
+        return _engine
+
+
+def _open(using):
+    path = settings.SEARCH_INDEX_PATH
+    if path and os.path.exists(path):
+        try:
+            index = InvertedIndex.load(path)
+        except (OSError, ValueError):
+            logger.warning('Не удалось открыть индекс %s, строим заново',
+                           path, exc_info=True)
+        else:
+            if time.time() - index.watermark < TOMBSTONE_TTL:
+                sync(index, using)
+                return index
+            logger.info('Индекс %s устарел, строим заново', path)
+    index = build(using)
+    if path:
+        index.save(path)
+    return index
+
+
+def reset():
+    """Забывает индекс процесса, следующий запрос откроет его заново."""
+    global _engine
+    with _engine_lock:
+        _engine = None
+
+
+class MemoryBackend:
+    """Хранилище поиска поверх ``engine()``.
+
+    Изменения применяются после коммита: откат транзакции не должен
+    оставлять в памяти текст, которого нет в базе.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def _apply(self, change):
+        transaction.on_commit(change, using=self.connection.alias)
+
+    def index(self, documents):
+        documents = list(documents)
+
+        def change():
+            index = engine(self.connection.alias)
+            for pk, text, comments in documents:
+                index.add(pk, f'{text}\n{comments}')
+        self._apply(change)
+
+    def remove(self, pks):
+        pks = list(pks)
+        # Остальные процессы узнают об удалении из таблицы при sync()
+        deleted = DeletedPost.objects.using(self.connection.alias)
+        deleted.filter(
+            deleted__lt=_timestamp(time.time() - TOMBSTONE_TTL)
+        ).delete()
+        deleted.bulk_create([DeletedPost(post_id=pk) for pk in pks])
+
+        def change():
+            index = engine(self.connection.alias)
+            for pk in pks:
+                index.remove(pk)
+        self._apply(change)
+
+    def clear(self):
+        def change():
+            global _engine
+            with _engine_lock:
+                _engine = InvertedIndex()
+                _engine.watermark = time.time()
+        self._apply(change)
+
+    def save(self):
+        path = settings.SEARCH_INDEX_PATH
+        if path:
+            self._apply(lambda: engine(self.connection.alias).save(path))
+
+    def search(self, query, limit, after=None):
+        before = after[1] if after is not None else None
+        pks = engine(self.connection.alias).search(query, limit, before)
+        return [(-pk, pk) for pk in pks]
@@ -0,0 +1,118 @@
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import counters, feed_cache, media, search, tags, timeline
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.create(user=instance)
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, **kwargs):
+    # Пост мог сменить группу: старую ленту группы тоже надо сбросить.
+    # Картинку — освободить, если её заменили. Поисковый документ —
+    # обновить, только если изменился текст.
+    if instance.pk is not None:
+        previous = Post.objects.filter(pk=instance.pk).only(
+            'group_id', 'image', 'text'
+        ).first()
+        if previous is not None:
+            instance._previous_group_id = previous.group_id
+            instance._previous_image = previous.image
+            instance._previous_text = previous.text
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, using, **kwargs):
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    feed_cache.bump(*feed_cache.post_scopes(instance),
+                    f'group:{previous_group_id}')
+    previous_image = getattr(instance, '_previous_image', None)
+    if previous_image and previous_image.name != instance.image.name:
+        media.release(previous_image)
+    if getattr(instance, '_previous_text', None) != instance.text:
+        search.index_posts([instance.pk], using)
+        tags.update(instance)
+    if created:
+        counters.change_user_stats(instance.author_id, posts_count=1)
+        timeline.fan_out(instance)
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    # Строки вариантов удалятся каскадом раньше, чем придёт post_delete
+    instance._variant_names = list(
+        instance.image_variants.values_list('name', flat=True)
+    )
+    instance._tag_ids = tags.forget(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, using, **kwargs):
+    feed_cache.bump(*feed_cache.post_scopes(instance))
+    search.remove_posts([instance.pk], using)
+    tags.deleted(instance, getattr(instance, '_tag_ids', ()))
+    counters.change_user_stats(instance.author_id, posts_count=-1)
+    media.release(instance.image, getattr(instance, '_variant_names', ()))
+
+
+def comment_scopes(comment):
+    # Счётчик комментариев виден в карточке поста во всех лентах
+    post = Post.objects.filter(pk=comment.post_id).only(
+        'group_id', 'author_id'
+    ).first()
+    if post is None:
+        return ('index', f'post:{comment.post_id}')
+    return feed_cache.post_scopes(post)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, using, **kwargs):
+    feed_cache.bump(*comment_scopes(instance))
+    search.index_posts([instance.post_id], using)
+    if created:
+        counters.change_comment_count(instance.post_id, 1)
+    else:
+        search.touch([instance.post_id], using)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, using, **kwargs):
+    feed_cache.bump(*comment_scopes(instance))
+    search.index_posts([instance.post_id], using)
+    counters.change_comment_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    feed_cache.bump('index', f'group:{instance.pk}')
+
+
+def follow_scopes(follow):
+    return (f'user:{follow.author_id}', f'user:{follow.user_id}',
+            f'follow:{follow.user_id}')
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    feed_cache.bump(*follow_scopes(instance))
+    if created:
+        counters.change_user_stats(instance.author_id, followers_count=1)
+        counters.change_user_stats(instance.user_id, following_count=1)
+        timeline.backfill(instance.user_id, instance.author_id)
+        timeline.follow_changed(instance.author_id, created=True)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    feed_cache.bump(*follow_scopes(instance))
+    counters.change_user_stats(instance.author_id, followers_count=-1)
+    counters.change_user_stats(instance.user_id, following_count=-1)
+    timeline.trim(instance.user_id, instance.author_id)
+    timeline.follow_changed(instance.author_id, created=False)
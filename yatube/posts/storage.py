@@ -0,0 +1,65 @@
+"""Хранилище картинок постов с адресацией по содержимому.
+
+Файл сохраняется под именем из sha256 содержимого,
+``posts/ab/abcdef….jpg``, поэтому одинаковые картинки разных постов —
+один файл на диске: повторная загрузка ничего не пишет, а миниатюры
+sorl и варианты (ключ у них — имя исходника) делаются один раз.
+Удаляет файлы не хранилище, а ``posts.media.release``, когда на имя не
+ссылается ни один пост.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+def content_name(name, content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    directory = os.path.dirname(name)
+    extension = os.path.splitext(name)[1].lower()
+    value = digest.hexdigest()
+    return os.path.join(directory, value[:2], value + extension)
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        return super().save(content_name(name, content), content,
+                            max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определяется содержимым: занятое имя — тот же файл
+        return name
+
+    def _save(self, name, content):
+        if self.exists(name):
+            return name
+        # Два воркера могут одновременно сохранять одну картинку:
+        # пишем во временный файл и атомарно переименовываем, второй
+        # просто заменит файл таким же.
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            os.chmod(temporary, self.file_permissions_mode or 0o644)
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return name
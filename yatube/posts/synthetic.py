@@ -0,0 +1,27 @@
+"""Синтетический русскоподобный текст для seed_dataset и бенчмарков.
+
+Слова склеиваются из слогов и получают окончания, чтобы стеммеру
+было что отрезать; частоты слов и активность авторов подчиняются
+закону Ципфа, как в живых данных.
+"""
+import itertools
+
+SYLLABLES = ('ка', 'ро', 'ми', 'до', 'ле', 'на', 'су', 'ти', 'вар', 'пол',
+             'стр', 'мен', 'гор', 'зи', 'бо', 'ча')
+ENDINGS = ('', 'а', 'ы', 'ов', 'ами', 'ой', 'ие', 'ая', 'ть', 'ет', 'ют')
+
+
+def vocabulary(size, rng):
+    """``size`` разных основ слов по алфавиту."""
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES)
+                          for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def zipf(count):
+    """Накопленные веса закона Ципфа для ``count`` элементов."""
+    return list(itertools.accumulate(
+        1 / rank for rank in range(1, count + 1)
+    ))
@@ -0,0 +1,228 @@
+"""Хештеги и упоминания в тексте постов.
+
+При сохранении поста ``#теги`` и ``@username`` из текста раскладываются
+по таблицам PostTag и Mention с копией pub_date, поэтому ленты тега и
+упоминаний — один индексный диапазон, как лента подписок, без поиска
+по ``Post.text``.
+
+Популярные теги считаются скользящим окном из часовых счётчиков
+TagCount: публикация увеличивает счётчик часа, удаление уменьшает,
+а сумма за ``settings.TRENDING_TAGS_HOURS`` часов кешируется.
+"""
+import re
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, FilteredRelation, Q, Sum
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import bulk
+from .models import Mention, Post, PostTag, Tag, TagCount, User
+
+TAG = re.compile(r'(?<![\w#])#([^\W_]\w*)')
+# Имена пользователей Django: буквы, цифры и @.+-_
+MENTION = re.compile(r'(?<![\w@])@(\w[\w.@+-]*)')
+MAX_TAG_LENGTH = 50
+TRENDING_KEY = 'tags:trending'
+TRENDING_TIMEOUT = 60
+TRENDING_LIMIT = 10
+
+
+def normalize(name):
+    return name.lower().replace('ё', 'е')[:MAX_TAG_LENGTH]
+
+
+def mention_name(name):
+    # Точка или дефис в конце — знак препинания, а не часть имени
+    return name.rstrip('.-+@')
+
+
+def _unique(values):
+    return list(dict.fromkeys(values))
+
+
+def parse_tags(text):
+    return _unique(normalize(name) for name in TAG.findall(text))
+
+
+def parse_mentions(text):
+    return _unique(mention_name(name) for name in MENTION.findall(text))
+
+
+def _hour(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def window_start():
+    return _hour(timezone.now()) - timedelta(
+        hours=settings.TRENDING_TAGS_HOURS - 1
+    )
+
+
+def count(tag_ids, moment, delta):
+    """Меняет часовые счётчики тегов на ``delta``."""
+    if not tag_ids:
+        return
+    hour = _hour(moment)
+    start = window_start()
+    if hour < start:
+        # Часы вне окна не хранятся: правка или удаление старого поста
+        # не оставляет строк с нулём или минусом
+        return
+    if delta < 0:
+        # Строки часа создал прирост при публикации
+        TagCount.objects.filter(tag_id__in=tag_ids, hour=hour).update(
+            count=Greatest(F('count') + delta, 0)
+        )
+        return
+    # Часы, выпавшие из окна, больше не нужны
+    TagCount.objects.filter(hour__lt=start).delete()
+    TagCount.objects.bulk_create(
+        [TagCount(tag_id=tag_id, hour=hour) for tag_id in tag_ids],
+        ignore_conflicts=True,
+    )
+    TagCount.objects.filter(tag_id__in=tag_ids, hour=hour).update(
+        count=F('count') + delta
+    )
+
+
+def _tag_map(names):
+    """Имена тегов в их id, недостающие теги создаются."""
+    if not names:
+        return {}
+    Tag.objects.bulk_create([Tag(name=name) for name in names],
+                            ignore_conflicts=True)
+    return dict(Tag.objects.filter(name__in=names).values_list('name',
+                                                               'pk'))
+
+
+def _tag_ids(names):
+    return set(_tag_map(names).values())
+
+
+def update(post):
+    """Приводит теги и упоминания поста в соответствие с его текстом."""
+    wanted = _tag_ids(parse_tags(post.text))
+    current = set(PostTag.objects.filter(post=post).values_list(
+        'tag_id', flat=True
+    ))
+    removed = current - wanted
+    added = wanted - current
+    if removed:
+        PostTag.objects.filter(post=post, tag_id__in=removed).delete()
+        count(removed, post.pub_date, -1)
+    if added:
+        PostTag.objects.bulk_create(
+            [PostTag(post=post, tag_id=tag_id, pub_date=post.pub_date)
+             for tag_id in added],
+            ignore_conflicts=True,
+        )
+        count(added, post.pub_date, 1)
+
+    usernames = parse_mentions(post.text)
+    wanted = set(User.objects.filter(username__in=usernames).exclude(
+        pk=post.author_id
+    ).values_list('pk', flat=True)) if usernames else set()
+    current = set(Mention.objects.filter(post=post).values_list(
+        'user_id', flat=True
+    ))
+    if current - wanted:
+        Mention.objects.filter(post=post,
+                               user_id__in=current - wanted).delete()
+    if wanted - current:
+        Mention.objects.bulk_create(
+            [Mention(post=post, user_id=user_id, pub_date=post.pub_date)
+             for user_id in wanted - current],
+            ignore_conflicts=True,
+        )
+    if added or removed:
+        cache.delete(TRENDING_KEY)
+
+
+def add_posts(posts):
+    """Теги и упоминания пачки новых постов без запросов на каждый пост.
+
+    Для импорта: посты уже в базе, сигналы не отправлялись.
+    """
+    names = {post.pk: parse_tags(post.text) for post in posts}
+    mentioned = {post.pk: parse_mentions(post.text) for post in posts}
+    pub_dates = {post.pk: bulk.adapt_datetime(post.pub_date)
+                 for post in posts if names[post.pk] or mentioned[post.pk]}
+    tag_ids = _tag_map({name for found in names.values() for name in found})
+    start = window_start()
+    counts = Counter()
+    post_tags = []
+    for post in posts:
+        for name in names[post.pk]:
+            post_tags.append((post.pk, tag_ids[name], pub_dates[post.pk]))
+            if post.pub_date >= start:
+                counts[_hour(post.pub_date), tag_ids[name]] += 1
+    bulk.insert(PostTag, ('post', 'tag', 'pub_date'), post_tags,
+                ignore_conflicts=True)
+    # count() меняет на одно значение все переданные теги часа
+    grouped = defaultdict(set)
+    for (hour, tag_id), total in counts.items():
+        grouped[hour, total].add(tag_id)
+    for (hour, total), ids in grouped.items():
+        count(ids, hour, total)
+    if post_tags:
+        cache.delete(TRENDING_KEY)
+
+    usernames = {name for found in mentioned.values() for name in found}
+    users = dict(User.objects.filter(username__in=usernames).values_list(
+        'username', 'pk'
+    )) if usernames else {}
+    bulk.insert(Mention, ('post', 'user', 'pub_date'), (
+        (post.pk, users[name], pub_dates[post.pk])
+        for post in posts for name in mentioned[post.pk]
+        if users.get(name, post.author_id) != post.author_id
+    ), ignore_conflicts=True)
+
+
+def _feed(relation, condition):
+    # Как в ленте подписок: сортировка и курсор по полям связи, чтобы
+    # страница читалась по её индексу
+    return Post.objects.feed().annotate(
+        entry=FilteredRelation(relation, condition=condition)
+    ).filter(entry__isnull=False).annotate(
+        entry_pub_date=F('entry__pub_date'),
+        entry_post_id=F('entry__post_id'),
+    ).keyed_by('entry_pub_date', 'entry_post_id')
+
+
+def tag_feed(tag):
+    return _feed('post_tags', Q(post_tags__tag=tag))
+
+
+def mention_feed(user):
+    return _feed('mentions', Q(mentions__user=user))
+
+
+def forget(post):
+    """id тегов поста перед удалением, пока связи не удалены каскадом."""
+    return list(PostTag.objects.filter(post=post).values_list(
+        'tag_id', flat=True
+    ))
+
+
+def deleted(post, tag_ids):
+    count(tag_ids, post.pub_date, -1)
+    if tag_ids:
+        cache.delete(TRENDING_KEY)
+
+
+def trending():
+    """Популярные теги окна: список пар (тег, число постов)."""
+    tags = cache.get(TRENDING_KEY)
+    if tags is None:
+        tags = list(
+            TagCount.objects.filter(hour__gte=window_start())
+            .values('tag__name').annotate(total=Sum('count'))
+            .filter(total__gt=0).order_by('-total', 'tag__name')
+            .values_list('tag__name', 'total')[:TRENDING_LIMIT]
+        )
+        cache.set(TRENDING_KEY, tags, TRENDING_TIMEOUT)
+    return tags
@@ -0,0 +1,45 @@
+"""Ссылки на теги и упоминания в тексте поста, популярные теги."""
+import re
+
+from django import template
+from django.template.defaultfilters import linebreaksbr
+from django.urls import reverse
+from django.utils.html import escape, format_html
+from django.utils.safestring import mark_safe
+
+from posts import tags
+
+register = template.Library()
+
+TOKEN = re.compile(f'{tags.TAG.pattern}|{tags.MENTION.pattern}')
+
+
+def link(match):
+    tag, mention = match.groups()
+    if tag:
+        return format_html('<a href="{}">#{}</a>',
+                           reverse('tag_posts', args=[tags.normalize(tag)]),
+                           tag)
+    name = tags.mention_name(mention)
+    # Знаки препинания после имени остаются текстом
+    return format_html('<a href="{}">@{}</a>{}',
+                       reverse('profile', args=[name]), name,
+                       mention[len(name):])
+
+
+@register.filter(is_safe=True)
+def post_text(text):
+    """Как linebreaksbr, но #теги и @имена становятся ссылками."""
+    parts = []
+    position = 0
+    for match in TOKEN.finditer(text):
+        parts.append(escape(text[position:match.start()]))
+        parts.append(link(match))
+        position = match.end()
+    parts.append(escape(text[position:]))
+    return linebreaksbr(mark_safe(''.join(parts)), autoescape=False)
+
+
+@register.inclusion_tag('posts/trending_tags.html')
+def trending_tags():
+    return {'tags': tags.trending()}
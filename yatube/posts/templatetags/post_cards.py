@@ -0,0 +1,80 @@
+"""Карточки постов из кеша фрагментов.
+
+Карточка рендерится один раз и хранится в кеше как готовый HTML.
+Ключ строится из всего, что видно на карточке: id, даты изменения,
+числа комментариев, автора и группы. Часть, зависящая от зрителя
+(кнопка редактирования), в кеш не попадает и подставляется на место
+маркера при сборке страницы. Вся лента читается одним ``get_many``.
+"""
+import hashlib
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts import variants
+
+register = template.Library()
+
+ACTIONS_MARKER = '<!--post-actions-->'
+
+
+def card_key(post):
+    group = post.group
+    version = ':'.join(str(part) for part in (
+        post.updated.timestamp(), post.comment_count, post.thumbnail.name,
+        post.author.username, post.author.get_full_name(),
+        group and group.slug, group and group.title,
+    ))
+    digest = hashlib.md5(version.encode()).hexdigest()
+    return f'post_card:{post.pk}:{digest}'
+
+
+def render_card(post):
+    sources = []
+    if post.thumbnail:
+        sources = variants.sources(post.image_variants.all())
+    html = render_to_string('posts/post_card.html',
+                            {'post': post, 'sources': sources})
+    head, _, tail = html.partition(ACTIONS_MARKER)
+    return head, tail
+
+
+def render_actions(post, user):
+    if user is None or user.pk != post.author_id:
+        return ''
+    return render_to_string('posts/post_actions.html', {'post': post})
+
+
+def render_cards(posts, user):
+    keys = [(card_key(post), post) for post in posts]
+    fragments = cache.get_many([key for key, _ in keys])
+    # Варианты картинок нужны только для рендера, одним запросом
+    prefetch_related_objects(
+        [post for key, post in keys
+         if key not in fragments and post.thumbnail],
+        'image_variants',
+    )
+    missing = {}
+    cards = []
+    for key, post in keys:
+        if key not in fragments:
+            fragments[key] = missing[key] = render_card(post)
+        head, tail = fragments[key]
+        cards.append(head + render_actions(post, user) + tail)
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_CACHE_TIMEOUT)
+    return cards
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    return mark_safe(''.join(render_cards(posts, context.get('user'))))
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    return post_cards(context, [post])
@@ -0,0 +1,108 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TransactionTestCase
+
+from ..management.commands.benchmark_views import READ_ONLY_URLS
+from ..models import Follow, Post, TimelineEntry, User, UserStats
+
+
+class BenchmarkTests(TransactionTestCase):
+    # Страницы читаются с реплик, если они заданы в DATABASE_REPLICAS
+    databases = "__all__"
+
+    def setUp(self):
+        cache.clear()
+        call_command(
+            "seed_dataset", "--users=20", "--posts=200", "--follows=60",
+            "--comments=30", "--groups=3", "--skip-search",
+            stdout=StringIO(),
+        )
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_seed_dataset(self):
+        """Данные созданы вместе с лентами подписок и счётчиками."""
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertTrue(User.objects.get(username="seed0")
+                        .check_password("password"))
+        expected = sum(
+            Post.objects.filter(author=follow.author).count()
+            for follow in Follow.objects.all()
+            if follow.author.stats.followers_count
+            <= settings.TIMELINE_FANOUT_LIMIT
+        )
+        self.assertEqual(TimelineEntry.objects.count(), expected)
+        self.assertEqual(
+            sum(UserStats.objects.values_list("posts_count", flat=True)),
+            200,
+        )
+        with self.assertRaises(CommandError):
+            call_command("seed_dataset", "--users=2", "--posts=1",
+                         stdout=StringIO())
+
+    def test_benchmark(self):
+        """Замеры по каждому URL сохраняются и сравниваются."""
+        output = os.path.join(self.directory, "benchmark.json")
+        follows = list(Follow.objects.values_list("user", "author"))
+        call_command(
+            "benchmark_views", "--requests=4", "--concurrency=2",
+            "--warmup=0", f"--output={output}", stdout=StringIO(),
+            stderr=StringIO(),
+        )
+        with open(output, encoding="utf-8") as file:
+            results = json.load(file)
+        self.assertEqual(results["dataset"]["Post"], 200)
+        index = results["urls"][0]
+        self.assertEqual(index["name"], "index")
+        self.assertEqual(index["statuses"], {"200": 4})
+        self.assertGreater(index["queries_mean"], 0)
+        self.assertLessEqual(index["p50_ms"], index["p99_ms"])
+        names = [url["name"] for url in results["urls"]]
+        self.assertIn("follow_index", names)
+        # Поиск идёт по запросу, а не открывает пустую форму
+        search = results["urls"][names.index("search")]
+        self.assertEqual(search["statuses"], {"200": 4})
+        self.assertGreater(search["queries_mean"], 0)
+        # Ни подписки, ни записи не делаются
+        self.assertTrue(set(names) <= set(READ_ONLY_URLS))
+        self.assertEqual(
+            list(Follow.objects.values_list("user", "author")), follows
+        )
+
+        report = StringIO()
+        with self.assertRaises(CommandError):
+            call_command(
+                "benchmark_views", "--requests=4", "--concurrency=2",
+                "--warmup=0", "--url=index", f"--compare={output}",
+                "--max-regression=-100", stdout=report, stderr=StringIO(),
+            )
+        self.assertIn("Сравнение", report.getvalue())
+
+        # Нулевой p95 в базе не делит на ноль
+        with open(output, encoding="utf-8") as file:
+            results = json.load(file)
+        for url in results["urls"]:
+            url["p95_ms"] = 0
+        with open(output, "w", encoding="utf-8") as file:
+            json.dump(results, file)
+        report = StringIO()
+        call_command(
+            "benchmark_views", "--requests=1", "--concurrency=1",
+            "--warmup=0", "--url=index", f"--compare={output}",
+            "--max-regression=0", stdout=report, stderr=StringIO(),
+        )
+        self.assertIn("(—)", report.getvalue())
+
+        for option in ("--requests=0", "--concurrency=0"):
+            with self.subTest(option=option):
+                with self.assertRaises(CommandError):
+                    call_command("benchmark_views", option,
+                                 stdout=StringIO(), stderr=StringIO())
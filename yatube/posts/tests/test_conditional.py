@@ -0,0 +1,107 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="yandex")
+        cls.reader = User.objects.create_user(username="Pupkin")
+        cls.group = Group.objects.create(
+            title="Test Title", slug="test-group", description="Text"
+        )
+        cls.post = Post.objects.create(
+            text="Test text", author=cls.user, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def urls(self):
+        return {
+            "index": reverse("index"),
+            "group_posts": reverse("group_posts", args=[self.group.slug]),
+            "profile": reverse("profile", args=[self.user.username]),
+            "post_view": reverse(
+                "post", args=[self.user.username, self.post.pk]
+            ),
+        }
+
+    def revalidate(self, url, client=None):
+        client = client or self.guest_client
+        etag = client.get(url)["ETag"]
+        return client.get(url, HTTP_IF_NONE_MATCH=etag), etag
+
+    def test_not_modified(self):
+        """Повторный запрос с ETag получает 304 без тела."""
+        for name, url in self.urls().items():
+            with self.subTest(name=name):
+                response, _ = self.revalidate(url)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b"")
+                self.assertIn("no-cache", response["Cache-Control"])
+
+    def test_not_modified_without_queries(self):
+        """304 на главной не ходит в базу за постами."""
+        url = reverse("index")
+        etag = self.guest_client.get(url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_invalidate_etag(self):
+        """Новый пост, комментарий и подписка меняют ETag страниц."""
+        actions = {
+            "post": lambda: Post.objects.create(
+                text="New text", author=self.user, group=self.group
+            ),
+            "comment": lambda: Comment.objects.create(
+                text="Comment", author=self.reader, post=self.post
+            ),
+            "follow": lambda: Follow.objects.create(
+                user=self.reader, author=self.user
+            ),
+        }
+        for action_name, action in actions.items():
+            etags = {name: self.guest_client.get(url)["ETag"]
+                     for name, url in self.urls().items()}
+            action()
+            for name, url in self.urls().items():
+                if action_name == "follow" and name in ("index",
+                                                        "group_posts"):
+                    continue
+                with self.subTest(action=action_name, name=name):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etags[name]
+                    )
+                    self.assertEqual(response.status_code, 200)
+
+    def test_etag_depends_on_viewer_and_page(self):
+        """У гостя, пользователя и другой страницы ленты разные ETag."""
+        url = reverse("index")
+        guest = self.guest_client.get(url)["ETag"]
+        reader = self.authorized_client.get(url)["ETag"]
+        other_page = self.guest_client.get(url, {"page": 2})["ETag"]
+        self.assertEqual(len({guest, reader, other_page}), 3)
+
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=guest)
+        self.assertEqual(response.status_code, 200)
+
+    def test_missing_page_not_found(self):
+        """Несуществующие группа, автор и пост отдают 404."""
+        urls = [
+            reverse("group_posts", args=["missing"]),
+            reverse("profile", args=["missing"]),
+            reverse("post", args=[self.reader.username, self.post.pk]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url, HTTP_IF_NONE_MATCH="*")
+                self.assertEqual(response.status_code, 404)
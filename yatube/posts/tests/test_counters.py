@@ -0,0 +1,64 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from .. import counters
+from ..models import Comment, Follow, Post, User, UserStats
+
+
+class CountersTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username="Pupkin")
+        self.reader = User.objects.create_user(username="Vasya")
+
+    def test_comment_count(self):
+        """Счётчик комментариев поста следует за комментариями."""
+        post = Post.objects.create(text="Test text", author=self.author)
+        comment = Comment.objects.create(
+            text="Comment", author=self.reader, post=post
+        )
+        Comment.objects.create(text="Comment", author=self.reader, post=post)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 2)
+
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+
+    def test_user_stats(self):
+        """Счётчики постов и подписок пользователя."""
+        counters.user_stats(self.author)
+        counters.user_stats(self.reader)
+
+        Post.objects.create(text="Test text", author=self.author)
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+
+        self.assertEqual(
+            (UserStats.objects.get(user=self.author).posts_count,
+             UserStats.objects.get(user=self.author).followers_count,
+             UserStats.objects.get(user=self.reader).following_count),
+            (1, 1, 1),
+        )
+
+        follow.delete()
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 0
+        )
+
+    def test_recount_command(self):
+        """Команда recount_stats исправляет разошедшиеся счётчики."""
+        post = Post.objects.create(text="Test text", author=self.author)
+        Comment.objects.create(text="Comment", author=self.reader, post=post)
+        Post.objects.filter(pk=post.pk).update(comment_count=10)
+        UserStats.objects.update_or_create(
+            user=self.author, defaults={"posts_count": 10}
+        )
+
+        call_command("recount_stats", stdout=StringIO())
+
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 1
+        )
@@ -0,0 +1,45 @@
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from ..models import Comment, Follow, Group, Post, User
+
+
+class ExplainFeedsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username="Pupkin")
+        cls.reader = User.objects.create_user(username="Vasya")
+        cls.group = Group.objects.create(
+            title="Test group", slug="test-group", description="Test"
+        )
+        Follow.objects.create(user=cls.author, author=cls.reader)
+        for _ in range(15):
+            post = Post.objects.create(
+                text="Test text", author=cls.reader, group=cls.group
+            )
+        Comment.objects.create(text="Comment", author=cls.author, post=post)
+        Post.objects.create(text="#тест для @Pupkin", author=cls.reader)
+
+    def test_feeds_use_indexes(self):
+        """Запросы всех лент и комментариев идут по индексам."""
+        out = StringIO()
+        call_command("explain_feeds", "--check", stdout=out)
+        for name in ("index", "profile", "follow_index", "group_posts",
+                     "follow_index (cursor)", "post_view comments"):
+            self.assertIn(f"{name}: индекс", out.getvalue())
+
+    def test_tag_feeds_use_indexes(self):
+        """Ленты тега и упоминаний читаются по индексам своих таблиц."""
+        out = StringIO()
+        call_command("explain_feeds", "--check", stdout=out)
+        for name in ("tag_posts", "tag_posts (cursor)", "mentions",
+                     "mentions (cursor)"):
+            self.assertIn(f"{name}: индекс", out.getvalue())
+
+    def test_empty_database(self):
+        """Без данных команда сообщает, чего не хватает."""
+        Post.objects.all().delete()
+        with self.assertRaises(CommandError):
+            call_command("explain_feeds", stdout=StringIO())
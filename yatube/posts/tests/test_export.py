@@ -0,0 +1,112 @@
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import export
+from ..models import Comment, Follow, Group, Post, User
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.leo = User.objects.create_user(username="leo", password="secret")
+        cls.anna = User.objects.create_user(username="anna")
+        cls.group = Group.objects.create(title="Кошки", slug="cats")
+        cls.post = Post.objects.create(text="Кошки спят", author=cls.leo,
+                                       group=cls.group)
+        Post.objects.filter(pk=cls.post.pk).update(image="posts/cat.png")
+        cls.other = Post.objects.create(text="Чужой пост", author=cls.anna)
+        Comment.objects.create(post=cls.other, author=cls.leo, text="Мяу")
+        Comment.objects.create(post=cls.post, author=cls.anna, text="Гав")
+        Follow.objects.create(user=cls.leo, author=cls.anna)
+        Follow.objects.create(user=cls.anna, author=cls.leo)
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_one_query_per_type(self):
+        """Связанные имена читаются тем же запросом, что и строки."""
+        with self.assertNumQueries(len(export.TYPES)):
+            records = list(export.records())
+        self.assertEqual([record["type"] for record in records], [
+            "user", "user", "group", "post", "post", "comment", "comment",
+            "follow", "follow",
+        ])
+        post = records[3]
+        self.assertEqual(post["author"], "leo")
+        self.assertEqual(post["group"], "cats")
+        self.assertEqual(post["image"], "posts/cat.png")
+        self.assertTrue(post["image_url"].endswith("posts/cat.png"))
+
+    def test_command_round_trip(self):
+        """Сжатая выгрузка команды загружается обратно import_data."""
+        # Файла картинки нет, import_data пропустил бы пост
+        Post.objects.update(image="")
+        path = os.path.join(self.directory, "dump.jsonl.gz")
+        errors = StringIO()
+        call_command("export_data", f"--output={path}", stderr=errors)
+        self.assertIn("post: 2", errors.getvalue())
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            records = [json.loads(line) for line in file]
+        self.assertEqual(len(records), 9)
+        dates = dict(Post.objects.values_list("pk", "pub_date"))
+
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        with open(os.path.join(self.directory, "dump.jsonl"), "w",
+                  encoding="utf-8") as file:
+            file.writelines(json.dumps(record) + "\n" for record in records)
+        call_command("import_data", file.name, "--skip-search",
+                     stdout=StringIO(), stderr=StringIO())
+        self.assertTrue(User.objects.get(username="leo")
+                        .check_password("secret"))
+        self.assertEqual(dict(Post.objects.values_list("pk", "pub_date")),
+                         dates)
+        self.assertEqual(Comment.objects.count(), 2)
+        self.assertEqual(Follow.objects.count(), 2)
+
+    def test_command_types(self):
+        """--type и --user ограничивают выгрузку."""
+        output = StringIO()
+        call_command("export_data", "--type=follow", "--user=leo",
+                     stdout=output, stderr=StringIO())
+        self.assertEqual(
+            [json.loads(line) for line in output.getvalue().splitlines()],
+            [{"type": "follow", "user": "leo", "author": "anna"}],
+        )
+
+    def test_view(self):
+        """Пользователь скачивает свои данные без хеша пароля."""
+        client = Client()
+        self.assertEqual(client.get(reverse("export_data")).status_code, 302)
+        client.force_login(self.leo)
+        response = client.get(reverse("export_data"))
+        self.assertTrue(response.streaming)
+        self.assertIn('filename="leo.jsonl"',
+                      response["Content-Disposition"])
+        content = b"".join(response.streaming_content)
+        records = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(
+            [(record["type"], record.get("username") or record.get("text")
+              or record.get("slug") or record.get("author"))
+             for record in records],
+            [("user", "leo"), ("group", "cats"), ("post", "Кошки спят"),
+             ("comment", "Мяу"), ("follow", "anna")],
+        )
+        self.assertNotIn("password", records[0])
+
+        response = client.get(reverse("export_data"), {"format": "gz"})
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertEqual(
+            gzip.decompress(b"".join(response.streaming_content)), content
+        )
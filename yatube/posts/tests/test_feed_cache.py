@@ -0,0 +1,102 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import feed_cache
+from ..models import Comment, Follow, Group, Post, User
+
+
+class FeedCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="yandex")
+        cls.reader = User.objects.create_user(username="Pupkin")
+        cls.post = Post.objects.create(text="Test text", author=cls.user)
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_generation_bumped_by_signals(self):
+        """Сохранение поста, комментария и группы меняет поколение."""
+        actions = {
+            "post": lambda: self.post.save(),
+            "comment": lambda: Comment.objects.create(
+                text="Comment", author=self.user, post=self.post
+            ),
+            "group": lambda: Group.objects.create(
+                title="Test Title", slug="test-group", description="Text"
+            ),
+        }
+        for name, action in actions.items():
+            with self.subTest(name=name):
+                before = feed_cache.generation()
+                action()
+                self.assertNotEqual(feed_cache.generation(), before)
+
+    def test_cache_stores_post_ids(self):
+        """В кеше лежат id постов, а не объект страницы."""
+        self.guest_client.get(reverse("index"))
+
+        state = cache.get(
+            feed_cache.make_key("index", ("index",), None, None)
+        )
+
+        self.assertEqual(state["ids"], [self.post.pk])
+        self.assertFalse(state["has_next"])
+
+    def test_post_page_sees_new_comment(self):
+        """Новый комментарий сразу виден на закешированной странице поста."""
+        url = reverse("post", kwargs={
+            "username": self.user.username, "post_id": self.post.id
+        })
+        self.guest_client.get(url)
+
+        Comment.objects.create(
+            text="Fresh comment", author=self.reader, post=self.post
+        )
+
+        self.assertContains(self.guest_client.get(url), "Fresh comment")
+
+    def test_profile_follow_button_varies_by_viewer(self):
+        """Кнопка подписки зависит от того, кто смотрит профиль."""
+        Follow.objects.create(user=self.reader, author=self.user)
+        url = reverse("profile", kwargs={"username": self.user.username})
+        reader_client = Client()
+        reader_client.force_login(self.reader)
+        other_client = Client()
+        other_client.force_login(
+            User.objects.create_user(username="Vasya")
+        )
+
+        self.assertTrue(reader_client.get(url).context["following"])
+        self.assertFalse(other_client.get(url).context["following"])
+
+    def test_group_page_sees_moved_post(self):
+        """Пост, перенесённый в другую группу, уходит из старой ленты."""
+        group = Group.objects.create(
+            title="Test Title", slug="test-group", description="Text"
+        )
+        another_group = Group.objects.create(
+            title="Test Title", slug="another-group", description="Text"
+        )
+        post = Post.objects.create(
+            text="Moving", author=self.user, group=group
+        )
+        url = reverse("group_posts", kwargs={"slug": group.slug})
+        self.assertEqual(len(self.guest_client.get(url).context["page"]), 1)
+
+        post.group = another_group
+        post.save()
+
+        self.assertEqual(len(self.guest_client.get(url).context["page"]), 0)
+
+    @override_settings(FEED_CACHE_VIEWS={"index": False})
+    def test_cache_switched_off(self):
+        """Выключенный в настройках кеш не используется."""
+        self.guest_client.get(reverse("index"))
+
+        self.assertIsNone(cache.get(
+            feed_cache.make_key("index", ("index",), None, None)
+        ))
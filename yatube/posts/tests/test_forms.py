@@ -77,13 +77,15 @@ class PostCreateFormTests(TestCase):
         # Проверяем, увеличилось ли число постов
         self.assertEqual(Post.objects.count(), post_count + 1)
         # Проверяем, что создалась запись с нашим слагом
-        self.assertTrue(
-            Post.objects.filter(
-                group=PostCreateFormTests.group.id,
-                text="Test text2",
-                author=PostCreateFormTests.user.id,
-                image='posts/small.gif',
-            ).exists()
+        post = Post.objects.get(
+            group=PostCreateFormTests.group.id,
+            text="Test text2",
+            author=PostCreateFormTests.user.id,
+        )
+        # Картинка лежит под именем из хеша содержимого
+        self.assertEqual(
+            post.image.name,
+            f'posts/{post.content_hash[:2]}/{post.content_hash}.gif'
         )
 
         # Проверим, что ничего не упало и страница отдаёт код 200
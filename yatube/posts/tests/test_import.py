@@ -0,0 +1,211 @@
+import datetime as dt
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from .. import counters, search
+from ..models import (Comment, Follow, Mention, Post, PostTag, TagCount,
+                      ThumbnailJob, TimelineEntry, User, UserStats)
+
+MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+RECORDS = [
+    # Подписки раньше пользователей: пачка пишется в порядке типов
+    {"type": "follow", "user": "anna", "author": "leo"},
+    {"type": "follow", "user": "boris", "author": "leo"},
+    {"type": "follow", "user": "leo", "author": "leo"},
+    {"type": "user", "username": "leo", "first_name": "Лев",
+     "password": make_password("secret")},
+    {"type": "user", "username": "anna"},
+    {"type": "user", "username": "boris"},
+    {"type": "group", "slug": "cats", "title": "Кошки"},
+    {"type": "post", "id": 100, "author": "leo", "group": "cats",
+     "text": "Кошки спят #кот @anna", "pub_date": "2020-01-02T03:04:05Z"},
+    {"type": "post", "author": "anna", "text": "Привет, @leo! #Кот"},
+    {"type": "post", "author": "nobody", "text": "Без автора"},
+    {"type": "comment", "post": 100, "author": "boris", "text": "Мяу"},
+    {"type": "comment", "post": 999, "author": "boris", "text": "Мимо"},
+]
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ImportDataTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, lines):
+        path = os.path.join(self.directory, name)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+        return path
+
+    def jsonl(self, records, name="data.jsonl"):
+        return self.write(name, [json.dumps(record, ensure_ascii=False)
+                                 for record in records])
+
+    def load(self, *paths, **options):
+        stdout, stderr = StringIO(), StringIO()
+        call_command("import_data", *paths, "--password=password",
+                     stdout=stdout, stderr=stderr, **options)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_import(self):
+        """Строки пишутся вместе с лентами, тегами и счётчиками."""
+        output, errors = self.load(self.jsonl(RECORDS))
+        self.assertIn("пропущено 3", output)
+        self.assertIn("data.jsonl:3: подписка на себя", errors)
+        self.assertIn("data.jsonl:10: нет пользователя nobody", errors)
+        self.assertIn("data.jsonl:12: нет поста 999", errors)
+
+        leo, anna, boris = (User.objects.get(username=name)
+                            for name in ("leo", "anna", "boris"))
+        self.assertTrue(leo.check_password("secret"))
+        self.assertTrue(anna.check_password("password"))
+        old = Post.objects.get(pk=100)
+        self.assertEqual(old.pub_date, dt.datetime(2020, 1, 2, 3, 4, 5,
+                                                   tzinfo=dt.timezone.utc))
+        self.assertEqual(old.group.slug, "cats")
+        new = Post.objects.get(author=anna)
+        self.assertEqual(new.pk, 101)
+        self.assertLess(timezone.now() - new.pub_date, dt.timedelta(minutes=1))
+
+        self.assertEqual(
+            set(TimelineEntry.objects.values_list("user", "post")),
+            {(anna.pk, 100), (boris.pk, 100)},
+        )
+        self.assertEqual(
+            set(PostTag.objects.values_list("post", "tag__name")),
+            {(100, "кот"), (101, "кот")},
+        )
+        # В окне популярных тегов только свежий пост
+        self.assertEqual(
+            list(TagCount.objects.values_list("tag__name", "count")),
+            [("кот", 1)],
+        )
+        self.assertEqual(set(Mention.objects.values_list("post", "user")),
+                         {(100, anna.pk), (101, leo.pk)})
+        self.assertEqual(old.comment_count, 1)
+        self.assertEqual(
+            (counters.user_stats(leo).posts_count,
+             counters.user_stats(leo).followers_count,
+             counters.user_stats(boris).following_count),
+            (1, 2, 1),
+        )
+        self.assertEqual([post.pk for post in search.find("мяу", 10).posts],
+                         [100])
+
+    def test_counters_change_by_delta(self):
+        """Счётчики меняются на загруженное, а не пересчитываются все."""
+        old = User.objects.create_user(username="old")
+        UserStats.objects.update_or_create(user=old,
+                                           defaults={"posts_count": 42})
+        self.load(self.jsonl(RECORDS + [
+            {"type": "follow", "user": "anna", "author": "old"},
+        ]), "--skip-search")
+        stats = UserStats.objects.get(user=old)
+        self.assertEqual((stats.posts_count, stats.followers_count), (42, 1))
+
+    def test_reimport(self):
+        """Повторная загрузка не дублирует пользователей, посты и
+        подписки."""
+        records = [record for record in RECORDS
+                   if record["type"] != "comment"]
+        path = self.jsonl(records)
+        self.load(path)
+        counts = [model.objects.count()
+                  for model in (User, Post, Follow, TimelineEntry)]
+        output, _ = self.load(path, "--skip-search")
+        # Пост без id загружается заново
+        self.assertEqual(
+            [model.objects.count()
+             for model in (User, Post, Follow, TimelineEntry)],
+            [counts[0], counts[1] + 1, counts[2], counts[3]],
+        )
+        self.assertIn("user: 0, group: 0, post: 1, comment: 0, follow: 0",
+                      output)
+
+    def test_malformed_records(self):
+        """Строка не того типа пропускается, загрузка продолжается."""
+        path = self.write("data.jsonl", [
+            "[1, 2]",
+            '"x"',
+            json.dumps({"type": ["user"], "username": "list"}),
+            json.dumps({"type": "user", "username": "num", "password": 5}),
+            json.dumps({"type": "user", "username": 42}),
+            json.dumps({"type": "user", "username": "ok"}),
+            json.dumps({"type": "post", "author": "ok", "text": ["x"]}),
+            json.dumps({"type": "post", "id": True, "author": "ok",
+                        "text": "Флаг вместо id"}),
+            json.dumps({"type": "post", "author": "ok", "text": "Дата",
+                        "pub_date": 2020}),
+            json.dumps({"type": "post", "id": "7", "author": "ok",
+                        "text": "Текст"}),
+            json.dumps({"type": "comment", "post": {}, "author": "ok",
+                        "text": "Мимо"}),
+            json.dumps({"type": "comment", "post": 7, "author": "ok",
+                        "text": "Комментарий"}),
+        ])
+        output, errors = self.load(path, "--skip-search")
+        self.assertIn("user: 1, group: 0, post: 1, comment: 1, follow: 0",
+                      output)
+        self.assertIn("пропущено 9", output)
+        self.assertIn("data.jsonl:1: не объект JSON", errors)
+        self.assertIn("data.jsonl:4: password: неверный тип int", errors)
+        self.assertEqual(Post.objects.get().pk, 7)
+
+    def test_csv(self):
+        """Тип строк CSV берётся из имени файла или --type."""
+        users = self.write("users.csv", [
+            "username,first_name", "leo,Лев", "bad name,Плохой",
+        ])
+        posts = self.write("export.csv", [
+            "author,text,pub_date", "leo,Первый,2021-05-06 07:08:09",
+        ])
+        _, errors = self.load(users)
+        self.assertIn("users.csv:3: недопустимое имя 'bad name'", errors)
+        self.load(posts, "--type=post", "--skip-search")
+        post = Post.objects.get()
+        self.assertEqual(post.author.first_name, "Лев")
+        self.assertEqual(post.pub_date.year, 2021)
+        with self.assertRaises(CommandError):
+            self.load(posts)
+
+    def test_images(self):
+        """Картинки копируются в хранилище и ставятся в очередь
+        миниатюр."""
+        Image.new("RGB", (60, 40), color=(0, 0, 255)).save(
+            os.path.join(self.directory, "pic.png")
+        )
+        _, errors = self.load(self.jsonl([
+            {"type": "user", "username": "leo"},
+            {"type": "post", "author": "leo", "text": "С картинкой",
+             "image": "pic.png"},
+            {"type": "post", "author": "leo", "text": "Без файла",
+             "image": "missing.png"},
+        ]), "--skip-search")
+        self.assertIn("картинка", errors)
+        post = Post.objects.get()
+        self.assertTrue(post.image.name.startswith("posts/"))
+        self.assertTrue(post.image.storage.exists(post.image.name))
+        self.assertEqual((post.image_width, post.image_height), (60, 40))
+        self.assertTrue(post.content_hash)
+        self.assertTrue(ThumbnailJob.objects.filter(post=post).exists())
+        self.assertEqual(Comment.objects.count(), 0)
@@ -0,0 +1,104 @@
+import json
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from ..models import Post, User
+from ..paginators import NEXT, CursorPaginator, encode_cursor
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="yandex")
+        Post.objects.bulk_create(
+            Post(text=f"Test text {i}", author=cls.user) for i in range(25)
+        )
+        cls.posts = list(Post.objects.order_by("-pub_date", "-id"))
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_walk_forward_and_back(self):
+        """Переход по токенам вперёд и назад отдаёт те же страницы."""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        first = paginator.get_page()
+        second = paginator.get_page(first.next_cursor)
+        third = paginator.get_page(second.next_cursor)
+
+        self.assertEqual(list(first), self.posts[:10])
+        self.assertEqual(list(second), self.posts[10:20])
+        self.assertEqual(list(third), self.posts[20:])
+        self.assertFalse(first.has_previous())
+        self.assertFalse(third.has_next())
+
+        back = paginator.get_page(third.previous_cursor)
+        self.assertEqual(list(back), self.posts[10:20])
+        self.assertTrue(back.has_previous())
+        self.assertTrue(back.has_next())
+
+    def test_no_count_query(self):
+        """Страница по токену не делает COUNT(*)."""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        cursor = paginator.get_page().next_cursor
+
+        with self.assertNumQueries(1):
+            paginator.get_page(cursor)
+
+    def test_broken_cursor_returns_first_page(self):
+        """Испорченный токен открывает первую страницу."""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+
+        page = paginator.get_page("garbage")
+
+        self.assertEqual(list(page), self.posts[:10])
+
+    def test_oversized_cursor_returns_first_page(self):
+        """Токен с pk или датой вне диапазона открывает первую страницу."""
+        post = Post(pk=10 ** 30, pub_date=self.posts[0].pub_date)
+        cursors = [encode_cursor(NEXT, post), "WyJuIiwiMjAyMCIsMWU0MDBd"]
+        for payload in (["n", "9999-12-31T23:59:59-14:00", 5],
+                        ["n", "0001-01-01T00:00:00+14:00", 5],
+                        ["n", "2020-01-01T00:00:00", 5],
+                        ["n", "2020-01-01T00:00:00+00:00", True],
+                        ["n", "2020-01-01T00:00:00+00:00", "5"],
+                        ["n", "2020-01-01T00:00:00+00:00", 5.0]):
+            cursors.append(urlsafe_base64_encode(
+                force_bytes(json.dumps(payload))
+            ))
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                for name, kwargs in (("index", {}),
+                                     ("profile", {"username": "yandex"})):
+                    response = self.guest_client.get(
+                        reverse(name, kwargs=kwargs), {"cursor": cursor}
+                    )
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(list(response.context["page"]),
+                                     self.posts[:10])
+
+    def test_huge_page_number(self):
+        """Огромный номер страницы не доходит до OFFSET."""
+        response = self.guest_client.get(
+            reverse("index"), {"page": "9" * 23}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context["page"]), self.posts[:10])
+
+    def test_index_next_link(self):
+        """Ссылка "Следующая" на главной ведёт по токену."""
+        response = self.guest_client.get(reverse("index"))
+        next_cursor = response.context["page"].next_cursor
+
+        self.assertContains(response, f"?cursor={next_cursor}")
+        response = self.guest_client.get(
+            reverse("index"), {"cursor": next_cursor}
+        )
+        self.assertEqual(
+            list(response.context["page"]), self.posts[10:20]
+        )
@@ -0,0 +1,60 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Post, User
+from ..templatetags.post_cards import card_key
+
+
+class PostCardsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="yandex")
+        cls.reader = User.objects.create_user(username="Pupkin")
+
+    def setUp(self):
+        self.post = Post.objects.create(text="Test text", author=self.author)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        cache.clear()
+
+    def edit_url(self):
+        return reverse("post_edit", kwargs={
+            "username": self.author.username, "post_id": self.post.id
+        })
+
+    def test_card_is_cached(self):
+        """После первого показа карточка лежит в кеше."""
+        self.reader_client.get(reverse("index"))
+
+        head, tail = cache.get(card_key(self.post))
+
+        self.assertIn("Test text", head)
+
+    def test_edit_link_is_not_cached(self):
+        """Кнопку редактирования видит только автор, даже из кеша."""
+        response = self.reader_client.get(reverse("index"))
+        self.assertNotContains(response, self.edit_url())
+
+        response = self.author_client.get(reverse("index"))
+        self.assertContains(response, self.edit_url())
+
+        response = self.reader_client.get(reverse("index"))
+        self.assertNotContains(response, self.edit_url())
+
+    def test_card_changes_with_post(self):
+        """Изменение поста или новый комментарий меняют карточку."""
+        self.reader_client.get(reverse("index"))
+        self.post.text = "Edited text"
+        self.post.save()
+        Comment.objects.create(
+            text="Comment", author=self.reader, post=self.post
+        )
+
+        response = self.reader_client.get(reverse("index"))
+
+        self.assertContains(response, "Edited text")
+        self.assertContains(response, "Комментариев: 1")
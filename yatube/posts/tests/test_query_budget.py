@@ -0,0 +1,67 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+from .utils import QueryBudgetMixin
+
+
+class FeedQueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="yandex")
+        cls.reader = User.objects.create_user(username="Pupkin")
+        cls.group = Group.objects.create(
+            title="Test Title",
+            slug="test-group",
+            description="Description",
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+        cache.clear()
+
+    def add_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(
+                text=f"Test text {i}", author=self.author, group=self.group
+            )
+            Comment.objects.create(
+                text="Comment", author=self.reader, post=post
+            )
+
+    def feed_urls(self):
+        post = Post.objects.filter(author=self.author).last()
+        return (
+            reverse("index"),
+            reverse("group_posts", kwargs={"slug": self.group.slug}),
+            reverse("profile", kwargs={"username": self.author.username}),
+            reverse("follow_index"),
+            reverse("post", kwargs={
+                "username": self.author.username, "post_id": post.id
+            }),
+        )
+
+    def get_all(self):
+        captured = {}
+        for url in self.feed_urls():
+            with self.subTest(url=url), self.assertQueryBudget() as queries:
+                self.authorized_client.get(url)
+            captured[url] = queries
+        return captured
+
+    def test_feed_query_count_does_not_depend_on_page_size(self):
+        """Ленты укладываются в бюджет запросов при любом числе постов."""
+        self.add_posts(1)
+        small = self.get_all()
+
+        cache.clear()
+        self.add_posts(15)
+        full = self.get_all()
+
+        for url in small:
+            with self.subTest(url=url):
+                self.assertSameQueryCount(small[url], full[url])
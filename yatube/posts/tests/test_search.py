@@ -0,0 +1,286 @@
+import datetime as dt
+import os
+import tempfile
+import time
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import (Client, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from .. import search
+from ..models import Comment, Post, User
+from ..search import memory
+from ..search.analysis import stem, terms
+from ..search.backends import LikeBackend
+from ..search.memory import InvertedIndex
+
+
+class AnalysisTests(TestCase):
+    def test_russian_stemming(self):
+        """Формы одного слова дают одну основу."""
+        stems = {
+            "книги": "книг",
+            "книгой": "книг",
+            "красивейшая": "красив",
+            "гуляющих": "гуля",
+            "возможность": "возможн",
+            "ёлка": "елк",
+        }
+        for word, expected in stems.items():
+            with self.subTest(word=word):
+                self.assertEqual(stem(word), expected)
+
+    def test_terms(self):
+        """Латиница и числа не стеммируются, регистр не важен."""
+        self.assertEqual(terms("Хорошие Python_3 книги"),
+                         ["хорош", "python", "3", "книг"])
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="yandex")
+        cls.books = Post.objects.create(
+            text="Читаю интересные книги", author=cls.user
+        )
+        cls.cats = Post.objects.create(
+            text="Кошки спят весь день", author=cls.user
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def found(self, query):
+        return [post.pk for post in search.find(query, 10).posts]
+
+    def test_backend_matches_database(self):
+        """На SQLite с FTS5 поиск идёт по индексу, а не через LIKE."""
+        expected = {"sqlite": "SQLiteBackend",
+                    "postgresql": "PostgresBackend"}[connection.vendor]
+        self.assertEqual(type(search.backend("default")).__name__,
+                         expected)
+
+    def test_like_fallback(self):
+        """Без индекса поиск идёт через LIKE по основам слов."""
+        backend = LikeBackend(connection)
+        self.assertEqual(backend.search("день", 10),
+                         [(-self.cats.pk, self.cats.pk)])
+        self.assertEqual(backend.search("день", 10,
+                                        (-self.cats.pk, self.cats.pk)), [])
+
+    def test_search_by_word_form(self):
+        """Находит пост по другой форме слова."""
+        self.assertEqual(self.found("книгу"), [self.books.pk])
+        self.assertEqual(self.found("кошка"), [self.cats.pk])
+        self.assertEqual(self.found("книга кошка"), [])
+
+    def test_index_updated_on_changes(self):
+        """Индекс следует за правкой и удалением поста и комментария."""
+        post = Post.objects.get(pk=self.cats.pk)
+        post.text = "Собаки гуляют"
+        post.save()
+        self.assertEqual(self.found("кошки"), [])
+        self.assertEqual(self.found("собака"), [self.cats.pk])
+
+        comment = Comment.objects.create(
+            text="Люблю детективы", author=self.user, post=self.books
+        )
+        self.assertEqual(self.found("детективов"), [self.books.pk])
+        comment.delete()
+        self.assertEqual(self.found("детективов"), [])
+
+        Post.objects.get(pk=self.books.pk).delete()
+        self.assertEqual(self.found("книги"), [])
+
+    def test_post_text_ranked_higher(self):
+        """Совпадение в тексте поста важнее совпадения в комментарии."""
+        Comment.objects.create(
+            text="Книги у соседа", author=self.user, post=self.cats
+        )
+        self.assertEqual(self.found("книги"),
+                         [self.books.pk, self.cats.pk])
+
+    def test_cursor_pagination(self):
+        """Страницы по курсору не повторяют и не теряют результаты."""
+        Post.objects.bulk_create(
+            Post(text=f"Книга номер {number}", author=self.user)
+            for number in range(5)
+        )
+        search.rebuild()
+        posts = Post.objects.filter(text__startswith="Книга")
+        seen = []
+        cursor = None
+        while True:
+            results = search.find("книга", 2, cursor)
+            seen.extend(post.pk for post in results.posts)
+            cursor = results.next_cursor
+            if cursor is None:
+                break
+        expected = [self.books.pk] + [post.pk for post in posts]
+        self.assertCountEqual(seen, expected)
+        self.assertEqual(len(seen), len(expected))
+
+    def test_broken_cursor_returns_first_page(self):
+        """Курсор с бесконечным score или огромным id — первая страница."""
+        for payload in ("[1,1e400]", "[1e400,1]", "[NaN,1]",
+                        f"[1,{10 ** 30}]", "[1,0]"):
+            with self.subTest(payload=payload):
+                response = self.guest_client.get(reverse("search"), {
+                    "q": "книги",
+                    "cursor": urlsafe_base64_encode(force_bytes(payload)),
+                })
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    [post.pk for post in response.context["results"].posts],
+                    [self.books.pk],
+                )
+
+    def test_rebuild_command(self):
+        """Команда восстанавливает индекс после изменений мимо сигналов."""
+        Post.objects.filter(pk=self.cats.pk).update(text="Ёжики в тумане")
+        self.assertEqual(self.found("ежик"), [])
+        call_command("rebuild_search_index", stdout=open("/dev/null", "w"))
+        self.assertEqual(self.found("ежик"), [self.cats.pk])
+
+    def test_search_page(self):
+        """Страница поиска показывает найденные посты."""
+        response = self.guest_client.get(reverse("search"), {"q": "книги"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [post.pk for post in response.context["results"].posts],
+            [self.books.pk],
+        )
+        self.assertContains(response, "интересные книги")
+
+        response = self.guest_client.get(reverse("search"))
+        self.assertIsNone(response.context["results"])
+
+
+class InvertedIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = InvertedIndex()
+        self.index.add(1, "Кошки спят весь день")
+        self.index.add(2, "Собаки гуляют весь день")
+        self.index.add(3, "Кошка и собака дружат")
+
+    def test_queries(self):
+        """И, ИЛИ и префикс, новые посты первыми."""
+        queries = {
+            "кошка": [3, 1],
+            "кошки собаки": [3],
+            "спят OR гуляют": [2, 1],
+            "соб*": [3, 2],
+            "день OR кошка дружат": [3, 2, 1],
+            "слон": [],
+            "к*": [],
+        }
+        for query, expected in queries.items():
+            with self.subTest(query=query):
+                self.assertEqual(self.index.search(query, 10), expected)
+
+    def test_pagination(self):
+        """Следующая страница начинается после последнего id."""
+        self.assertEqual(self.index.search("день OR кошка", 2), [3, 2])
+        self.assertEqual(self.index.search("день OR кошка", 2, before=2),
+                         [1])
+
+    def test_update_and_remove(self):
+        """Правка заменяет термы поста, удаление убирает пост."""
+        self.index.add(1, "Ежи спят")
+        self.assertEqual(self.index.search("кошки", 10), [3])
+        self.assertEqual(self.index.search("ежи", 10), [1])
+        self.index.remove(3)
+        self.assertEqual(self.index.search("кошки", 10), [])
+
+    def test_save_and_load(self):
+        """Индекс переживает сохранение, правки поверх файла и загрузку."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "search.idx")
+            self.index.save(path, watermark=123.0)
+            self.index.add(4, "Кошки и ежи")
+            self.index.add(2, "Собаки спят")
+            self.index.remove(3)
+            expected = {query: self.index.search(query, 10)
+                        for query in ("кошки", "спят", "гуляют", "е*")}
+            self.assertEqual(expected["кошки"], [4, 1])
+            self.assertEqual(expected["спят"], [2, 1])
+
+            self.index.save(path)
+            loaded = InvertedIndex.load(path)
+            self.assertEqual(loaded.watermark, 123.0)
+            for query, pks in expected.items():
+                with self.subTest(query=query):
+                    self.assertEqual(loaded.search(query, 10), pks)
+
+
+@override_settings(SEARCH_BACKEND="memory", SEARCH_INDEX_PATH=None,
+                   SEARCH_SYNC_INTERVAL=3600)
+class MemoryBackendTests(TransactionTestCase):
+    """Индекс в памяти меняется после коммита, поэтому тесты без
+    обёртки в транзакцию."""
+
+    def setUp(self):
+        memory.reset()
+        self.user = User.objects.create_user(username="yandex")
+
+    def tearDown(self):
+        memory.reset()
+
+    def test_signals_update_index(self):
+        """Сигналы постов и комментариев обновляют индекс в памяти."""
+        post = Post.objects.create(text="Читаю книги", author=self.user)
+        self.assertEqual(
+            [found.pk for found in search.find("книга", 10).posts],
+            [post.pk],
+        )
+        Comment.objects.create(text="Люблю детективы", author=self.user,
+                               post=post)
+        self.assertEqual(
+            [found.pk for found in search.find("детективов", 10).posts],
+            [post.pk],
+        )
+        post.delete()
+        self.assertEqual(memory.engine().search("книга", 10), [])
+
+    def test_index_file_reused(self):
+        """Процесс открывает сохранённый индекс и добирает новые посты."""
+        first = Post.objects.create(text="Читаю книги", author=self.user)
+        memory.reset()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "search.idx")
+            with self.settings(SEARCH_INDEX_PATH=path):
+                memory.engine()
+                self.assertTrue(os.path.exists(path))
+                memory.reset()
+                second = Post.objects.create(text="Новые книги",
+                                             author=self.user)
+                memory.reset()
+                index = memory.engine()
+                self.assertEqual(index.base.max_pk, first.pk)
+                self.assertEqual(index.search("книги", 10),
+                                 [second.pk, first.pk])
+
+    def test_sync_sees_outside_changes(self):
+        """sync() подхватывает комментарии и удаления из другого
+        процесса."""
+        post = Post.objects.create(text="Читаю книги", author=self.user)
+        gone = Post.objects.create(text="Старые книги", author=self.user)
+        # Индекс другого процесса, построенный давно: сигналы этого
+        # процесса его не меняют
+        Post.objects.update(updated=timezone.now() - dt.timedelta(days=1))
+        other = memory.build()
+        other.watermark = time.time()
+        Comment.objects.create(text="Люблю детективы", author=self.user,
+                               post=post)
+        gone.delete()
+        memory.sync(other)
+        self.assertEqual(other.search("детективов", 10), [post.pk])
+        self.assertEqual(other.search("книги", 10), [post.pk])
@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from .. import thumbnails
+from ..models import ImageVariant, Post, User
+from ..storage import ContentAddressedStorage
+from .test_thumbnails import image_file
+
+MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ContentAddressedStorageTests(TransactionTestCase):
+    """Файлы удаляются после коммита, поэтому тесты без обёртки
+    в транзакцию."""
+    # Страницы читаются с реплик, если они заданы в DATABASE_REPLICAS
+    databases = "__all__"
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="Pupkin")
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        shutil.rmtree(os.path.join(MEDIA_ROOT, "posts"), ignore_errors=True)
+
+    def upload(self, image):
+        self.client.post(reverse("new_post"),
+                         {"text": "Text", "image": image})
+        return Post.objects.latest("pk")
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), MEDIA_ROOT)
+            for root, _, names in os.walk(os.path.join(MEDIA_ROOT, "posts"))
+            for name in names
+        )
+
+    def test_same_content_same_name(self):
+        """Одинаковое содержимое сохраняется под одним именем."""
+        storage = ContentAddressedStorage()
+        first = storage.save("posts/a.txt", ContentFile(b"data"))
+        second = storage.save("posts/b.TXT", ContentFile(b"data"))
+        other = storage.save("posts/c.txt", ContentFile(b"other"))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertTrue(first.endswith(".txt"))
+        self.assertEqual(len(self.stored_files()), 2)
+
+    def test_reupload_shares_file(self):
+        """Повторная загрузка картинки не создаёт новый файл."""
+        first = self.upload(image_file())
+        second = self.upload(image_file("copy.png"))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(self.stored_files(), [first.image.name])
+
+    def test_delete_keeps_shared_file(self):
+        """Файл удаляется вместе с последним постом, который на него
+        ссылается."""
+        first = self.upload(image_file())
+        second = self.upload(image_file())
+        path = first.image.path
+
+        first.delete()
+        self.assertTrue(os.path.exists(path))
+        second.delete()
+        self.assertFalse(os.path.exists(path))
+
+    def test_replaced_image_released(self):
+        """Заменённая картинка удаляется, если больше не нужна."""
+        post = self.upload(image_file())
+        old_path = post.image.path
+        self.client.post(
+            reverse("post_edit", args=[self.user.username, post.pk]),
+            {"text": "Text", "image": image_file(size=(500, 500))},
+        )
+        post.refresh_from_db()
+        self.assertNotEqual(post.image.path, old_path)
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(os.path.exists(post.image.path))
+
+    def test_variants_shared(self):
+        """Варианты одинаковой картинки делаются один раз и живут, пока
+        нужны хоть одному посту."""
+        first = self.upload(image_file())
+        thumbnails.work()
+        files = self.stored_files()
+        second = self.upload(image_file())
+        thumbnails.work()
+        self.assertEqual(self.stored_files(), files)
+        self.assertEqual(
+            sorted(first.image_variants.values_list("name", flat=True)),
+            sorted(second.image_variants.values_list("name", flat=True)),
+        )
+
+        first.delete()
+        self.assertEqual(self.stored_files(), files)
+        second.delete()
+        self.assertEqual(self.stored_files(), [])
+        self.assertFalse(ImageVariant.objects.exists())
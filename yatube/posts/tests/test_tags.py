@@ -0,0 +1,146 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import tags
+from ..models import Mention, Post, PostTag, Tag, TagCount, User
+from ..templatetags.hashtags import post_text
+
+
+class ParseTests(TestCase):
+    def test_parse_tags(self):
+        """Теги приводятся к нижнему регистру, повторы отбрасываются."""
+        self.assertEqual(
+            tags.parse_tags("#Ёлка и #ёлка, #python_3! a#b ##c #_x"),
+            ["елка", "python_3"],
+        )
+
+    def test_parse_mentions(self):
+        """Точка в конце предложения не входит в имя."""
+        self.assertEqual(
+            tags.parse_mentions("Привет, @leo. И @anna.k, mail@site"),
+            ["leo", "anna.k"],
+        )
+
+
+class TagsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_tags_and_mentions_saved(self):
+        """Теги и упоминания сохраняются вместе с постом."""
+        post = Post.objects.create(
+            text="#Книги для @reader и @author, @nobody",
+            author=self.author,
+        )
+        self.assertEqual(
+            list(post.post_tags.values_list("tag__name", "pub_date")),
+            [("книги", post.pub_date)],
+        )
+        # Автор себя не упоминает, несуществующие имена пропускаются
+        self.assertEqual(
+            list(post.mentions.values_list("user__username", flat=True)),
+            ["reader"],
+        )
+
+    def test_edit_updates_tags(self):
+        """Правка текста меняет теги и счётчики."""
+        post = Post.objects.create(text="#один #два", author=self.author)
+        post.text = "#два #три @reader"
+        post.save()
+        self.assertEqual(
+            set(post.post_tags.values_list("tag__name", flat=True)),
+            {"два", "три"},
+        )
+        self.assertEqual(post.mentions.count(), 1)
+        self.assertEqual(tags.trending(), [("два", 1), ("три", 1)])
+
+    def test_delete_updates_counts(self):
+        """Удаление поста уменьшает счётчики тега."""
+        post = Post.objects.create(text="#один", author=self.author)
+        Post.objects.create(text="#один #два", author=self.author)
+        self.assertEqual(tags.trending(), [("один", 2), ("два", 1)])
+        post.delete()
+        self.assertEqual(tags.trending(), [("два", 1), ("один", 1)])
+        self.assertFalse(PostTag.objects.filter(post_id=post.pk).exists())
+
+    def test_trending_window(self):
+        """Часы за пределами окна не учитываются и удаляются."""
+        tag = Tag.objects.create(name="старый")
+        hour = tags.window_start() - timedelta(hours=1)
+        TagCount.objects.create(tag=tag, hour=hour, count=5)
+        Post.objects.create(text="#новый", author=self.author)
+        self.assertEqual(tags.trending(), [("новый", 1)])
+        self.assertFalse(TagCount.objects.filter(tag=tag).exists())
+
+    def test_old_post_leaves_no_counts(self):
+        """Правка и удаление поста вне окна не создают счётчиков."""
+        post = Post.objects.create(text="#старый", author=self.author)
+        old = tags.window_start() - timedelta(days=1)
+        Post.objects.filter(pk=post.pk).update(pub_date=old)
+        TagCount.objects.all().delete()
+        post.refresh_from_db()
+        post.text = "#новый"
+        post.save()
+        post.delete()
+        self.assertFalse(TagCount.objects.exists())
+        self.assertEqual(tags.trending(), [])
+
+    def test_tag_feed(self):
+        """Лента тега показывает только посты с тегом, новые первыми."""
+        first = Post.objects.create(text="#Кино", author=self.author)
+        Post.objects.create(text="без тегов", author=self.author)
+        second = Post.objects.create(text="ещё #кино", author=self.reader)
+        response = self.client.get(reverse("tag_posts", args=["КИНО"]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["tag"].name, "кино")
+        self.assertEqual(list(response.context["page"]), [second, first])
+
+    def test_tag_feed_updates(self):
+        """Новый пост с тегом сразу виден в ленте тега."""
+        Post.objects.create(text="#кино", author=self.author)
+        url = reverse("tag_posts", args=["кино"])
+        self.assertEqual(len(self.client.get(url).context["page"]), 1)
+        Post.objects.create(text="#кино", author=self.author)
+        self.assertEqual(len(self.client.get(url).context["page"]), 2)
+
+    def test_unknown_tag(self):
+        """Лента несуществующего тега отвечает 404."""
+        response = self.client.get(reverse("tag_posts", args=["нет"]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_mentions_feed(self):
+        """Лента упоминаний показывает посты, где упомянут пользователь."""
+        post = Post.objects.create(text="Спасибо, @reader!",
+                                   author=self.author)
+        Post.objects.create(text="@author", author=self.author)
+        response = self.client.get(reverse("mentions", args=["reader"]))
+        self.assertEqual(list(response.context["page"]), [post])
+        self.assertEqual(Mention.objects.count(), 1)
+
+    def test_index_shows_trending(self):
+        """На главной выводятся популярные теги."""
+        Post.objects.create(text="#кино", author=self.author)
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, reverse("tag_posts", args=["кино"]))
+
+
+class PostTextTests(TestCase):
+    def test_links(self):
+        """Теги и упоминания становятся ссылками, остальное экранируется."""
+        html = post_text("<b>#Кино</b> от @leo.\nвторая")
+        self.assertEqual(
+            html,
+            f'&lt;b&gt;<a href="{reverse("tag_posts", args=["кино"])}">'
+            f'#Кино</a>&lt;/b&gt; от '
+            f'<a href="{reverse("profile", args=["leo"])}">@leo</a>.'
+            f'<br>вторая',
+        )
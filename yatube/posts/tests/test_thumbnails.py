@@ -0,0 +1,129 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from .. import thumbnails
+from ..models import Post, ThumbnailJob, User
+
+MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def image_file(name='image.png', size=(1200, 800)):
+    file_obj = BytesIO()
+    Image.new('RGB', size, color=(255, 0, 0)).save(file_obj, 'png')
+    return SimpleUploadedFile(name, file_obj.getvalue(),
+                              content_type='image/png')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ThumbnailQueueTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="Pupkin")
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def create_post(self):
+        self.client.post(reverse("new_post"),
+                         {"text": "Text", "image": image_file()})
+        return Post.objects.get(author=self.user)
+
+    def test_upload_queues_job(self):
+        """Загрузка ставит задачу, а лента показывает оригинал."""
+        post = self.create_post()
+        job = ThumbnailJob.objects.get(post=post)
+        self.assertEqual(job.status, ThumbnailJob.PENDING)
+        self.assertEqual(job.source, post.image.name)
+        self.assertFalse(post.thumbnail)
+
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, post.image.url)
+
+    def test_worker_makes_thumbnail(self):
+        """Воркер делает миниатюру, и карточка переходит на неё."""
+        post = self.create_post()
+        self.client.get(reverse("index"))
+
+        self.assertEqual(thumbnails.work(), 1)
+
+        post.refresh_from_db()
+        job = ThumbnailJob.objects.get(post=post)
+        self.assertEqual(job.status, ThumbnailJob.DONE)
+        self.assertEqual(job.attempts, 1)
+        with Image.open(post.thumbnail.path) as thumbnail:
+            self.assertEqual(thumbnail.size, (960, 339))
+        for url in (reverse("index"),
+                    reverse("post", args=[self.user.username, post.pk])):
+            response = self.client.get(url)
+            self.assertContains(response, post.thumbnail.url)
+        self.assertEqual(thumbnails.work(), 0)
+
+    def test_replaced_image(self):
+        """Новая картинка сбрасывает миниатюру, старая задача её не
+        трогает."""
+        post = self.create_post()
+        thumbnails.work()
+        old_job = ThumbnailJob.objects.create(post=post,
+                                              source=post.image.name)
+
+        self.client.post(
+            reverse("post_edit", args=[self.user.username, post.pk]),
+            {"text": "Text", "image": image_file("other.png", (500, 500))},
+        )
+        post.refresh_from_db()
+        self.assertFalse(post.thumbnail)
+
+        self.assertEqual(thumbnails.work(), 2)
+        post.refresh_from_db()
+        old_job.refresh_from_db()
+        self.assertEqual(old_job.status, ThumbnailJob.DONE)
+        self.assertEqual(
+            ThumbnailJob.objects.latest("pk").source, post.image.name
+        )
+        self.assertTrue(post.thumbnail)
+
+    def test_edit_without_image_change(self):
+        """Правка текста не ставит новую задачу."""
+        post = self.create_post()
+        thumbnails.work()
+        self.client.post(
+            reverse("post_edit", args=[self.user.username, post.pk]),
+            {"text": "New text"},
+        )
+        self.assertEqual(ThumbnailJob.objects.count(), 1)
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnail)
+
+    def test_enqueue_missing(self):
+        """Старые картинки без миниатюр ставятся в очередь один раз."""
+        post = Post.objects.create(text="Text", author=self.user,
+                                   image=image_file())
+        self.assertEqual(thumbnails.enqueue_missing(), 1)
+        self.assertEqual(thumbnails.enqueue_missing(), 0)
+        thumbnails.work()
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnail)
+
+    def test_broken_image(self):
+        """Битая картинка после нескольких попыток помечается ошибкой."""
+        post = Post.objects.create(text="Text", author=self.user,
+                                   image="posts/missing.png")
+        thumbnails.enqueue(post)
+        for _ in range(thumbnails.MAX_ATTEMPTS):
+            thumbnails.work()
+        job = ThumbnailJob.objects.get(post=post)
+        self.assertEqual(job.status, ThumbnailJob.FAILED)
+        self.assertEqual(job.attempts, thumbnails.MAX_ATTEMPTS)
+        self.assertTrue(job.error)
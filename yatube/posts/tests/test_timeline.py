@@ -0,0 +1,94 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from .. import timeline
+from ..models import Follow, Post, TimelineEntry, User
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="Pupkin")
+        cls.reader = User.objects.create_user(username="Vasya")
+        cls.another_reader = User.objects.create_user(username="Ivan")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост раскладывается по лентам подписчиков."""
+        Follow.objects.create(user=self.reader, author=self.author)
+
+        post = Post.objects.create(text="Pupkin text", author=self.author)
+
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertEqual(list(timeline.feed(self.reader)), [post])
+
+    def test_follow_backfills_and_unfollow_trims(self):
+        """Подписка дозаполняет ленту, отписка очищает её."""
+        post = Post.objects.create(text="Pupkin text", author=self.author)
+
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(list(timeline.feed(self.reader)), [post])
+
+        follow.delete()
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(list(timeline.feed(self.reader)), [])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_celebrity_posts_are_read_on_demand(self):
+        """Посты знаменитости не размножаются, но видны в ленте."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.another_reader, author=self.author)
+
+        post = Post.objects.create(text="Pupkin text", author=self.author)
+
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertIn(post, timeline.feed(self.reader))
+        self.assertIn(post, timeline.feed(self.another_reader))
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_demoted_celebrity_posts_are_backfilled(self):
+        """Когда автор теряет подписчиков, его посты попадают в ленты."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        follow = Follow.objects.create(
+            user=self.another_reader, author=self.author
+        )
+        post = Post.objects.create(text="Pupkin text", author=self.author)
+
+        follow.delete()
+
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertEqual(list(timeline.feed(self.reader)), [post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2, TIMELINE_DEMOTE_LIMIT=1)
+    def test_celebrity_status_has_hysteresis(self):
+        """Статус снимается при меньшем числе подписчиков, чем ставится,
+        и посты доносятся одним запросом."""
+        third_reader = User.objects.create_user(username="Petya")
+        follows = [Follow.objects.create(user=user, author=self.author)
+                   for user in (self.reader, self.another_reader,
+                                third_reader)]
+        self.assertIn(self.author.pk, timeline.celebrity_ids())
+        posts = [Post.objects.create(text=f"Post {number}",
+                                     author=self.author)
+                 for number in range(3)]
+
+        follows[2].delete()
+        Follow.objects.create(user=third_reader, author=self.author)
+        follows[2] = Follow.objects.get(user=third_reader)
+        follows[2].delete()
+        self.assertIn(self.author.pk, timeline.celebrity_ids())
+        self.assertFalse(TimelineEntry.objects.filter(
+            post__in=posts, user=self.reader
+        ).exists())
+
+        with self.assertNumQueries(9):
+            follows[1].delete()
+        self.assertNotIn(self.author.pk, timeline.celebrity_ids())
+        self.assertEqual(list(timeline.feed(self.reader)), posts[::-1])
@@ -0,0 +1,117 @@
+import hashlib
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from ..forms import PostForm
+from ..models import User
+
+MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+ORIENTATION = 0x0112
+MAKE = 0x010F
+
+
+def upload(name, image, image_format, **options):
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, POST_IMAGE_MAX_SIZE=1000)
+class UploadNormalizationTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="Pupkin")
+
+    def save(self, image, instance=None, data=None):
+        form = PostForm(data or {"text": "Text"}, {"image": image},
+                        instance=instance)
+        self.assertTrue(form.is_valid(), form.errors)
+        post = form.save(commit=False)
+        post.author = self.user
+        post.save()
+        post.refresh_from_db()
+        return post
+
+    def test_camera_jpeg(self):
+        """Снимок уменьшается, поворачивается по EXIF и теряет метаданные."""
+        exif = Image.Exif()
+        exif[ORIENTATION] = 6
+        exif[MAKE] = "Camera"
+        post = self.save(upload("photo.jpg", Image.new("RGB", (3000, 2000)),
+                                "JPEG", exif=exif.tobytes()))
+
+        self.assertEqual((post.image_width, post.image_height), (667, 1000))
+        self.assertTrue(post.image.name.endswith(".jpg"))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.size, (667, 1000))
+            self.assertEqual(len(stored.getexif()), 0)
+            self.assertTrue(stored.info.get("progressive")
+                            or stored.info.get("progression"))
+        with open(post.image.path, "rb") as stored:
+            self.assertEqual(post.content_hash,
+                             hashlib.sha256(stored.read()).hexdigest())
+
+    def test_png_keeps_format(self):
+        """PNG с прозрачностью остаётся PNG."""
+        post = self.save(upload("logo.png",
+                                Image.new("RGBA", (200, 100)), "PNG"))
+        self.assertTrue(post.image.name.endswith(".png"))
+        self.assertEqual((post.image_width, post.image_height), (200, 100))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.mode, "RGBA")
+
+    def test_other_format_to_jpeg(self):
+        """Непрозрачный BMP перекодируется в JPEG."""
+        post = self.save(upload("scan.bmp",
+                                Image.new("RGB", (50, 50)), "BMP"))
+        self.assertTrue(post.image.name.endswith(".jpg"))
+
+    def test_animated_gif_untouched(self):
+        """Анимированный GIF сохраняется байт в байт."""
+        frames = [Image.new("P", (1500, 1500), color)
+                  for color in (1, 2, 3)]
+        gif = upload("cat.gif", frames[0], "GIF", save_all=True,
+                     append_images=frames[1:])
+        original = gif.read()
+        gif.seek(0)
+        post = self.save(gif)
+        with open(post.image.path, "rb") as stored:
+            self.assertEqual(stored.read(), original)
+        self.assertEqual((post.image_width, post.image_height), (1500, 1500))
+        self.assertEqual(post.content_hash,
+                         hashlib.sha256(original).hexdigest())
+
+    def test_clear_image(self):
+        """Удаление картинки очищает её размеры и хеш."""
+        post = self.save(upload("logo.png",
+                                Image.new("RGB", (20, 10)), "PNG"))
+        form = PostForm({"text": "Text", "image-clear": "on"},
+                        instance=post)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        post.refresh_from_db()
+        self.assertFalse(post.image)
+        self.assertIsNone(post.image_width)
+        self.assertEqual(post.content_hash, "")
+
+    def test_unchanged_image(self):
+        """Правка текста не перекодирует картинку заново."""
+        post = self.save(upload("logo.png",
+                                Image.new("RGB", (20, 10)), "PNG"))
+        name = post.image.name
+        form = PostForm({"text": "New text"}, instance=post)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        post.refresh_from_db()
+        self.assertEqual(post.image.name, name)
+        self.assertEqual(post.image_width, 20)
@@ -0,0 +1,106 @@
+import json
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import thumbnails, variants
+from ..models import ImageVariant, Post, User
+from .test_thumbnails import image_file
+
+MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ImageVariantTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="Pupkin")
+        self.post = Post.objects.create(text="Text", author=self.user,
+                                        image=image_file())
+
+    def test_generate(self):
+        """Варианты во всех ширинах и поддерживаемых форматах."""
+        variants.generate(self.post)
+        formats = variants.supported_formats()
+        self.assertIn("jpg", formats)
+        self.assertEqual(
+            sorted((v.width, v.format) for v in ImageVariant.objects.all()),
+            sorted((width, ext) for width in variants.WIDTHS
+                   for ext in formats),
+        )
+        for variant in ImageVariant.objects.all():
+            self.assertTrue(default_storage.exists(variant.name))
+            self.assertEqual(default_storage.size(variant.name),
+                             variant.size)
+        smallest = ImageVariant.objects.get(width=320, format="jpg")
+        largest = ImageVariant.objects.get(width=960, format="jpg")
+        self.assertLess(smallest.size, largest.size)
+
+    def test_regenerate_replaces_files(self):
+        """Повторная генерация удаляет старые файлы вариантов."""
+        old = [variant.name for variant in variants.generate(self.post)]
+        variants.generate(self.post)
+        self.assertEqual(ImageVariant.objects.count(), len(old))
+        for name in old:
+            if not ImageVariant.objects.filter(name=name).exists():
+                self.assertFalse(default_storage.exists(name))
+
+    def test_no_upscale(self):
+        """Маленькая картинка не растягивается до больших ширин."""
+        post = Post.objects.create(text="Text", author=self.user,
+                                   image=image_file(size=(700, 400)))
+        variants.generate(post)
+        self.assertEqual(
+            set(post.image_variants.values_list("width", flat=True)),
+            {320, 640},
+        )
+
+    def test_sources_order(self):
+        """Современные форматы идут в <picture> раньше JPEG."""
+        sources = variants.sources([
+            ImageVariant(name="a-640w.jpg", format="jpg", width=640),
+            ImageVariant(name="a-320w.jpg", format="jpg", width=320),
+            ImageVariant(name="a-320w.webp", format="webp", width=320),
+        ])
+        self.assertEqual([source["type"] for source in sources],
+                         ["image/webp", "image/jpeg"])
+        self.assertEqual(
+            sources[1]["srcset"],
+            f"{settings.MEDIA_URL}a-320w.jpg 320w, "
+            f"{settings.MEDIA_URL}a-640w.jpg 640w",
+        )
+
+    def test_card_picture(self):
+        """Карточка с готовой миниатюрой отдаёт <picture> со srcset."""
+        thumbnails.enqueue(self.post)
+        thumbnails.work()
+        client = Client()
+        response = client.get(reverse("index"))
+        self.assertContains(response, "<picture>")
+        self.assertContains(response, 'type="image/jpeg"')
+        for variant in self.post.image_variants.all():
+            self.assertContains(response, default_storage.url(variant.name))
+
+    def test_benchmark(self):
+        """Бенчмарк выдаёт время и размер для каждого варианта."""
+        out = StringIO()
+        call_command("benchmark_variants", "--repeat", "1", "--json",
+                     stdout=out)
+        results = json.loads(out.getvalue())
+        self.assertEqual(
+            len(results),
+            len(variants.WIDTHS) * len(variants.supported_formats()),
+        )
+        self.assertTrue(all(result["bytes"] > 0 for result in results))
@@ -232,22 +232,25 @@ class PagesViewTests(TestCase):
         )
 
         response_first = self.authorized_client.get(reverse("index"))
-        post_cache.delete()
+        # bulk_create не шлёт сигналов, поэтому кеш не сбрасывается
+        Post.objects.bulk_create([
+            Post(text="Test bulk", author=self.user, group=self.group)
+        ])
         response_second = self.authorized_client.get(reverse("index"))
-        cache.clear()
+        post_cache.delete()
         response_third = self.authorized_client.get(reverse("index"))
 
         # Проверим что создалась запись
         self.assertEqual(response_first.context["page"][0].text,
                          post_cache.text
                          )
-        # Проверим что запись осталась после ее удаления и повторного входа
+        # Проверим что страница взята из кеша и новой записи на ней нет
         self.assertEqual(response_second.context["page"][0].text,
                          post_cache.text
                          )
-        # Проверим что запись удалилась после очистки кэша и повторного входа
+        # Проверим что удаление записи сразу сбрасывает кеш
         self.assertEqual(response_third.context["page"][0].text,
-                         self.post.text
+                         "Test bulk"
                          )
 
     def test_comment_follow_post(self):
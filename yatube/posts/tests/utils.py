@@ -0,0 +1,34 @@
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+# Сколько запросов к базе может сделать любая лента, независимо от
+# размера страницы: сессия, пользователь, объект страницы, подписка,
+# счётчики и сами посты.
+FEED_QUERY_BUDGET = 8
+
+
+class QueryBudgetMixin:
+    """Проверки для TestCase, что view укладывается в бюджет запросов."""
+
+    @contextmanager
+    def assertQueryBudget(self, budget=FEED_QUERY_BUDGET):
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        executed = len(context.captured_queries)
+        if executed > budget:
+            queries = '\n'.join(
+                f'{number}. {query["sql"]}'
+                for number, query in enumerate(context.captured_queries, 1)
+            )
+            self.fail(
+                f'{executed} запросов при бюджете {budget}:\n{queries}'
+            )
+
+    def assertSameQueryCount(self, first, second):
+        """Число запросов не должно расти вместе с размером страницы."""
+        self.assertEqual(
+            len(first.captured_queries), len(second.captured_queries),
+            'Количество запросов зависит от числа постов на странице',
+        )
@@ -0,0 +1,111 @@
+"""Очередь миниатюр в базе и её воркер.
+
+Views только ставят задачу (``enqueue``), картинку режет отдельный
+процесс ``manage.py thumbnail_worker``, он же готовит адаптивные
+варианты (см. posts.variants). Пока миниатюры нет, карточка
+показывает оригинал, так что ни один запрос ленты не обрабатывает
+изображения. Задачу забирает тот воркер, чей условный UPDATE статуса
+сработал первым, поэтому воркеров можно запускать несколько.
+"""
+import logging
+from datetime import timedelta
+
+from django.db.models import F, Q
+from django.utils import timezone
+from sorl.thumbnail import get_thumbnail
+
+from . import feed_cache, variants
+from .models import Post, ThumbnailJob
+
+logger = logging.getLogger(__name__)
+
+GEOMETRY = '960x339'
+OPTIONS = {'crop': 'center', 'upscale': True}
+MAX_ATTEMPTS = 3
+# Задача в работе дольше этого считается брошенной упавшим воркером
+RUNNING_TIMEOUT = timedelta(minutes=5)
+
+
+def enqueue(post):
+    """Ставит миниатюру картинки поста в очередь и сбрасывает старую."""
+    if post.thumbnail:
+        Post.objects.filter(pk=post.pk).update(thumbnail='')
+        post.thumbnail = ''
+        feed_cache.bump(*feed_cache.post_scopes(post))
+    if not post.image:
+        variants.delete(post)
+        return None
+    return ThumbnailJob.objects.create(post=post, source=post.image.name)
+
+
+def enqueue_missing():
+    """Задачи для картинок без миниатюры и без задачи в очереди."""
+    posts = Post.objects.exclude(image='').exclude(image=None).filter(
+        thumbnail=''
+    ).exclude(thumbnail_jobs__status__in=[ThumbnailJob.PENDING,
+                                          ThumbnailJob.RUNNING])
+    jobs = ThumbnailJob.objects.bulk_create(
+        ThumbnailJob(post_id=pk, source=image)
+        for pk, image in posts.values_list('pk', 'image')
+    )
+    return len(jobs)
+
+
+def claim():
+    """Забирает следующую задачу или возвращает None."""
+    stale = timezone.now() - RUNNING_TIMEOUT
+    ready = ThumbnailJob.objects.filter(
+        Q(status=ThumbnailJob.PENDING)
+        | Q(status=ThumbnailJob.RUNNING, started__lt=stale)
+    )
+    for job in ready.order_by('created')[:10]:
+        claimed = ready.filter(pk=job.pk).update(
+            status=ThumbnailJob.RUNNING, started=timezone.now(),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def run(job):
+    """Делает миниатюру и записывает её в пост, если картинка та же."""
+    post = Post.objects.filter(pk=job.post_id, image=job.source).first()
+    if post is None:
+        # Картинку заменили или убрали, для новой есть своя задача
+        job.status = ThumbnailJob.DONE
+        job.save(update_fields=['status'])
+        return
+    try:
+        thumbnail = get_thumbnail(post.image, GEOMETRY, **OPTIONS)
+        # sorl не бросает исключение без THUMBNAIL_DEBUG, а отдаёт
+        # несуществующий файл
+        if not thumbnail.exists():
+            raise OSError(f'Не удалось прочитать {job.source}')
+        variants.generate(post)
+    except Exception as error:
+        logger.exception('Не удалось сделать миниатюру %s', job.source)
+        job.error = str(error)
+        job.status = (ThumbnailJob.FAILED if job.attempts >= MAX_ATTEMPTS
+                      else ThumbnailJob.PENDING)
+        job.save(update_fields=['error', 'status'])
+        return
+    Post.objects.filter(pk=post.pk, image=job.source).update(
+        thumbnail=thumbnail.name
+    )
+    feed_cache.bump(*feed_cache.post_scopes(post))
+    job.status = ThumbnailJob.DONE
+    job.save(update_fields=['status'])
+
+
+def work(limit=None):
+    """Выполняет задачи, пока очередь не опустеет; возвращает их число."""
+    done = 0
+    while limit is None or done < limit:
+        job = claim()
+        if job is None:
+            break
+        run(job)
+        done += 1
+    return done
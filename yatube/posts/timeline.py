@@ -0,0 +1,165 @@
+"""Материализованная лента подписок.
+
+Посты обычных авторов раскладываются по лентам подписчиков при
+публикации. Для «знаменитостей» (больше ``TIMELINE_FANOUT_LIMIT``
+подписчиков) запись не размножается, их посты подмешиваются при чтении.
+Статус снимается, когда подписчиков остаётся не больше
+``TIMELINE_DEMOTE_LIMIT``.
+"""
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, FilteredRelation, Q
+
+from . import bulk
+from .models import Celebrity, Follow, Post, TimelineEntry
+
+CELEBRITIES_KEY = 'timeline:celebrities'
+CELEBRITIES_TIMEOUT = 60 * 5
+BATCH_SIZE = 500
+ENTRY_FIELDS = ('user', 'post', 'author', 'pub_date')
+
+
+def _bulk_insert(entries):
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, BATCH_SIZE))
+        if not batch:
+            return
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def _entry(user_id, post):
+    return TimelineEntry(user_id=user_id, post_id=post.pk,
+                         author_id=post.author_id, pub_date=post.pub_date)
+
+
+def celebrity_ids():
+    """Авторы, чьи посты читаются при запросе ленты, а не раскладываются."""
+    ids = cache.get(CELEBRITIES_KEY)
+    if ids is None:
+        ids = set(Celebrity.objects.values_list('author_id', flat=True))
+        cache.set(CELEBRITIES_KEY, ids, CELEBRITIES_TIMEOUT)
+    return ids
+
+
+def promote(follows):
+    """Делает знаменитостями авторов из ``follows``, у которых
+    подписчиков больше ``TIMELINE_FANOUT_LIMIT``.
+
+    ``follows`` — все подписки на этих авторов, а не только новые.
+    """
+    authors = follows.order_by().values('author').annotate(
+        followers=Count('id')
+    ).filter(
+        followers__gt=settings.TIMELINE_FANOUT_LIMIT
+    ).values_list('author', flat=True)
+    Celebrity.objects.bulk_create(
+        [Celebrity(author_id=author_id) for author_id in authors],
+        ignore_conflicts=True,
+    )
+
+
+def fan_out(post):
+    """Кладёт новый пост в ленты подписчиков автора."""
+    if Celebrity.objects.filter(author_id=post.author_id).exists():
+        return
+    followers = Follow.objects.filter(author_id=post.author_id)
+    _bulk_insert(
+        _entry(user_id, post)
+        for user_id in followers.values_list('user_id', flat=True).iterator()
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика уже опубликованные посты автора."""
+    posts = Post.objects.filter(author_id=author_id).only(
+        'pk', 'author_id', 'pub_date'
+    )
+    _bulk_insert(_entry(user_id, post) for post in posts.iterator())
+
+
+def _celebrities_among(author_ids):
+    # Без кеша: при импорте подписки меняются между пачками
+    promote(Follow.objects.filter(author_id__in=author_ids))
+    return set(Celebrity.objects.filter(
+        author_id__in=author_ids
+    ).values_list('author_id', flat=True))
+
+
+def fan_out_posts(posts):
+    """Как fan_out для queryset новых постов, одним INSERT ... SELECT."""
+    celebrities = _celebrities_among(posts.values('author_id'))
+    entries = posts.exclude(author_id__in=celebrities).filter(
+        author__following__isnull=False
+    ).values_list('author__following__user_id', 'pk', 'author_id',
+                  'pub_date')
+    bulk.insert_from(TimelineEntry, ENTRY_FIELDS, entries,
+                     ignore_conflicts=True)
+    cache.delete(CELEBRITIES_KEY)
+
+
+def backfill_follows(follows):
+    """Как backfill для queryset новых подписок, одним INSERT ... SELECT.
+
+    Посты знаменитостей не раскладываются: лента подмешивает их при
+    чтении, а если автор перестанет быть знаменитостью, их донесёт
+    follow_changed.
+    """
+    celebrities = _celebrities_among(follows.values('author_id'))
+    entries = follows.exclude(author_id__in=celebrities).filter(
+        author__posts__isnull=False
+    ).values_list('user_id', 'author__posts__id', 'author_id',
+                  'author__posts__pub_date')
+    bulk.insert_from(TimelineEntry, ENTRY_FIELDS, entries,
+                     ignore_conflicts=True)
+    cache.delete(CELEBRITIES_KEY)
+
+
+def trim(user_id, author_id):
+    """Убирает посты автора из ленты отписавшегося пользователя."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def follow_changed(author_id, created):
+    """Пересчитывает статус знаменитости после подписки или отписки."""
+    followers = Follow.objects.filter(author_id=author_id)
+    count = followers.count()
+    if created and count > settings.TIMELINE_FANOUT_LIMIT:
+        _, promoted = Celebrity.objects.get_or_create(author_id=author_id)
+        if promoted:
+            cache.delete(CELEBRITIES_KEY)
+    elif not created and count <= settings.TIMELINE_DEMOTE_LIMIT:
+        demoted, _ = Celebrity.objects.filter(author_id=author_id).delete()
+        if demoted:
+            # Посты, опубликованные без раскладки, доносятся до всех
+            # оставшихся подписчиков одним INSERT ... SELECT
+            backfill_follows(followers)
+
+
+def feed(user):
+    """Посты ленты подписок пользователя."""
+    celebrities = celebrity_ids()
+    followed_celebrities = []
+    if celebrities:
+        followed_celebrities = list(
+            Follow.objects.filter(user=user, author_id__in=celebrities)
+            .values_list('author_id', flat=True)
+        )
+    if not followed_celebrities:
+        # Сортировка по копиям полей записи ленты читает её индекс по
+        # порядку. Ключ пагинации — аннотации над одним JOIN: фильтр по
+        # многозначной связи в отдельном filter() добавил бы второй.
+        return Post.objects.feed().annotate(
+            entry=FilteredRelation(
+                'timeline_entries', condition=Q(timeline_entries__user=user)
+            ),
+        ).filter(entry__isnull=False).annotate(
+            entry_pub_date=F('entry__pub_date'),
+            entry_post_id=F('entry__post_id'),
+        ).keyed_by('entry_pub_date', 'entry_post_id')
+    return Post.objects.feed().filter(
+        Q(pk__in=TimelineEntry.objects.filter(user=user).values('post_id'))
+        | Q(author_id__in=followed_celebrities)
+    )
@@ -0,0 +1,84 @@
+"""Нормализация картинок при загрузке.
+
+Снимки с телефонов весят мегабайты и хранят EXIF с геометками. До
+сохранения картинка уменьшается до ``settings.POST_IMAGE_MAX_SIZE`` по
+большей стороне, поворачивается по EXIF-ориентации и перекодируется без
+метаданных: JPEG — прогрессивный, PNG и GIF — в своём формате, прочие
+форматы — в JPEG или PNG при прозрачности. Анимированные картинки
+сохраняются как есть, перекодирование потеряло бы кадры.
+"""
+import hashlib
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+JPEG_OPTIONS = {'quality': 85, 'optimize': True, 'progressive': True}
+KEEP_FORMATS = {'PNG', 'GIF'}
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png'}
+
+
+class NormalizedImage:
+    def __init__(self, file, width, height, content_hash):
+        self.file = file
+        self.width = width
+        self.height = height
+        self.content_hash = content_hash
+
+
+def _hash(file):
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(64 * 1024), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def _output_format(image):
+    if image.format == 'JPEG' or image.format in KEEP_FORMATS:
+        return image.format
+    has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+    return 'PNG' if has_alpha else 'JPEG'
+
+
+def normalize(upload):
+    """Возвращает ``NormalizedImage`` для загруженного файла.
+
+    Файл читается Pillow лениво, а JPEG декодируется сразу в
+    уменьшенном масштабе (``draft``), так что большой снимок не
+    разворачивается в память целиком.
+    """
+    max_size = settings.POST_IMAGE_MAX_SIZE
+    upload.seek(0)
+    with Image.open(upload) as image:
+        if getattr(image, 'is_animated', False):
+            return NormalizedImage(upload, image.width, image.height,
+                                   _hash(upload))
+        output_format = _output_format(image)
+        icc_profile = image.info.get('icc_profile')
+        if image.format == 'JPEG':
+            image.draft('RGB', (max_size, max_size))
+        transposed = ImageOps.exif_transpose(image)
+        transposed.thumbnail((max_size, max_size), Image.LANCZOS)
+        options = {}
+        if output_format == 'JPEG':
+            if transposed.mode != 'RGB':
+                transposed = transposed.convert('RGB')
+            options.update(JPEG_OPTIONS)
+        elif output_format == 'PNG':
+            options['optimize'] = True
+        elif 'transparency' in image.info:
+            options['transparency'] = image.info['transparency']
+        if icc_profile:
+            options['icc_profile'] = icc_profile
+        buffer = BytesIO()
+        transposed.save(buffer, output_format, **options)
+        width, height = transposed.size
+    stem, extension = os.path.splitext(os.path.basename(upload.name))
+    if image.format != output_format:
+        extension = EXTENSIONS[output_format]
+    file = ContentFile(buffer.getvalue(), name=stem + extension)
+    return NormalizedImage(file, width, height, _hash(file))
@@ -7,11 +7,15 @@ urlpatterns = [
     path("", views.index, name='index'),
     path('new/', views.new_post, name='new_post'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.search_posts, name='search'),
+    path('export/', views.export_data, name='export_data'),
     path('<str:username>/follow/', views.profile_follow,
          name='profile_follow'),
     path('<str:username>/unfollow/', views.profile_unfollow,
          name='profile_unfollow'),
     path('group/<slug:slug>/', views.group_posts, name='group_posts'),
+    path('tag/<str:name>/', views.tag_posts, name='tag_posts'),
+    path('<str:username>/mentions/', views.mentions, name='mentions'),
     path('<username>/', views.profile, name='profile'),
     path('<username>/<int:post_id>/', views.post_view, name='post'),
     path('<username>/<int:post_id>/edit/', views.post_edit, name='post_edit'),
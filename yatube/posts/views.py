@@ -1,77 +1,240 @@
+from functools import wraps
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.cache import patch_cache_control
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_http_methods
-from django.core.cache import cache
+from django.views.decorators.http import condition, require_http_methods
 
+from . import (counters, export, feed_cache, search, tags, thumbnails,
+               timeline)
 from .forms import CommentForm, PostForm
-from .models import Comment, Follow, Group, Post, User
+from .models import Comment, Follow, Group, Post, Tag, User
+from .paginators import CursorPaginator
+
+POSTS_PER_PAGE = 10
+SEARCH_QUERY_MAX_LENGTH = 200
+
+
+def get_page(request, posts, cache_name=None, scopes=(), vary=()):
+    paginator = CursorPaginator(posts, POSTS_PER_PAGE)
+    cursor = request.GET.get('cursor')
+    page_number = request.GET.get('page')
+    if cache_name is not None:
+        return feed_cache.get_page(
+            cache_name, scopes, paginator, cursor, page_number, vary
+        )
+    return paginator.get_page(cursor, page_number)
+
+
+def get_stats(cache_name, user):
+    return feed_cache.get_or_set(
+        cache_name, (f'user:{user.pk}',), ('stats', user.pk),
+        lambda: counters.user_stats(user),
+    )
+
+
+def is_following(viewer, author):
+    if not viewer.is_authenticated:
+        return False
+    return feed_cache.get_or_set(
+        'profile', (f'user:{author.pk}',), ('following', author.pk, viewer.pk),
+        Follow.objects.filter(user=viewer, author=author).exists,
+    )
+
+
+def conditional(name, scopes):
+    """Условный GET по ETag из поколений кеша лент.
+
+    ``scopes(request, **kwargs)`` возвращает области страницы или None,
+    если страницы нет. Если ETag совпал с If-None-Match, ответ 304
+    уходит без запросов за постами и без рендеринга шаблона.
+    Last-Modified не отдаётся: правки, удаления и счётчики не двигают
+    никакую дату, и по ней клиент получил бы устаревшую страницу.
+    """
+    def etag(request, *args, **kwargs):
+        page_scopes = scopes(request, **kwargs)
+        if page_scopes is None:
+            return None
+        # Меню, кнопки подписки и правки зависят от пользователя, форма
+        # комментария — от CSRF-токена
+        return feed_cache.etag(
+            name, page_scopes, request.get_full_path(), request.user.pk,
+            request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+        )
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            # Браузер хранит страницу у себя, но каждый раз сверяет ETag
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
+
+
+def group_scopes(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True
+    ).first()
+    return None if group_id is None else (f'group:{group_id}',)
+
+
+def profile_scopes(request, username):
+    user_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    return None if user_id is None else (f'user:{user_id}',)
+
+
+def post_scopes(request, username, post_id):
+    author_id = Post.objects.filter(
+        pk=post_id, author__username=username
+    ).values_list('author_id', flat=True).first()
+    if author_id is None:
+        return None
+    return (f'post:{post_id}', f'user:{author_id}')
+
+
+def tag_scopes(request, name):
+    # Посты с тегом появляются и пропадают вместе с главной лентой
+    if not Tag.objects.filter(name=tags.normalize(name)).exists():
+        return None
+    return ('index',)
+
+
+def mentions_scopes(request, username):
+    if not User.objects.filter(username=username).exists():
+        return None
+    return ('index',)
 
 
 @require_http_methods(['GET'])
+@conditional('index', lambda request: ('index',))
 def index(request):
-    page_number = request.GET.get('page')
-    key_page_number = 'index_page' + f"?page={page_number}"
-    page = cache.get(key_page_number)
-    if page is None:
-        posts = Post.objects.all()
-        paginator = Paginator(posts, 10)
-        page = paginator.get_page(page_number)
-        cache.set(key_page_number, page, timeout=20)
+    posts = Post.objects.feed()
+    page = get_page(request, posts, 'index', ('index',))
     context = {'page': page}
     return render(request, 'posts/index.html', context)
 
 
 @require_http_methods(['GET'])
+@conditional('group_posts', group_scopes)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    posts = group.posts.feed()
+    page = get_page(request, posts, 'group_posts', (f'group:{group.pk}',))
     context = {'group': group, 'page': page}
     return render(request, 'posts/group.html', context)
 
 
 @require_http_methods(['GET'])
+@conditional('tag_posts', tag_scopes)
+def tag_posts(request, name):
+    tag = get_object_or_404(Tag, name=tags.normalize(name))
+    page = get_page(request, tags.tag_feed(tag), 'tag_posts', ('index',),
+                    vary=(tag.pk,))
+    context = {'tag': tag, 'page': page}
+    return render(request, 'posts/tag.html', context)
+
+
+@require_http_methods(['GET'])
+@conditional('mentions', mentions_scopes)
+def mentions(request, username):
+    user = get_object_or_404(User, username=username)
+    page = get_page(request, tags.mention_feed(user), 'mentions',
+                    ('index',), vary=(user.pk,))
+    context = {'user_name': user, 'page': page}
+    return render(request, 'posts/mentions.html', context)
+
+
+@require_http_methods(['GET'])
+@conditional('profile', profile_scopes)
 def profile(request, username):
     user = get_object_or_404(User, username=username)
-    following = user.following.all().exists()
-    following_count = user.following.count()
-    follower_count = user.follower.count()
-    posts = user.posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    following = is_following(request.user, user)
+    stats = get_stats('profile', user)
+    posts = user.posts.feed()
+    page = get_page(request, posts, 'profile', (f'user:{user.pk}',))
     context = {'user_name': user,
                'page': page,
                'following': following,
-               'following_count': following_count,
-               'follower_count': follower_count
+               'stats': stats,
+               'following_count': stats.followers_count,
+               'follower_count': stats.following_count
                }
     return render(request, 'posts/profile.html', context)
 
 
+def get_post_with_comments(post_id):
+    post = get_object_or_404(Post.objects.feed(), id=post_id)
+    comments = Comment.objects.select_related('author').filter(
+        post_id=post_id
+    )
+    return {'post': post, 'comments': list(comments)}
+
+
 @require_http_methods(['GET'])
+@conditional('post_view', post_scopes)
 def post_view(request, username, post_id):
-    user = get_object_or_404(User, username=username)
-    following_count = user.following.count()
-    follower_count = user.follower.count()
-    post = get_object_or_404(Post, id=post_id, author=user)
+    cached = feed_cache.get_or_set(
+        'post_view', (f'post:{post_id}',), (post_id,),
+        lambda: get_post_with_comments(post_id),
+    )
+    post = cached['post']
+    if post.author.username != username:
+        raise Http404
+    user = post.author
+    stats = get_stats('post_view', user)
     form = CommentForm(request.POST or None)
-    comments = Comment.objects.all().filter(post_id=post_id)
     context = {
         'user_name': user,
         'post': post,
         'form': form,
-        'comments': comments,
-        'following_count': following_count,
-        'follower_count': follower_count
+        'comments': cached['comments'],
+        'stats': stats,
+        'following_count': stats.followers_count,
+        'follower_count': stats.following_count
     }
     return render(request, 'posts/post.html', context)
 
 
+@require_http_methods(['GET'])
+def search_posts(request):
+    query = request.GET.get('q', '').strip()[:SEARCH_QUERY_MAX_LENGTH]
+    results = None
+    if query:
+        results = search.find(query, POSTS_PER_PAGE,
+                              request.GET.get('cursor'))
+    context = {'query': query, 'results': results}
+    return render(request, 'posts/search.html', context)
+
+
+@require_http_methods(['GET'])
+@login_required
+def export_data(request):
+    """Данные пользователя в JSONL потоком, ?format=gz — со сжатием."""
+    chunks = export.lines(export.records(request.user, passwords=False))
+    filename = f'{request.user.username}.jsonl'
+    if request.GET.get('format') == 'gz':
+        response = StreamingHttpResponse(export.gzipped(chunks),
+                                         content_type='application/gzip')
+        filename += '.gz'
+    else:
+        response = StreamingHttpResponse(
+            chunks, content_type='application/x-ndjson; charset=utf-8'
+        )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # Выгрузка меняется с каждым постом, кешировать её нельзя
+    patch_cache_control(response, private=True, no_store=True)
+    return response
+
+
 @require_http_methods(['GET', 'POST'])
 @csrf_exempt
 @login_required
@@ -81,6 +244,8 @@ def new_post(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        if post.image:
+            thumbnails.enqueue(post)
         return redirect('index')
     context = {'form': form}
     return render(request, 'posts/newpost.html', context)
@@ -97,6 +262,8 @@ def post_edit(request, username, post_id):
     )
     if form.is_valid():
         post.save()
+        if 'image' in form.changed_data:
+            thumbnails.enqueue(post)
         return redirect('post', username, post_id)
     context = {'post': post, 'form': form}
     return render(request, 'posts/newpost.html', context)
@@ -120,10 +287,11 @@ def add_comment(request, username, post_id):
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    posts = timeline.feed(request.user)
+    page = get_page(
+        request, posts, 'follow_index',
+        ('index', f'follow:{request.user.pk}'), (request.user.pk,)
+    )
     context = {'page': page}
     return render(request, 'posts/follow.html', context)
 
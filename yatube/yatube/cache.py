@@ -0,0 +1,193 @@
+"""Двухуровневый кеш: L1 в памяти процесса и общий L2 для всех воркеров.
+
+Чтение идёт сначала в L1, промах — в общий кеш (Redis, memcached или
+файловый кеш на одной машине), ответ запоминается в L1 на
+``L1_TIMEOUT`` секунд. Каждая запись уходит в L2 и публикуется в журнал
+инвалидации: счётчик ``tiered:sequence`` и записи ``tiered:log:<n>``
+со списком изменённых ключей. Остальные процессы не чаще раза в
+``SYNC_INTERVAL`` секунд сверяют счётчик и выбрасывают из своего L1
+изменённые ключи, а если журнал уже вытеснен — очищают L1 целиком.
+
+Пример настройки::
+
+    CACHES = {
+        'shared': {'BACKEND': '...RedisCache', 'LOCATION': '...'},
+        'default': {
+            'BACKEND': 'yatube.cache.TieredCache',
+            'OPTIONS': {'SHARED': 'shared', 'L1_TIMEOUT': 5},
+        },
+    }
+"""
+import threading
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+
+SEQUENCE_KEY = 'tiered:sequence'
+LOG_KEY = 'tiered:log:%d'
+# Если процесс отстал сильнее, проще очистить L1, чем читать журнал
+MAX_LOG_READ = 500
+
+_sync_lock = threading.Lock()
+# Состояние синхронизации общее для всех потоков процесса, как и сам L1
+_sync_state = {}
+
+
+class TieredCache(BaseCache):
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options['SHARED']
+        self._shared_cache = None
+        self._l1_timeout = options.get('L1_TIMEOUT', 5)
+        self._sync_interval = options.get('SYNC_INTERVAL', 1)
+        self._log_timeout = options.get('LOG_TIMEOUT', 60)
+        self._name = f'tiered:{location}'
+        self._local = LocMemCache(self._name, {
+            'TIMEOUT': self._l1_timeout,
+            'OPTIONS': {'MAX_ENTRIES': options.get('L1_MAX_ENTRIES', 1000)},
+        })
+
+    @property
+    def _shared(self):
+        # Ссылка запоминается при первом обращении: close() вызывается из
+        # close_caches посреди обхода caches.all(), и caches[...] там
+        # добавил бы в обходимый словарь новый кеш
+        if self._shared_cache is None:
+            self._shared_cache = caches[self._shared_alias]
+        return self._shared_cache
+
+    def _local_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return self._l1_timeout
+        return min(timeout, self._l1_timeout)
+
+    # Журнал инвалидации
+
+    def _publish(self, keys):
+        """Сообщает другим процессам об изменении ``keys``.
+
+        ``keys`` — список пар (key, version) или None для clear().
+        """
+        try:
+            sequence = self._shared.incr(SEQUENCE_KEY)
+        except ValueError:
+            self._shared.add(SEQUENCE_KEY, 0, None)
+            sequence = self._shared.incr(SEQUENCE_KEY)
+        self._shared.set(LOG_KEY % sequence, keys, self._log_timeout)
+
+    def _sync(self):
+        now = time.monotonic()
+        with _sync_lock:
+            state = _sync_state.setdefault(
+                self._name, {'seen': None, 'synced_at': None}
+            )
+            if (state['synced_at'] is not None
+                    and now - state['synced_at'] < self._sync_interval):
+                return
+            state['synced_at'] = now
+            seen = state['seen']
+            sequence = self._shared.get(SEQUENCE_KEY) or 0
+            state['seen'] = sequence
+        if seen is None or sequence == seen:
+            return
+        if sequence < seen or sequence - seen > MAX_LOG_READ:
+            self._local.clear()
+            return
+        log_keys = [LOG_KEY % number for number in range(seen + 1,
+                                                         sequence + 1)]
+        entries = self._shared.get_many(log_keys)
+        if len(entries) < len(log_keys):
+            self._local.clear()
+            return
+        for keys in entries.values():
+            if keys is None:
+                self._local.clear()
+                return
+            for key, version in keys:
+                self._local.delete(key, version)
+
+    # API кеша
+
+    def get(self, key, default=None, version=None):
+        self._sync()
+        value = self._local.get(key, self, version)
+        if value is not self:
+            return value
+        value = self._shared.get(key, self, version)
+        if value is self:
+            return default
+        self._local.set(key, value, self._l1_timeout, version)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._sync()
+        keys = list(keys)
+        found = self._local.get_many(keys, version)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            shared = self._shared.get_many(missing, version)
+            if shared:
+                self._local.set_many(shared, self._l1_timeout, version)
+            found.update(shared)
+        return found
+
+    def has_key(self, key, version=None):
+        self._sync()
+        return (self._local.has_key(key, version)
+                or self._shared.has_key(key, version))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self._shared.add(key, value, timeout, version)
+        if added:
+            self._local.set(key, value, self._local_timeout(timeout), version)
+            self._publish([(key, version)])
+        return added
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._shared.set(key, value, timeout, version)
+        self._local.set(key, value, self._local_timeout(timeout), version)
+        self._publish([(key, version)])
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self._shared.set_many(data, timeout, version) or []
+        self._local.set_many(data, self._local_timeout(timeout), version)
+        self._publish([(key, version) for key in data])
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._shared.touch(key, timeout, version)
+
+    def delete(self, key, version=None):
+        self._shared.delete(key, version)
+        self._local.delete(key, version)
+        self._publish([(key, version)])
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self._shared.delete_many(keys, version)
+        self._local.delete_many(keys, version)
+        self._publish([(key, version) for key in keys])
+
+    def incr(self, key, delta=1, version=None):
+        value = self._shared.incr(key, delta, version)
+        self._local.delete(key, version)
+        self._publish([(key, version)])
+        return value
+
+    def decr(self, key, delta=1, version=None):
+        return self.incr(key, -delta, version)
+
+    def clear(self):
+        self._shared.clear()
+        self._local.clear()
+        self._publish(None)
+
+    def close(self, **kwargs):
+        if self._shared_cache is not None:
+            self._shared_cache.close(**kwargs)
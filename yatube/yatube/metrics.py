@@ -0,0 +1,333 @@
+"""Метрики запросов для продакшена.
+
+``MetricsMiddleware`` для каждого запроса записывает имя view, статус и
+время ответа. Доля запросов ``settings.METRICS_SAMPLE_RATE`` измеряется
+подробно: число и время SQL-запросов, попадания и промахи кеша, время
+рендеринга шаблонов. Замеры этих запросов уходят и в заголовок
+``Server-Timing``, так что их видно во вкладке Network браузера.
+
+Кеш и шаблоны измеряются обёртками, которые подключаются в настройках:
+``MeasuredCache`` поверх настоящего кеша и ``MeasuredTemplates`` вместо
+бэкенда шаблонов Django. Вне выбранных запросов обёртки только
+проверяют, идёт ли замер.
+
+Гистограммы копятся в памяти процесса и отдаются в текстовом формате
+Prometheus по ``/metrics/``. У каждого воркера свои значения, поэтому
+Prometheus должен опрашивать воркеры по отдельности, а не через
+балансировщик.
+"""
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+PREFIX = 'yatube'
+UNRESOLVED = '<unresolved>'
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES = (0, 1, 2, 5, 10, 20, 50, 100)
+
+_state = threading.local()
+
+
+def current():
+    """Замер текущего запроса или None, если запрос не выбран."""
+    return getattr(_state, 'sample', None)
+
+
+class Sample:
+    __slots__ = ('queries', 'db_seconds', 'cache_hits', 'cache_misses',
+                 'render_seconds', 'render_depth')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.render_seconds = 0.0
+        self.render_depth = 0
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.queries += 1
+
+
+class Histogram:
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, label, value):
+        series = self.series.get(label)
+        if series is None:
+            # [счётчики корзин..., +Inf, сумма]
+            series = self.series.setdefault(
+                label, [0] * (len(self.buckets) + 1) + [0.0]
+            )
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def lines(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        for label, series in sorted(self.series.items()):
+            total = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                total += count
+                yield (f'{self.name}_bucket{{view="{label}",le="{bound}"}} '
+                       f'{total}')
+            yield f'{self.name}_sum{{view="{label}"}} {series[-1]}'
+            yield f'{self.name}_count{{view="{label}"}} {total}'
+
+
+class Counter:
+
+    def __init__(self, name, documentation, labels=('view',)):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.series = {}
+
+    def inc(self, labels, value=1):
+        self.series[labels] = self.series.get(labels, 0) + value
+
+    def lines(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        for labels, value in sorted(self.series.items()):
+            pairs = ','.join(f'{name}="{label}"'
+                             for name, label in zip(self.labels, labels))
+            yield f'{self.name}{{{pairs}}} {value}'
+
+
+class Registry:
+    """Метрики процесса. Запись и чтение идут под одной блокировкой."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = Counter(
+            f'{PREFIX}_requests_total', 'Запросы по view и статусу.',
+            ('view', 'status'),
+        )
+        self.duration = Histogram(
+            f'{PREFIX}_request_duration_seconds',
+            'Время ответа, все запросы.', SECONDS,
+        )
+        self.queries = Histogram(
+            f'{PREFIX}_db_queries', 'SQL-запросов на запрос, выборка.',
+            QUERIES,
+        )
+        self.db = Histogram(
+            f'{PREFIX}_db_duration_seconds',
+            'Время SQL-запросов на запрос, выборка.', SECONDS,
+        )
+        self.render = Histogram(
+            f'{PREFIX}_template_render_seconds',
+            'Время рендеринга шаблонов на запрос, выборка.', SECONDS,
+        )
+        self.cache_hits = Counter(
+            f'{PREFIX}_cache_hits_total', 'Попадания в кеш, выборка.',
+        )
+        self.cache_misses = Counter(
+            f'{PREFIX}_cache_misses_total', 'Промахи кеша, выборка.',
+        )
+
+    def record(self, view, status, seconds, sample):
+        with self.lock:
+            self.requests.inc((view, status))
+            self.duration.observe(view, seconds)
+            if sample is None:
+                return
+            self.queries.observe(view, sample.queries)
+            self.db.observe(view, sample.db_seconds)
+            self.render.observe(view, sample.render_seconds)
+            self.cache_hits.inc((view,), sample.cache_hits)
+            self.cache_misses.inc((view,), sample.cache_misses)
+
+    def export(self):
+        with self.lock:
+            return '\n'.join(
+                line
+                for metric in (self.requests, self.duration, self.queries,
+                               self.db, self.render, self.cache_hits,
+                               self.cache_misses)
+                for line in metric.lines()
+            ) + '\n'
+
+
+registry = Registry()
+
+
+def reset():
+    global registry
+    registry = Registry()
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNRESOLVED
+    return match.view_name
+
+
+def server_timing(sample, seconds):
+    return ', '.join((
+        f'db;dur={sample.db_seconds * 1000:.1f};'
+        f'desc="{sample.queries} queries"',
+        f'cache;desc="{sample.cache_hits} hits, '
+        f'{sample.cache_misses} misses"',
+        f'render;dur={sample.render_seconds * 1000:.1f}',
+        f'total;dur={seconds * 1000:.1f}',
+    ))
+
+
+class MetricsMiddleware:
+    """Меряет каждый запрос, подробно — выбранные."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.METRICS_SAMPLE_RATE:
+            started = time.perf_counter()
+            response = self.get_response(request)
+            registry.record(view_name(request), response.status_code,
+                            time.perf_counter() - started, None)
+            return response
+
+        sample = _state.sample = Sample()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(sample.execute)
+                    )
+                response = self.get_response(request)
+        finally:
+            _state.sample = None
+        seconds = time.perf_counter() - started
+        registry.record(view_name(request), response.status_code, seconds,
+                        sample)
+        response['Server-Timing'] = server_timing(sample, seconds)
+        return response
+
+
+class MeasuredCache(BaseCache):
+    """Считает попадания и промахи кеша ``OPTIONS['CACHE']``.
+
+    Ключи передаются как есть: префикс и версию добавляет сам кеш.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._alias = params.get('OPTIONS', {})['CACHE']
+        self._wrapped = None
+
+    @property
+    def _cache(self):
+        # Как в TieredCache: close() не должен создавать кеш посреди
+        # обхода caches.all() в close_caches
+        if self._wrapped is None:
+            self._wrapped = caches[self._alias]
+        return self._wrapped
+
+    def get(self, key, default=None, version=None):
+        value = self._cache.get(key, self, version)
+        sample = current()
+        if sample is not None:
+            if value is self:
+                sample.cache_misses += 1
+            else:
+                sample.cache_hits += 1
+        return default if value is self else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = self._cache.get_many(keys, version)
+        sample = current()
+        if sample is not None:
+            sample.cache_hits += len(found)
+            sample.cache_misses += len(keys) - len(found)
+        return found
+
+    def has_key(self, key, version=None):
+        return self._cache.has_key(key, version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._cache.add(key, value, timeout, version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._cache.set(key, value, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._cache.set_many(data, timeout, version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._cache.touch(key, timeout, version)
+
+    def delete(self, key, version=None):
+        self._cache.delete(key, version)
+
+    def delete_many(self, keys, version=None):
+        self._cache.delete_many(keys, version)
+
+    def incr(self, key, delta=1, version=None):
+        return self._cache.incr(key, delta, version)
+
+    def decr(self, key, delta=1, version=None):
+        return self._cache.decr(key, delta, version)
+
+    def clear(self):
+        self._cache.clear()
+
+    def close(self, **kwargs):
+        if self._wrapped is not None:
+            self._wrapped.close(**kwargs)
+
+
+class MeasuredTemplate:
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        sample = current()
+        if sample is None:
+            return self.template.render(context, request)
+        # Вложенные шаблоны (карточки постов) уже входят во внешний
+        sample.render_depth += 1
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            sample.render_depth -= 1
+            if not sample.render_depth:
+                sample.render_seconds += time.perf_counter() - started
+
+
+class MeasuredTemplates(DjangoTemplates):
+    """Бэкенд шаблонов Django, который меряет время рендеринга."""
+
+    def from_string(self, template_code):
+        return MeasuredTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return MeasuredTemplate(super().get_template(template_name))
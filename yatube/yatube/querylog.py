@@ -0,0 +1,256 @@
+"""Медленные запросы и N+1.
+
+``QueryLogMiddleware`` для доли запросов ``settings.QUERY_LOG_SAMPLE_RATE``
+перехватывает SQL через ``connection.execute_wrapper`` и сводит каждый
+запрос к отпечатку: SQL без значений, списки ``IN (...)`` любой длины
+совпадают. Если один отпечаток повторился за запрос
+``settings.QUERY_REPEAT_THRESHOLD`` раз, это N+1; запрос дольше
+``settings.QUERY_SLOW_MS`` миллисекунд — медленный. Для тех и других
+запоминается место вызова: строка кода проекта и строка шаблона, если
+запрос выполнен при рендеринге.
+
+Находки пишутся в лог ``yatube.querylog``, а итог каждого проверенного
+запроса — строкой JSON в файл ``settings.QUERY_LOG_PATH``, который
+ротируется по размеру. Сводку по view строит команда ``query_report``.
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import sys
+import time
+from contextlib import ExitStack
+from functools import lru_cache
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.db import connections
+from django.template.base import Node
+from django.utils import timezone
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+IN_LIST = re.compile(r'\bIN \((?:[^()]*)\)', re.IGNORECASE)
+SPACES = re.compile(r'\s+')
+
+RENDER_CODE = Node.render_annotated.__code__
+# Обёртки курсора не считаются местом вызова
+WRAPPERS = {os.path.abspath(__file__), os.path.abspath(metrics.__file__)}
+
+_handlers = {}
+
+
+def normalize(sql):
+    sql = LITERAL.sub('?', sql)
+    sql = IN_LIST.sub('IN (...)', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """Отпечаток и нормализованный текст SQL.
+
+    Django передаёт значения параметрами, так что разных строк SQL у
+    проекта немного и кеш почти всегда попадает.
+    """
+    text = normalize(sql)
+    return hashlib.md5(text.encode()).hexdigest()[:12], text
+
+
+def call_site():
+    """Строка кода проекта и строка шаблона, откуда пришёл запрос."""
+    code = template = None
+    frame = sys._getframe(1)
+    while frame is not None and (code is None or template is None):
+        if template is None and frame.f_code is RENDER_CODE:
+            node = frame.f_locals['self']
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                template = f'{origin.template_name}:{token.lineno}'
+        elif code is None:
+            filename = frame.f_code.co_filename
+            if (filename.startswith(settings.BASE_DIR)
+                    and filename not in WRAPPERS):
+                path = os.path.relpath(filename, settings.BASE_DIR)
+                code = f'{path}:{frame.f_lineno}'
+        frame = frame.f_back
+    return code, template
+
+
+class Inspection:
+    """SQL одного HTTP-запроса."""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+        self.shapes = {}
+        self.slow = []
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.seconds += elapsed
+            self.inspect(sql, elapsed)
+
+    def inspect(self, sql, elapsed):
+        key, text = fingerprint(sql)
+        shape = self.shapes.get(key)
+        if shape is None:
+            shape = self.shapes[key] = {'count': 0, 'sql': text}
+        shape['count'] += 1
+        # Место вызова ищется только для находок: обход стека недёшев
+        if shape['count'] == settings.QUERY_REPEAT_THRESHOLD:
+            shape['site'], shape['template'] = call_site()
+        if elapsed * 1000 >= settings.QUERY_SLOW_MS:
+            site, template = call_site()
+            self.slow.append({
+                'fingerprint': key, 'sql': shape['sql'],
+                'ms': round(elapsed * 1000, 1),
+                'site': site, 'template': template,
+            })
+
+    def repeated(self):
+        return [
+            dict(shape, fingerprint=key)
+            for key, shape in self.shapes.items()
+            if shape['count'] >= settings.QUERY_REPEAT_THRESHOLD
+        ]
+
+    def record(self, view, status):
+        return {
+            'time': timezone.now().isoformat(),
+            'view': view,
+            'status': status,
+            'queries': self.queries,
+            'db_ms': round(self.seconds * 1000, 1),
+            'repeated': self.repeated(),
+            'slow': self.slow,
+        }
+
+
+def handler(path):
+    if path not in _handlers:
+        _handlers[path] = RotatingFileHandler(
+            path, maxBytes=settings.QUERY_LOG_MAX_BYTES,
+            backupCount=settings.QUERY_LOG_BACKUPS, encoding='utf-8',
+            delay=True,
+        )
+    return _handlers[path]
+
+
+def write(record):
+    path = settings.QUERY_LOG_PATH
+    if not path:
+        return
+    handler(path).handle(logging.makeLogRecord({
+        'msg': json.dumps(record, ensure_ascii=False),
+    }))
+
+
+def log_paths(path):
+    """Файл лога и его ротированные копии, от старых к новым."""
+    backups = [f'{path}.{number}'
+               for number in range(settings.QUERY_LOG_BACKUPS, 0, -1)]
+    return [name for name in backups + [path] if os.path.exists(name)]
+
+
+def read(path):
+    for name in log_paths(path):
+        with open(name, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Строку могла оборвать ротация в другом воркере
+                    continue
+
+
+class QueryLogMiddleware:
+    """Проверяет SQL выбранных запросов на N+1 и медленные запросы."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.QUERY_LOG_SAMPLE_RATE:
+            return self.get_response(request)
+
+        inspection = Inspection()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(inspection.execute)
+                )
+            response = self.get_response(request)
+        view = metrics.view_name(request)
+        record = inspection.record(view, response.status_code)
+        for shape in record['repeated']:
+            logger.warning(
+                'N+1 в %s: %d раз %s (%s, %s)', view, shape['count'],
+                shape['sql'], shape['site'], shape['template'],
+            )
+        for query in record['slow']:
+            logger.warning(
+                'Медленный запрос в %s: %.1f мс %s (%s, %s)', view,
+                query['ms'], query['sql'], query['site'], query['template'],
+            )
+        write(record)
+        return response
+
+
+def summarize(records, top=10):
+    """Сводка по view и самые частые находки из записей лога."""
+    views = {}
+    findings = {}
+    for record in records:
+        view = views.setdefault(record['view'], {
+            'view': record['view'], 'requests': 0, 'queries': [],
+            'db_ms': [], 'n_plus_one': 0, 'slow': 0,
+        })
+        view['requests'] += 1
+        view['queries'].append(record['queries'])
+        view['db_ms'].append(record['db_ms'])
+        view['n_plus_one'] += bool(record['repeated'])
+        view['slow'] += len(record['slow'])
+        for kind, items in (('n+1', record['repeated']),
+                            ('slow', record['slow'])):
+            for item in items:
+                finding = findings.setdefault(
+                    (kind, record['view'], item['fingerprint']), {
+                        'kind': kind, 'view': record['view'],
+                        'fingerprint': item['fingerprint'],
+                        'sql': item['sql'], 'site': item.get('site'),
+                        'template': item.get('template'),
+                        'requests': 0, 'worst': 0,
+                    }
+                )
+                finding['requests'] += 1
+                finding['worst'] = max(finding['worst'],
+                                       item.get('count', item.get('ms')))
+    summary = []
+    for view in views.values():
+        queries = sorted(view.pop('queries'))
+        db_ms = sorted(view.pop('db_ms'))
+        view.update(
+            queries_mean=round(sum(queries) / len(queries), 1),
+            queries_max=queries[-1],
+            db_ms_mean=round(sum(db_ms) / len(db_ms), 1),
+            db_ms_p95=db_ms[int(len(db_ms) * 0.95)],
+        )
+        summary.append(view)
+    summary.sort(key=lambda view: -view['requests'])
+    return {
+        'views': summary,
+        'findings': sorted(findings.values(),
+                           key=lambda finding: -finding['requests'])[:top],
+    }
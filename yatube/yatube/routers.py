@@ -0,0 +1,84 @@
+"""Чтение с реплик, запись в основную базу.
+
+``ReplicaRouter`` отправляет запись в ``default``, а чтение — в одну из
+баз ``settings.REPLICA_DATABASES``. Чтение остаётся на основной базе,
+если:
+
+* в текущем запросе уже была запись — дальше запрос должен видеть её;
+* основная база внутри ``transaction.atomic`` — реплика не видит
+  незакоммиченных изменений;
+* у пользователя есть cookie ``settings.REPLICA_PIN_COOKIE``: её ставит
+  ``ReplicaPinningMiddleware`` после запроса с записью на
+  ``settings.REPLICA_PIN_SECONDS`` секунд, пока реплики догоняют
+  основную базу. Так автор сразу видит свой пост после редиректа.
+
+Другие пользователи в эти секунды могут прочитать с реплики старые
+данные, в том числе закешировать страницу ленты под новым поколением —
+отставание реплик должно быть заметно меньше ``FEED_CACHE_TIMEOUT``.
+"""
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_state = threading.local()
+
+
+def pin():
+    """Читать с основной базы до конца текущего запроса."""
+    _state.pinned = True
+
+
+def is_pinned():
+    return getattr(_state, 'pinned', False)
+
+
+def wrote():
+    return getattr(_state, 'wrote', False)
+
+
+def reset():
+    _state.pinned = False
+    _state.wrote = False
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.REPLICA_DATABASES
+        if (not replicas or is_pinned()
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        pin()
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы, связи между ними допустимы
+        return True
+
+
+class ReplicaPinningMiddleware:
+    """Закрепляет пользователя за основной базой после записи."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reset()
+        if settings.REPLICA_PIN_COOKIE in request.COOKIES:
+            pin()
+        try:
+            response = self.get_response(request)
+            if wrote() and settings.REPLICA_DATABASES:
+                response.set_cookie(
+                    settings.REPLICA_PIN_COOKIE, '1',
+                    max_age=settings.REPLICA_PIN_SECONDS, httponly=True,
+                )
+        finally:
+            reset()
+        return response
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -53,6 +54,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'yatube.static.AssetsMiddleware',
+    'yatube.metrics.MetricsMiddleware',
+    'yatube.querylog.QueryLogMiddleware',
+    'yatube.routers.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -67,7 +72,9 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'yatube.metrics.MeasuredTemplates',
+        # Имя бэкенда Django, как без обёртки метрик
+        'NAME': 'django',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -87,12 +94,75 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+# База выбирается переменными окружения:
+# DATABASE_ENGINE — sqlite (по умолчанию) или postgresql;
+# DATABASE_NAME, DATABASE_USER, DATABASE_PASSWORD, DATABASE_HOST,
+# DATABASE_PORT — параметры подключения к PostgreSQL;
+# DATABASE_CONN_MAX_AGE — сколько секунд держать соединение открытым;
+# DATABASE_POOL=pgbouncer — подключение через pgbouncer в режиме
+# пула транзакций, в нём не работают серверные курсоры.
+# Для PostgreSQL нужен psycopg2.
+DATABASE_ENGINE = os.getenv('DATABASE_ENGINE', 'sqlite')
+DATABASE_POOL = os.getenv('DATABASE_POOL', '')
+
+if DATABASE_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DATABASE_NAME', 'yatube'),
+            'USER': os.getenv('DATABASE_USER', 'yatube'),
+            'PASSWORD': os.getenv('DATABASE_PASSWORD', ''),
+            'HOST': os.getenv('DATABASE_HOST', '127.0.0.1'),
+            'PORT': os.getenv(
+                'DATABASE_PORT', '6432' if DATABASE_POOL else '5432'
+            ),
+            'CONN_MAX_AGE': int(os.getenv('DATABASE_CONN_MAX_AGE', 60)),
+            'DISABLE_SERVER_SIDE_CURSORS': DATABASE_POOL == 'pgbouncer',
+            'TEST': {
+                'NAME': os.getenv('DATABASE_TEST_NAME', 'test_yatube'),
+            },
+        }
     }
-}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'yatube.sqlite',
+            'NAME': os.getenv(
+                'DATABASE_NAME', os.path.join(BASE_DIR, 'db.sqlite3')
+            ),
+            'CONN_MAX_AGE': int(os.getenv('DATABASE_CONN_MAX_AGE', 0)),
+            # WAL: читатели не ждут писателя. synchronous=NORMAL в WAL
+            # не теряет целостность, только последние транзакции при
+            # отключении питания.
+            'PRAGMAS': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'mmap_size': 256 * 1024 * 1024,
+                'busy_timeout': 20000,
+                'foreign_keys': 'ON',
+            },
+        }
+    }
+
+
+# Реплики для чтения: DATABASE_REPLICAS — хосты PostgreSQL или файлы
+# SQLite через запятую. В тестах реплики — зеркала тестовой базы.
+REPLICA_DATABASES = []
+for number, location in enumerate(
+        filter(None, os.getenv('DATABASE_REPLICAS', '').split(',')), 1):
+    alias = f'replica{number}'
+    replica = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+    if DATABASE_ENGINE == 'postgresql':
+        replica['HOST'] = location.strip()
+    else:
+        replica['NAME'] = location.strip()
+    DATABASES[alias] = replica
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['yatube.routers.ReplicaRouter']
+# Сколько секунд после записи пользователь читает с основной базы
+REPLICA_PIN_SECONDS = 5
+REPLICA_PIN_COOKIE = 'pin_primary'
 
 
 # Password validation
@@ -132,8 +202,17 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 
 STATIC_URL = '/static/'
-# STATIC_ROOT = os.path.join(BASE_DIR, "static")
+STATIC_ROOT = os.getenv('STATIC_ROOT', os.path.join(BASE_DIR, 'staticfiles'))
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
+# Имена с хешем содержимого и сжатые копии при collectstatic. Без
+# DEBUG включено по умолчанию: шаблонам нужен manifest из collectstatic.
+if os.getenv('STATIC_MANIFEST', '0' if DEBUG else '1') == '1':
+    STATICFILES_STORAGE = 'yatube.static.CompressedManifestStaticFilesStorage'
+
+# Раздача статики и медиа самим приложением, см. yatube.static
+SERVE_ASSETS = os.getenv('SERVE_ASSETS', '0') == '1'
+# Сколько браузер кеширует файлы без хеша в имени
+ASSETS_MAX_AGE = 60 * 60
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
@@ -147,12 +226,114 @@ LOGIN_REDIRECT_URL = 'index'
 EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
+# Кеш выбирается переменными окружения:
+# CACHE_BACKEND — locmem (по умолчанию), file, memcached или redis;
+# CACHE_LOCATION — адрес сервера или каталог файлового кеша;
+# CACHE_L1_TIMEOUT — время жизни L1 в памяти процесса (0 — без L1).
+# Файловый кеш — общий для всех воркеров на одной машине, им удобно
+# проверять двухуровневый кеш локально. Для redis нужен django-redis.
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'memcached': 'django.core.cache.backends.memcached.PyLibMCCache',
+    'redis': 'django_redis.cache.RedisCache',
+}
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+CACHE_LOCATIONS = {
+    'locmem': '',
+    'file': os.path.join(tempfile.gettempdir(), 'yatube-cache'),
+    'memcached': '127.0.0.1:11211',
+    'redis': 'redis://127.0.0.1:6379/1',
+}
+CACHE_L1_TIMEOUT = float(
+    os.getenv('CACHE_L1_TIMEOUT', 0 if CACHE_BACKEND == 'locmem' else 5)
+)
+
 CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'shared': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION', CACHE_LOCATIONS[CACHE_BACKEND]
+        ),
+    },
+}
+if CACHE_L1_TIMEOUT:
+    CACHES['default'] = {
+        'BACKEND': 'yatube.cache.TieredCache',
+        'LOCATION': 'default',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'L1_TIMEOUT': CACHE_L1_TIMEOUT,
+            'SYNC_INTERVAL': float(os.getenv('CACHE_SYNC_INTERVAL', 1)),
+        },
     }
+else:
+    CACHES['default'] = CACHES['shared']
+# Попадания и промахи кеша считаются поверх выбранного кеша
+CACHES['measured'] = CACHES['default']
+CACHES['default'] = {
+    'BACKEND': 'yatube.metrics.MeasuredCache',
+    'OPTIONS': {'CACHE': 'measured'},
 }
 
 INTERNAL_IPS = [
     "127.0.0.1",
 ]
+
+# Лента подписок: авторы с большим числом подписчиков не раскладываются
+# по лентам при публикации, их посты подмешиваются при чтении
+TIMELINE_FANOUT_LIMIT = 1000
+# Знаменитость снова раскладывается, только когда подписчиков осталось
+# не больше этого: подписка и отписка на границе не переносят её посты
+# в ленты каждый раз
+TIMELINE_DEMOTE_LIMIT = 900
+
+# Страницы лент сбрасываются сигналами, таймаут лишь освобождает память
+FEED_CACHE_TIMEOUT = 60 * 15
+
+FEED_CACHE_VIEWS = {
+    'index': True,
+    'group_posts': True,
+    'profile': True,
+    'post_view': True,
+    'follow_index': True,
+    'tag_posts': True,
+    'mentions': True,
+}
+
+# Отрендеренные карточки постов, ключ меняется при изменении поста
+POST_CARD_CACHE_TIMEOUT = 60 * 60
+
+# Поиск: database — индекс в базе (FTS5 или tsvector), а если его нет,
+# то в памяти процесса; memory — всегда в памяти; like — без индекса
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'database')
+# Файл индекса в памяти, который воркеры открывают через mmap. По
+# умолчанию пустой: каждый процесс строит индекс из базы сам
+SEARCH_INDEX_PATH = os.getenv('SEARCH_INDEX_PATH', '')
+# Как часто индекс в памяти подбирает посты, сохранённые другими
+# процессами
+SEARCH_SYNC_INTERVAL = 5
+
+# Окно популярных тегов в часах
+TRENDING_TAGS_HOURS = 24
+
+# Метрики: доля запросов с подробным замером (SQL, кеш, шаблоны) и
+# адреса, которым доступен /metrics/ (через запятую)
+METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', 0.01))
+METRICS_ALLOWED_IPS = list(filter(None, os.getenv(
+    'METRICS_ALLOWED_IPS', ','.join(INTERNAL_IPS)
+).split(',')))
+
+# Поиск N+1 и медленных запросов: доля проверяемых запросов, порог
+# повторов одного SQL за запрос, порог медленного запроса и лог для
+# сводки query_report (по умолчанию пустой: только предупреждения в
+# лог, файл включается явно, например /var/log/yatube/queries.log)
+QUERY_LOG_SAMPLE_RATE = float(os.getenv('QUERY_LOG_SAMPLE_RATE', 0.01))
+QUERY_REPEAT_THRESHOLD = 5
+QUERY_SLOW_MS = float(os.getenv('QUERY_SLOW_MS', 100))
+QUERY_LOG_PATH = os.getenv('QUERY_LOG_PATH', '')
+QUERY_LOG_MAX_BYTES = 10 * 2 ** 20
+QUERY_LOG_BACKUPS = 5
+
+# Загруженные картинки уменьшаются до этого размера по большей стороне
+POST_IMAGE_MAX_SIZE = 2048
@@ -0,0 +1,17 @@
+"""SQLite с прагмами для установки на одной машине.
+
+Прагмы задаются в ``DATABASES[...]['PRAGMAS']`` и выполняются на каждом
+новом соединении. ``journal_mode=WAL`` позволяет читать, пока идёт
+запись, а ``busy_timeout`` заставляет писателя подождать блокировку
+вместо немедленной ошибки ``database is locked``.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict.get('PRAGMAS', {}).items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
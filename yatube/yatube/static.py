@@ -0,0 +1,257 @@
+"""Статика и медиа без отдельного веб-сервера и CDN.
+
+``CompressedManifestStaticFilesStorage`` — хранилище для collectstatic:
+к именам файлов добавляется хеш содержимого (``app.3f2a…c1.css``), а
+рядом кладутся сжатые копии ``.gz`` и ``.br`` (для brotli нужен пакет
+``brotli``), чтобы не сжимать файлы на каждом запросе.
+
+``AssetsMiddleware`` отдаёт файлы из ``STATIC_ROOT`` и ``MEDIA_ROOT``,
+если включён ``settings.SERVE_ASSETS``. Файлы с хешем в имени (статика
+после collectstatic, картинки из ``ContentAddressedStorage``, миниатюры
+sorl) никогда не меняются и кешируются браузером навсегда с
+``Cache-Control: immutable``, остальные перепроверяются по ETag и
+Last-Modified. Поддерживаются запросы Range. Файл отдаётся через
+``FileResponse``, и WSGI-сервер с ``wsgi.file_wrapper`` (gunicorn)
+пишет его в сокет через sendfile, не копируя в память процесса.
+"""
+import gzip
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import MiddlewareNotUsed, SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = {'.css', '.js', '.svg', '.txt', '.html', '.json', '.xml',
+                '.map', '.ico', '.eot', '.ttf', '.otf'}
+# Меньше этого сжатие не окупает лишний заголовок и файл
+MIN_COMPRESS_SIZE = 256
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Хеш в имени файла: 12 и больше шестнадцатеричных символов подряд,
+# хотя бы одна буква, чтобы не принять за хеш дату в имени снимка
+HASHED_NAME = re.compile(
+    r'(?:^|[./_-])(?=[0-9]*[a-f])[0-9a-f]{12,}(?:[./_-]|$)'
+)
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def compress(path):
+    """Пишет рядом с файлом сжатые копии, если они заметно меньше."""
+    with open(path, 'rb') as file:
+        data = file.read()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return []
+    copies = [('.gz', gzip.compress(data, 9, mtime=0))]
+    if brotli is not None:
+        copies.append(('.br', brotli.compress(data)))
+    written = []
+    for suffix, compressed in copies:
+        if len(compressed) < len(data) * 0.95:
+            with open(path + suffix, 'wb') as file:
+                file.write(compressed)
+            written.append(path + suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in list(self.hashed_files.values()) + list(paths):
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE:
+                compress(self.path(name))
+
+
+def is_immutable(name):
+    return bool(HASHED_NAME.search(os.path.basename(name)))
+
+
+def etag_for(stat, encoding=None):
+    # У сжатой копии другие байты, значит и ETag другой
+    suffix = f'-{encoding}' if encoding else ''
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}{suffix}"'
+
+
+def not_modified(request, stat):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        tags = {tag.strip().replace('W/', '', 1)
+                for tag in if_none_match.split(',')}
+        etags = {etag_for(stat, encoding)
+                 for encoding in (None, *dict(ENCODINGS))}
+        return '*' in tags or bool(tags & etags)
+    since = parse_http_date_safe(
+        request.META.get('HTTP_IF_MODIFIED_SINCE', '')
+    )
+    return since is not None and int(stat.st_mtime) <= since
+
+
+def parse_range(request, etag, size):
+    """Диапазон (start, end) включительно, None — отдать файл целиком.
+
+    Поддерживается один диапазон: несколько диапазонов сервер вправе
+    проигнорировать и отдать весь файл.
+    """
+    header = request.META.get('HTTP_RANGE')
+    if not header:
+        return None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range is not None and if_range.strip() != etag:
+        return None
+    match = RANGE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+class RangeFile:
+    """Окно файла для ответа 206.
+
+    ``fileno`` и ``tell`` нужны ``wsgi.file_wrapper``: sendfile отправит
+    файл с текущей позиции, но не больше Content-Length.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+class AssetsMiddleware:
+
+    def __init__(self, get_response):
+        if not settings.SERVE_ASSETS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.roots = [
+            (prefix, root)
+            for prefix, root in ((settings.STATIC_URL, settings.STATIC_ROOT),
+                                 (settings.MEDIA_URL, settings.MEDIA_ROOT))
+            if prefix and prefix.startswith('/') and root
+        ]
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD'):
+            for prefix, root in self.roots:
+                if request.path.startswith(prefix):
+                    return self.serve(request, root,
+                                      request.path[len(prefix):])
+        return self.get_response(request)
+
+    def serve(self, request, root, name):
+        try:
+            path = safe_join(root, name)
+        except SuspiciousFileOperation:
+            raise Http404
+        if not os.path.isfile(path):
+            raise Http404
+        stat = os.stat(path)
+        compressible = os.path.splitext(name)[1].lower() in COMPRESSIBLE
+        headers = self.headers(name, stat, compressible)
+        if not_modified(request, stat):
+            return self.respond(HttpResponse(status=304), headers)
+
+        byte_range = parse_range(request, headers['ETag'], stat.st_size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return self.respond(response, headers)
+
+        # Тип по исходному имени: у сжатой копии расширение .gz или .br
+        content_type, _ = mimetypes.guess_type(path)
+        content_type = content_type or 'application/octet-stream'
+        if compressible and byte_range is None:
+            path, encoding = self.compressed(request, path)
+            if encoding:
+                headers['Content-Encoding'] = encoding
+                headers['ETag'] = etag_for(stat, encoding)
+        return self.respond(
+            self.file_response(request, path, content_type, byte_range),
+            headers,
+        )
+
+    def headers(self, name, stat, compressible):
+        headers = {
+            'ETag': etag_for(stat),
+            'Last-Modified': http_date(stat.st_mtime),
+            'Cache-Control': (IMMUTABLE if is_immutable(name) else
+                              f'public, max-age={settings.ASSETS_MAX_AGE}'),
+            'Accept-Ranges': 'bytes',
+        }
+        if compressible:
+            headers['Vary'] = 'Accept-Encoding'
+        return headers
+
+    def file_response(self, request, path, content_type, byte_range):
+        size = os.path.getsize(path)
+        if request.method == 'HEAD':
+            response = HttpResponse(content_type=content_type)
+        elif byte_range is None:
+            response = FileResponse(open(path, 'rb'),
+                                    content_type=content_type)
+        else:
+            start, end = byte_range
+            response = FileResponse(
+                RangeFile(open(path, 'rb'), start, end - start + 1),
+                content_type=content_type, status=206,
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            size = end - start + 1
+        response['Content-Length'] = size
+        return response
+
+    def compressed(self, request, path):
+        accepted = set()
+        for value in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+            encoding, _, params = value.partition(';')
+            # gzip;q=0 — клиент явно отказывается от кодировки
+            if re.fullmatch(r'q=0(\.0*)?', params.replace(' ', '')):
+                continue
+            accepted.add(encoding.strip())
+        for encoding, suffix in ENCODINGS:
+            if encoding in accepted and os.path.isfile(path + suffix):
+                return path + suffix, encoding
+        return path, None
+
+    def respond(self, response, headers):
+        for header, value in headers.items():
+            response[header] = value
+        return response
@@ -0,0 +1,121 @@
+import multiprocessing
+import shutil
+import tempfile
+import threading
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from ..cache import TieredCache
+
+
+def tiered(location):
+    return TieredCache(location, {
+        'OPTIONS': {'SHARED': 'shared', 'L1_TIMEOUT': 60,
+                    'SYNC_INTERVAL': 0},
+    })
+
+
+def read_in_worker(connection):
+    """Воркер читает ключ, ждёт изменения у соседа и читает снова."""
+    cache = tiered('worker')
+    connection.send(cache.get('greeting'))
+    connection.recv()
+    connection.send(cache.get('greeting'))
+
+
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.settings = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            },
+            'shared': {
+                'BACKEND':
+                    'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': self.location,
+            },
+        })
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+
+    def test_read_goes_through_l1(self):
+        """Прочитанное значение остаётся в L1 процесса."""
+        first = tiered('first')
+        first.set('greeting', 'hello')
+        caches['shared'].set('greeting', 'changed behind our back')
+
+        self.assertEqual(first.get('greeting'), 'hello')
+
+    def test_write_invalidates_other_process(self):
+        """Запись в одном процессе сбрасывает L1 другого."""
+        first, second = tiered('first'), tiered('second')
+        first.set('greeting', 'hello')
+        self.assertEqual(second.get('greeting'), 'hello')
+
+        first.set('greeting', 'bye')
+        self.assertEqual(second.get('greeting'), 'bye')
+
+        first.set('counter', 1)
+        self.assertEqual(second.get('counter'), 1)
+        first.incr('counter')
+        self.assertEqual(second.get('counter'), 2)
+
+        first.delete('greeting')
+        self.assertIsNone(second.get('greeting'))
+
+    def test_lost_log_clears_l1(self):
+        """Если журнал вытеснен, L1 очищается целиком."""
+        first, second = tiered('first'), tiered('second')
+        first.set('greeting', 'hello')
+        self.assertEqual(second.get('greeting'), 'hello')
+
+        first.set('greeting', 'bye')
+        caches['shared'].delete_many(
+            [f'tiered:log:{n}' for n in range(100)]
+        )
+
+        self.assertEqual(second.get('greeting'), 'bye')
+
+    def test_several_worker_processes(self):
+        """Инвалидация работает между настоящими процессами."""
+        first = tiered('first')
+        first.set('greeting', 'hello')
+        context = multiprocessing.get_context('fork')
+        parent, child = context.Pipe()
+        worker = context.Process(target=read_in_worker, args=(child,))
+        worker.start()
+        self.addCleanup(worker.join, 5)
+
+        self.assertEqual(parent.recv(), 'hello')
+        first.set('greeting', 'bye')
+        parent.send('changed')
+        self.assertEqual(parent.recv(), 'bye')
+
+    def test_close_without_shared(self):
+        """close_caches в потоке, не трогавшем общий кеш, его не создаёт."""
+        errors = []
+
+        def close_caches():
+            try:
+                caches['default']
+                for cache in caches.all():
+                    cache.close()
+            except RuntimeError as error:
+                errors.append(error)
+
+        with override_settings(CACHES={
+            'default': {
+                'BACKEND': 'yatube.cache.TieredCache',
+                'OPTIONS': {'SHARED': 'shared'},
+            },
+            'shared': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            },
+        }):
+            thread = threading.Thread(target=close_caches)
+            thread.start()
+            thread.join()
+        self.assertEqual(errors, [])
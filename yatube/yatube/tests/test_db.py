@@ -0,0 +1,43 @@
+import os
+import tempfile
+import unittest
+
+from django.db import connection
+from django.test import SimpleTestCase
+
+from ..sqlite.base import DatabaseWrapper
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'Только для SQLite')
+class SQLitePragmaTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.wrapper = DatabaseWrapper({
+            **connection.settings_dict,
+            'NAME': os.path.join(directory.name, 'db.sqlite3'),
+            'PRAGMAS': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'busy_timeout': 20000,
+            },
+        })
+        self.addCleanup(self.wrapper.close)
+
+    def pragma(self, name):
+        with self.wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied(self):
+        """Прагмы из настроек выполняются на новом соединении."""
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        # NORMAL = 1
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 20000)
+
+    def test_pragmas_after_reconnect(self):
+        """После закрытия соединения прагмы применяются заново."""
+        self.pragma('journal_mode')
+        self.wrapper.close()
+        self.assertEqual(self.pragma('busy_timeout'), 20000)
@@ -0,0 +1,122 @@
+import threading
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+from .. import metrics
+
+User = get_user_model()
+
+
+class HistogramTests(SimpleTestCase):
+    def test_export(self):
+        """Корзины накопительные, граница входит в свою корзину."""
+        histogram = metrics.Histogram('latency', 'Время.', (0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe('index', value)
+        self.assertEqual(list(histogram.lines()), [
+            '# HELP latency Время.',
+            '# TYPE latency histogram',
+            'latency_bucket{view="index",le="0.1"} 2',
+            'latency_bucket{view="index",le="1"} 3',
+            'latency_bucket{view="index",le="+Inf"} 4',
+            'latency_sum{view="index"} 3.65',
+            'latency_count{view="index"} 4',
+        ])
+
+
+class MetricsMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='author')
+        Post.objects.create(text='Пост', author=author)
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    @override_settings(METRICS_SAMPLE_RATE=1)
+    def test_sampled_request(self):
+        """Выбранный запрос меряется подробно и отдаёт Server-Timing."""
+        response = self.client.get(reverse('index'))
+        timing = response['Server-Timing']
+        self.assertIn('total;dur=', timing)
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+        registry = metrics.registry
+        self.assertEqual(registry.requests.series, {('index', 200): 1})
+        self.assertGreater(registry.queries.series['index'][-1], 0)
+        self.assertGreater(registry.render.series['index'][-1], 0)
+        # Первый запрос заполняет кеш, второй читает из него
+        self.assertGreater(registry.cache_misses.series[('index',)], 0)
+        self.client.get(reverse('index'))
+        self.assertGreater(registry.cache_hits.series[('index',)], 0)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_unsampled_request(self):
+        """Остальные запросы только считаются, без подробного замера."""
+        response = self.client.get(reverse('index'))
+        self.assertFalse(response.has_header('Server-Timing'))
+        registry = metrics.registry
+        self.assertEqual(registry.requests.series, {('index', 200): 1})
+        self.assertEqual(registry.duration.series['index'][:-1].count(1), 1)
+        self.assertEqual(registry.queries.series, {})
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_unresolved(self):
+        """Запросы мимо всех URL собираются под одним именем."""
+        self.client.get('/no/such/page/here/')
+        self.assertIn((metrics.UNRESOLVED, 404),
+                      metrics.registry.requests.series)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_endpoint(self):
+        """Эндпоинт отдаёт метрики в текстовом формате Prometheus."""
+        self.client.get(reverse('index'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertContains(
+            response, 'yatube_requests_total{view="index",status="200"} 1'
+        )
+        self.assertContains(
+            response, 'yatube_request_duration_seconds_count{view="index"} 1'
+        )
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.1'])
+    def test_endpoint_closed(self):
+        """С чужих адресов эндпоинт не виден."""
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 404)
+
+
+class MeasuredCacheTests(SimpleTestCase):
+    @override_settings(CACHES={
+        'default': {
+            'BACKEND': 'yatube.metrics.MeasuredCache',
+            'OPTIONS': {'CACHE': 'store'},
+        },
+        'store': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    })
+    def test_close_without_wrapped(self):
+        """close_caches не создаёт обёрнутый кеш посреди обхода."""
+        errors = []
+
+        def close_caches():
+            try:
+                caches['default']
+                for measured in caches.all():
+                    measured.close()
+            except RuntimeError as error:
+                errors.append(error)
+
+        thread = threading.Thread(target=close_caches)
+        thread.start()
+        thread.join()
+        self.assertEqual(errors, [])
@@ -0,0 +1,164 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.template import engines
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from django.urls import reverse
+
+from posts.models import Group, Post
+
+from .. import querylog
+
+User = get_user_model()
+
+
+class FingerprintTests(SimpleTestCase):
+    def test_same_shape(self):
+        """Значения и длина списка IN не меняют отпечаток."""
+        first, _ = querylog.fingerprint(
+            "SELECT * FROM post WHERE id IN (%s, %s) AND text = 'a'"
+        )
+        second, text = querylog.fingerprint(
+            "SELECT *  FROM post\nWHERE id IN (%s) AND text = 'it''s'"
+        )
+        self.assertEqual(first, second)
+        self.assertEqual(text,
+                         'SELECT * FROM post WHERE id IN (...) AND text = ?')
+
+    def test_different_shape(self):
+        """Разные таблицы и условия дают разные отпечатки."""
+        self.assertNotEqual(
+            querylog.fingerprint('SELECT * FROM post WHERE id = %s')[0],
+            querylog.fingerprint('SELECT * FROM post2 WHERE id = %s')[0],
+        )
+
+
+class QueryLogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        group = Group.objects.create(title='Группа', slug='group')
+        for number in range(12):
+            author = User.objects.create_user(username=f'author{number}')
+            Post.objects.create(text=f'Пост {number}', author=author,
+                                group=group)
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'queries.log')
+        self.settings = override_settings(QUERY_LOG_SAMPLE_RATE=1,
+                                          QUERY_LOG_PATH=self.path)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        self.addCleanup(self.close_handlers)
+
+    def close_handlers(self):
+        handler = querylog._handlers.pop(self.path, None)
+        if handler is not None:
+            handler.close()
+
+    def records(self):
+        return list(querylog.read(self.path))
+
+    def inspect(self, view):
+        request = RequestFactory().get('/')
+        middleware = querylog.QueryLogMiddleware(view)
+        with self.assertLogs('yatube.querylog', 'WARNING') as logs:
+            middleware(request)
+        return logs
+
+    def test_n_plus_one_in_code(self):
+        """Повторы одного запроса находятся вместе с местом вызова."""
+        def view(request):
+            for post in Post.objects.all():
+                post.author.username
+            return HttpResponse()
+
+        logs = self.inspect(view)
+        self.assertIn('N+1', logs.output[0])
+        record, = self.records()
+        repeated, = record['repeated']
+        self.assertEqual(repeated['count'], 12)
+        self.assertIn('auth_user', repeated['sql'])
+        self.assertTrue(repeated['site'].startswith(
+            os.path.join('yatube', 'tests', 'test_querylog.py')
+        ))
+        self.assertIsNone(repeated['template'])
+
+    def test_n_plus_one_in_template(self):
+        """Для запросов из шаблона запоминается строка шаблона."""
+        template = engines['django'].from_string(
+            '{% for post in posts %}\n{{ post.author.username }}'
+            '{% endfor %}'
+        )
+
+        def view(request):
+            return HttpResponse(template.render(
+                {'posts': Post.objects.all()}
+            ))
+
+        self.inspect(view)
+        repeated, = self.records()[0]['repeated']
+        self.assertTrue(repeated['template'].endswith(':2'))
+
+    @override_settings(QUERY_SLOW_MS=0)
+    def test_slow_query(self):
+        """Запросы дольше порога попадают в лог."""
+        def view(request):
+            Post.objects.count()
+            return HttpResponse()
+
+        logs = self.inspect(view)
+        self.assertIn('Медленный запрос', logs.output[0])
+        slow, = self.records()[0]['slow']
+        self.assertIn('COUNT', slow['sql'])
+
+    def test_feeds_without_n_plus_one(self):
+        """В лентах нет повторяющихся запросов."""
+        for url in (reverse('index'),
+                    reverse('group_posts', args=['group']),
+                    reverse('profile', args=['author0'])):
+            with self.subTest(url=url):
+                self.client.get(url)
+        self.assertEqual(
+            [record['repeated'] for record in self.records()], [[], [], []]
+        )
+
+    def test_report(self):
+        """Команда сводит записи лога по view."""
+        self.client.get(reverse('index'))
+        self.client.get(reverse('index'))
+        output = StringIO()
+        call_command('query_report', '--json', stdout=output)
+        report = json.loads(output.getvalue())
+        view, = report['views']
+        self.assertEqual(view['view'], 'index')
+        self.assertEqual(view['requests'], 2)
+        self.assertGreater(view['queries_mean'], 0)
+        self.assertEqual(view['n_plus_one'], 0)
+
+    def test_report_findings(self):
+        """Находки группируются по view и отпечатку."""
+        records = [
+            {'time': '', 'view': 'index', 'status': 200, 'queries': queries,
+             'db_ms': 1.0, 'slow': [],
+             'repeated': [{'fingerprint': 'abc', 'sql': 'SELECT',
+                           'count': queries, 'site': 'posts/views.py:1',
+                           'template': None}]}
+            for queries in (5, 8)
+        ]
+        report = querylog.summarize(records)
+        finding, = report['findings']
+        self.assertEqual(
+            (finding['kind'], finding['requests'], finding['worst']),
+            ('n+1', 2, 8),
+        )
+        self.assertEqual(report['views'][0]['n_plus_one'], 2)
@@ -0,0 +1,118 @@
+import unittest
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post
+
+from .. import routers
+
+User = get_user_model()
+
+
+@override_settings(REPLICA_DATABASES=['replica1'])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        routers.reset()
+        self.addCleanup(routers.reset)
+        self.router = routers.ReplicaRouter()
+        self.middleware = routers.ReplicaPinningMiddleware(self.view)
+        self.factory = RequestFactory()
+
+    def view(self, request):
+        if request.GET.get('write'):
+            self.router.db_for_write(Post)
+        return HttpResponse(self.router.db_for_read(Post))
+
+    def test_read_from_replica(self):
+        """Чтение без записи идёт на реплику, запись — в основную базу."""
+        self.assertEqual(self.router.db_for_read(Post), 'replica1')
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+
+    def test_read_after_write(self):
+        """После записи запрос читает с основной базы."""
+        self.router.db_for_write(Post)
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    @override_settings(REPLICA_DATABASES=[])
+    def test_without_replicas(self):
+        """Без реплик всё идёт в основную базу и cookie не ставится."""
+        response = self.middleware(self.factory.get('/', {'write': 1}))
+        self.assertEqual(response.content, b'default')
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+    def test_pin_cookie(self):
+        """Запись ставит cookie, по которой следующие запросы читают
+        с основной базы."""
+        response = self.middleware(self.factory.get('/'))
+        self.assertEqual(response.content, b'replica1')
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+        response = self.middleware(self.factory.get('/', {'write': 1}))
+        cookie = response.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_PIN_SECONDS)
+
+        request = self.factory.get('/')
+        request.COOKIES[settings.REPLICA_PIN_COOKIE] = cookie.value
+        response = self.middleware(request)
+        self.assertEqual(response.content, b'default')
+        # Чтение не продлевает закрепление
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+    def test_state_reset_between_requests(self):
+        """Закрепление не переходит на следующий запрос в том же потоке."""
+        self.middleware(self.factory.get('/', {'write': 1}))
+        self.assertEqual(self.router.db_for_read(Post), 'replica1')
+
+
+@override_settings(REPLICA_DATABASES=['replica1'])
+class AtomicReadTests(TestCase):
+    def test_read_in_transaction(self):
+        """Внутри транзакции чтение не уходит на реплику."""
+        routers.reset()
+        self.assertEqual(routers.ReplicaRouter().db_for_read(Post),
+                         'default')
+
+
+@unittest.skipUnless(settings.REPLICA_DATABASES,
+                     'Нужна реплика в DATABASE_REPLICAS')
+class ReplicaDatabaseTests(TransactionTestCase):
+    """Реплика в тестах — зеркало основной базы через отдельное
+    соединение, по журналам запросов соединений видно, куда ушло
+    чтение."""
+    databases = '__all__'
+
+    def setUp(self):
+        self.replica = settings.REPLICA_DATABASES[0]
+        User.objects.create_user(username='Pupkin', password='secret-42')
+        self.client.login(username='Pupkin', password='secret-42')
+
+    def get_index(self):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections[self.replica]) as replica:
+            response = self.client.get(reverse('index'))
+        self.assertEqual(response.status_code, 200)
+        return len(primary), len(replica)
+
+    def test_author_reads_primary_after_post(self):
+        """После поста автор читает с основной базы, пока стоит cookie."""
+        primary, replica = self.get_index()
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+        response = self.client.post(reverse('new_post'), {'text': 'Text'})
+        self.assertIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+        primary, replica = self.get_index()
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+        del self.client.cookies[settings.REPLICA_PIN_COOKIE]
+        primary, replica = self.get_index()
+        self.assertEqual(primary, 0)
@@ -0,0 +1,166 @@
+import gzip
+import os
+import shutil
+import tempfile
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.http import Http404, HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from ..static import IMMUTABLE, AssetsMiddleware
+
+CSS = b'body { color: black; }\n' * 50
+HASHED = 'posts/ab/' + 'ab' * 32 + '.txt'
+
+
+class AssetsTestCase(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def write(self, name, content):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(content)
+        return path
+
+
+class CollectStaticTests(AssetsTestCase):
+    def test_hashed_and_compressed(self):
+        """collectstatic пишет файлы с хешем и сжатые копии."""
+        source = os.path.join(self.root, 'source')
+        self.write('source/css/site.css', CSS)
+        self.write('source/css/tiny.css', b'a{}')
+        static_root = os.path.join(self.root, 'collected')
+        with override_settings(
+            STATIC_ROOT=static_root,
+            STATICFILES_DIRS=[source],
+            STATICFILES_FINDERS=[
+                'django.contrib.staticfiles.finders.FileSystemFinder'
+            ],
+            STATICFILES_STORAGE=(
+                'yatube.static.CompressedManifestStaticFilesStorage'
+            ),
+        ):
+            call_command('collectstatic', interactive=False, verbosity=0)
+        names = os.listdir(os.path.join(static_root, 'css'))
+        hashed = [name for name in names
+                  if name.startswith('site.') and name.endswith('.css')
+                  and name != 'site.css']
+        self.assertEqual(len(hashed), 1)
+        self.assertIn(hashed[0] + '.gz', names)
+        self.assertIn('site.css.gz', names)
+        # Маленький файл не сжимается
+        self.assertNotIn('tiny.css.gz', names)
+        with gzip.open(os.path.join(static_root, 'css',
+                                    hashed[0] + '.gz')) as file:
+            self.assertEqual(file.read(), CSS)
+
+
+class AssetsMiddlewareTests(AssetsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.settings = override_settings(
+            SERVE_ASSETS=True, MEDIA_ROOT=self.root, MEDIA_URL='/media/',
+            STATIC_ROOT=self.root, STATIC_URL='/static/', ASSETS_MAX_AGE=60,
+        )
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        self.middleware = AssetsMiddleware(lambda request: HttpResponse('app'))
+        self.factory = RequestFactory()
+        self.write(HASHED, b'0123456789')
+        self.write('css/site.css', CSS)
+        self.write('css/site.css.gz', gzip.compress(CSS))
+
+    def get(self, path, method='get', **headers):
+        return self.middleware(getattr(self.factory, method)(path, **headers))
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    @override_settings(SERVE_ASSETS=False)
+    def test_disabled(self):
+        """Без SERVE_ASSETS middleware отключается."""
+        with self.assertRaises(MiddlewareNotUsed):
+            AssetsMiddleware(lambda request: HttpResponse())
+
+    def test_other_paths(self):
+        """Остальные пути уходят в приложение."""
+        self.assertEqual(self.get('/about/').content, b'app')
+
+    def test_immutable(self):
+        """Файл с хешем в имени кешируется навсегда."""
+        response = self.get('/media/' + HASHED)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], IMMUTABLE)
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(self.body(response), b'0123456789')
+
+    def test_not_modified(self):
+        """Повторный запрос с ETag получает 304."""
+        response = self.get('/static/css/site.css')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        response = self.get('/static/css/site.css',
+                            HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_precompressed(self):
+        """Клиент с gzip получает сжатую копию со своим ETag."""
+        plain = self.get('/static/css/site.css')
+        response = self.get('/static/css/site.css',
+                            HTTP_ACCEPT_ENCODING='br, gzip;q=0.8')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertNotEqual(response['ETag'], plain['ETag'])
+        self.assertEqual(gzip.decompress(self.body(response)), CSS)
+        response = self.get('/static/css/site.css',
+                            HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        response = self.get('/static/css/site.css',
+                            HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_range(self):
+        """Запросы Range отдают часть файла."""
+        path = '/media/' + HASHED
+        etag = self.get(path)['ETag']
+        cases = (
+            ('bytes=2-5', 'bytes 2-5/10', b'2345'),
+            ('bytes=7-', 'bytes 7-9/10', b'789'),
+            ('bytes=-3', 'bytes 7-9/10', b'789'),
+            ('bytes=8-100', 'bytes 8-9/10', b'89'),
+        )
+        for header, content_range, body in cases:
+            with self.subTest(header=header):
+                response = self.get(path, HTTP_RANGE=header,
+                                    HTTP_IF_RANGE=etag)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response['Content-Range'], content_range)
+                self.assertEqual(response['Content-Length'], str(len(body)))
+                self.assertEqual(self.body(response), body)
+
+    def test_range_errors(self):
+        """Диапазон за концом файла — 416, устаревший If-Range — весь
+        файл."""
+        path = '/media/' + HASHED
+        response = self.get(path, HTTP_RANGE='bytes=20-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+        response = self.get(path, HTTP_RANGE='bytes=2-5',
+                            HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_head(self):
+        """HEAD отдаёт заголовки без тела."""
+        response = self.get('/media/' + HASHED, method='head')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(response.content, b'')
+
+    def test_missing_and_traversal(self):
+        """Несуществующие файлы и выход из каталога — 404."""
+        for path in ('/media/nope.txt', '/media/../secret',
+                     '/media/css'):
+            with self.subTest(path=path), self.assertRaises(Http404):
+                self.get(path)
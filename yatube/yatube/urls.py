@@ -19,6 +19,8 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from . import views
+
 handler404 = "yatube.views.page_not_found"  # noqa
 handler500 = "yatube.views.server_error"
 
@@ -26,6 +28,7 @@ urlpatterns = [
     path("auth/", include("users.urls")),
     path("auth/", include("django.contrib.auth.urls")),
     path("admin/", admin.site.urls),
+    path("metrics/", views.metrics, name="metrics"),
     path("", include("posts.urls")),
     path("about/", include("about.urls", namespace="about")),
     path("users/", include("users.urls")),
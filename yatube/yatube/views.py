@@ -1,7 +1,11 @@
 from http import HTTPStatus
 
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 
+from . import metrics as instrumentation
+
 
 def page_not_found(request, exception):
     # Переменная exception содержит отладочную информацию,
@@ -17,3 +21,13 @@ def page_not_found(request, exception):
 def server_error(request):
     http_status = HTTPStatus.INTERNAL_SERVER_ERROR
     return render(request, "misc/500.html", status=http_status)
+
+
+def metrics(request):
+    # Метрики читает Prometheus, посетителям сайта они не показываются
+    if request.META.get("REMOTE_ADDR") not in settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    return HttpResponse(
+        instrumentation.registry.export(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )